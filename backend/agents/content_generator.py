@@ -2,22 +2,215 @@
 Enhanced Content Generator Agent
 """
 
-from typing import List
-from crewai import Agent, Task, Crew
+from __future__ import annotations
+
+import asyncio
+import os
+import aiofiles
+from pathlib import Path
+from typing import TYPE_CHECKING, Awaitable, Callable, Iterable, List, Optional
+from openai import APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+from tenacity import AsyncRetrying, retry_if_exception_type, stop_after_attempt, wait_random_exponential
 from models.schemas import ModuleData, WeekPlan, GeneratedContent, WeeklyContent, ContentItem
 from utils.ai_helpers import AIHelpers
 from utils.export_tools import ExportTools
-from utils.llm_config import LLMConfig
+from utils.llm_config import LLMConfig, http_async_client
+from utils import llm_cache, openai_batch
+
+# crewai is imported where it is used so that importing this module stays cheap
+if TYPE_CHECKING:
+    from crewai import Agent, Task
+
+# Provider errors worth retrying. Other APIError subclasses (bad request, authentication,
+# permission, not found) fail the same way every time, so they are raised at once.
+TRANSIENT_LLM_ERRORS = (RateLimitError, APIConnectionError, APITimeoutError, InternalServerError)
+
+# Content types generated for each week, named after the WeeklyContent fields
+CONTENT_TYPES = (
+    "lecture_notes",
+    "lecture_slides",
+    "lab_sheets",
+    "quizzes",
+    "seminar_prompts",
+    "transcripts"
+)
+
+# Invariant instructions for each content type. They lead every task description so the
+# prompt prefix is identical across topics and weeks and can be served from the provider's
+# prompt cache; the week context and per-topic details are appended after them.
+LECTURE_NOTES_RUBRIC = """Create comprehensive lecture notes for the lecture described below.
+
+CONTENT REQUIREMENTS:
+1. Topic introduction aligned with specified teaching methods
+2. Key concepts with examples that support the learning approaches
+3. Interactive elements appropriate for the teaching methods
+4. Activities that engage students using specified learning approaches
+5. Assessment checkpoints that match the pedagogical approach
+6. Summary and reflection prompts
+7. Connection to learning outcomes and real-world applications
+
+PEDAGOGICAL INTEGRATION:
+- If collaborative learning is specified: include group activities and discussions
+- If problem-based learning is used: structure content around problems to solve
+- If experimental learning is emphasized: include hands-on activities and experiments
+- If case study approach is used: incorporate relevant case studies
+- If project-based learning is applied: connect to ongoing projects
+- If flipped classroom is used: create pre-class and in-class components
+
+Use markdown format with proper headings and structure.
+Aim for 2000-2500 words of substantive, pedagogically-informed content.
+"""
+
+LECTURE_SLIDES_RUBRIC = """Create interactive lecture slide content for the lecture described below.
+
+Create slide content with:
+1. Title slide with topic and learning outcomes
+2. 10-15 content slides designed for the specified teaching methods:
+   - Include interaction prompts if collaborative learning is used
+   - Add problem-solving slides if problem-based learning is emphasized
+   - Include reflection slides if experimental learning is applied
+   - Add case study slides if case study approach is used
+   - Include project connection slides if project-based learning is used
+3. Interactive elements appropriate for the teaching method
+4. Summary slide with reflection questions
+5. Next steps and preparation for tutorials/labs
+
+SLIDE DESIGN PRINCIPLES:
+- Each slide should have a clear title and 3-5 bullet points maximum
+- Include speaker notes with pedagogical guidance
+- Add interaction cues for specified teaching methods
+- Include timing suggestions for activities
+- Reference uploaded resources where relevant
+
+Format as markdown with clear slide breaks (use ---).
+Include detailed speaker notes with teaching method implementation guidance.
+"""
+
+LAB_SHEET_RUBRIC = """Create an enhanced practical lab exercise for the activity described below.
+
+Design the lab to incorporate the specified learning approaches:
+
+LAB STRUCTURE:
+1. Learning objectives aligned with module outcomes
+2. Prerequisites and setup (including resource file references)
+3. Theoretical background connecting to lecture content
+4. Step-by-step instructions adapted for learning approaches:
+   - Collaborative elements if collaborative learning is used
+   - Problem-solving scenarios if problem-based learning is emphasized
+   - Experimental design if experimental learning is applied
+   - Case analysis if case study approach is used
+   - Project integration if project-based learning is used
+5. Data collection and analysis sections
+6. Reflection and discussion questions
+7. Assessment criteria aligned with learning approaches
+8. Extension activities for advanced students
+9. Connections to real-world applications
+
+Make it practical, hands-on, and pedagogically sound with clear deliverables.
+"""
+
+QUIZ_RUBRIC = """Create an enhanced assessment quiz for the week described below.
+
+Design assessment questions that align with the learning approaches:
+
+QUESTION TYPES (adapt based on learning approaches):
+- 5 multiple choice questions (varying complexity levels)
+- 3 short answer questions that test application
+- 2 scenario-based questions if problem-based learning is used
+- 1 collaborative reflection question if collaborative learning is emphasized
+- 1 case analysis question if case study approach is used
+- 1 experimental design question if experimental learning is applied
+
+ASSESSMENT PRINCIPLES:
+- Test understanding and application, not just recall
+- Include questions that require synthesis of multiple concepts
+- Align difficulty with learning outcomes and approaches
+- Provide detailed feedback explanations
+- Include rubrics for subjective questions
+
+Include correct answers, explanations, and marking guidance.
+Ensure questions promote the specified learning approaches.
+"""
+
+SEMINAR_RUBRIC = """Create engaging seminar/tutorial materials for the week described below.
+
+Design seminar content that incorporates specified methods and approaches:
+
+SEMINAR STRUCTURE:
+1. Opening and learning objectives review
+2. Warm-up activity aligned with teaching methods
+3. Main activities designed for learning approaches:
+   - Collaborative discussions if collaborative learning is used
+   - Problem-solving sessions if problem-based learning is emphasized
+   - Hands-on exploration if experimental learning is applied
+   - Case study analysis if case study approach is used
+   - Project work sessions if project-based learning is used
+   - Peer teaching if flipped classroom is used
+4. Reflection and synthesis activities
+5. Preparation for next week
+
+FACILITATION GUIDANCE:
+- Detailed facilitator notes with timing
+- Question banks for different scenarios
+- Troubleshooting common issues
+- Assessment integration points
+- Technology integration suggestions
+
+Encourage critical thinking, peer interaction, and active engagement.
+"""
+
+TRANSCRIPT_RUBRIC = """Create an enhanced lecture transcript/narration script for the lecture described below.
+
+Write as a 20-25 minute interactive lecture incorporating:
+
+SCRIPT ELEMENTS:
+1. Natural speaking rhythm with pedagogical cues
+2. Interactive moments marked with [INTERACTION]
+3. Pauses for reflection marked with [PAUSE]
+4. Emphasis on key points marked with [EMPHASIS]
+5. Activity transitions marked with [ACTIVITY]
+6. Technology integration points marked with [TECH]
+7. Assessment checkpoints marked with [CHECK]
+
+TEACHING METHOD INTEGRATION:
+- Include discussion prompts if collaborative learning is used
+- Add problem presentation if problem-based learning is emphasized
+- Include demonstration cues if experimental learning is applied
+- Reference case studies if case study approach is used
+- Connect to projects if project-based learning is used
+
+Write in a conversational but academic tone.
+Include clear instructions for implementing different teaching methods.
+Provide timing guidance and alternative delivery options.
+"""
 
 class ContentGenerator:
     """Enhanced agent responsible for generating all course content"""
     
-    def __init__(self):
-        # Centralized LLM configuration
-        self.llm = LLMConfig.get_content_generation_llm()
+    def __init__(self, batch_mode: bool = False, spool_dir: Optional[str] = None, use_cache: bool = True):
+        from crewai import Agent
+        
+        # Centralized LLM configuration, shared with other generators using the same settings
+        self.llm = LLMConfig.get_agent_llm("content")
         self.ai_helpers = AIHelpers()
         self.export_tools = ExportTools()
         
+        # Send generate_all_content through the OpenAI Batch API (half price, up to 24h turnaround)
+        self.batch_mode = batch_mode
+        
+        # When set, generated text is written here as soon as a week finishes and the items
+        # only keep a content_path, so generate_all_content doesn't hold the module in memory
+        self.spool_dir = Path(spool_dir) if spool_dir else None
+        
+        # False for explicit regeneration: every task calls the LLM and refreshes its cache entry
+        self.use_cache = use_cache
+        
+        # Connection pool shared by every LLM built through LLMConfig
+        self.http_client = http_async_client
+        
+        # Cap in-flight LLM calls so the concurrent fan-out stays under provider rate limits
+        self._sem = asyncio.Semaphore(int(os.getenv("LLM_MAX_CONCURRENCY", "8")))
+        
         # Define specialized content generation agents
         self.lecture_agent = Agent(
             role='Advanced Lecture Content Creator',
@@ -52,23 +245,108 @@ class ContentGenerator:
             llm=self.llm
         )
     
+    async def aclose(self):
+        """Release the pooled LLM connections; call once when the application shuts down"""
+        await LLMConfig.aclose()
+    
+    async def _run_tasks(self, agent: Agent, tasks: List[Task]) -> List[str]:
+        """Run a batch of independent tasks for one agent and return the raw output of each"""
+        
+        if not tasks:
+            return []
+        
+        # Repeated topics (e.g. recap sessions) produce identical prompts; run each one once
+        unique_tasks = list({task.description: task for task in tasks}.values())
+        outputs = await asyncio.gather(*[self._run_task(agent, task) for task in unique_tasks])
+        
+        # Scatter each result back to every slot that asked for it
+        by_description = dict(zip([task.description for task in unique_tasks], outputs))
+        return [by_description[task.description] for task in tasks]
+    
+    async def _run_task(self, agent: Agent, task: Task) -> str:
+        """Run one task on the agent, reusing the cached output of an identical earlier prompt"""
+        
+        # Keyed per task, so editing one topic only regenerates that topic's material
+        key = llm_cache.make_key(task.description, agent.role, str(getattr(self.llm, "model_name", "")))
+        # diskcache is SQLite on disk, so its reads and writes stay off the event loop
+        output = await asyncio.to_thread(llm_cache.get, key) if self.use_cache else None
+        # Entries from when whole batches were cached together hold lists; those count as misses
+        if isinstance(output, str):
+            return output
+        
+        # The semaphore is held for exactly one LLM call, so LLM_MAX_CONCURRENCY bounds the requests in flight
+        async with self._sem:
+            # Back off with jitter on transient provider errors instead of failing the whole module
+            async for attempt in AsyncRetrying(
+                stop=stop_after_attempt(5),
+                wait=wait_random_exponential(min=1, max=30),
+                retry=retry_if_exception_type(TRANSIENT_LLM_ERRORS),
+                reraise=True
+            ):
+                with attempt:
+                    output = str(await asyncio.to_thread(self._worker_agent(agent).execute_task, task))
+        
+        await asyncio.to_thread(llm_cache.put, key, output)
+        return output
+    
+    def _worker_agent(self, agent: Agent) -> Agent:
+        """A private copy of one of the shared agents for a single task
 
+        execute_task stores its executor, tools and prompt on the agent, so tasks running
+        concurrently in worker threads must not share an agent instance.
+        """
+        from crewai import Agent
+        
+        return Agent(
+            role=agent.role,
+            goal=agent.goal,
+            backstory=agent.backstory,
+            verbose=agent.verbose,
+            allow_delegation=False,
+            llm=self.llm
+        )
+    
+    def _to_items(self, titles: List[str], outputs: Iterable[str], format: str = "markdown") -> List[ContentItem]:
+        """Pair generated outputs with their titles, taking one output per title"""
+        return [
+            ContentItem(title=title, content=output, format=format)
+            for title, output in zip(titles, outputs)
+        ]
+    
     async def generate_all_content(
         self, 
         module_data: ModuleData, 
-        week_plans: List[WeekPlan]
+        week_plans: List[WeekPlan],
+        on_week_ready: Optional[Callable[[WeeklyContent], Awaitable[None]]] = None
     ) -> GeneratedContent:
-        """Generate all content for the module using enhanced information"""
-        
-        weekly_content = []
+        """Generate all content for the module using enhanced information
+        
+        When on_week_ready is given, each week is handed to it with its full text as soon as
+        it is generated, and only the item metadata (titles, formats, file paths) is kept
+        afterwards. With a spool_dir the text is then moved to disk rather than dropped.
+        
+        The web endpoints generate material by material through the _generate_enhanced_*
+        methods (see MATERIAL_GENERATORS in main.py); this whole-module entry point is for
+        library callers such as batch-mode runs.
+        """
+        
+        if self.batch_mode:
+            weekly_content = await self._generate_weeks_with_batch_api(module_data, week_plans)
+            for week_content in weekly_content:
+                await self._hand_off_week(week_content, on_week_ready)
+                await self._spool_week(week_content)
+        else:
+            # Weeks are independent of each other, so generate them all at once
+            weekly_content = await asyncio.gather(*[
+                self._generate_week_and_release(module_data, week_plan, on_week_ready)
+                for week_plan in week_plans
+            ])
+
         total_files = 0
-        
-        for week_plan in week_plans:
-            week_content = await self._generate_enhanced_weekly_content(module_data, week_plan)
-            weekly_content.append(week_content)
-            total_files += len(week_content.lecture_notes + week_content.lecture_slides + 
-                             week_content.lab_sheets + week_content.quizzes + 
-                             week_content.seminar_prompts + week_content.transcripts)
+        for week_content in weekly_content:
+            total_files += (len(week_content.lecture_notes) + len(week_content.lecture_slides) +
+                            len(week_content.lab_sheets) + len(week_content.quizzes) +
+                            len(week_content.seminar_prompts) + len(week_content.transcripts))
         
         return GeneratedContent(
             module_title=module_data.title,
@@ -76,6 +354,119 @@ class ContentGenerator:
             total_files=total_files
         )
     
+    async def _generate_week_and_release(
+        self,
+        module_data: ModuleData,
+        week_plan: WeekPlan,
+        on_week_ready: Optional[Callable[[WeeklyContent], Awaitable[None]]]
+    ) -> WeeklyContent:
+        """Generate a week and, if a callback is set, persist it and drop the generated text"""
+        
+        week_content = await self._generate_enhanced_weekly_content(module_data, week_plan)
+        # The callback sees the full text before spooling moves it out of the items
+        await self._hand_off_week(week_content, on_week_ready)
+        await self._spool_week(week_content)
+        return week_content
+    
+    async def _spool_week(self, week_content: WeeklyContent):
+        """Move a week's generated text to the spool directory, if one is configured"""
+        
+        if self.spool_dir is None:
+            return
+        
+        week_dir = self.spool_dir / f"week_{week_content.week_number:02d}"
+        week_dir.mkdir(parents=True, exist_ok=True)
+        
+        for content_type in CONTENT_TYPES:
+            for idx, item in enumerate(getattr(week_content, content_type)):
+                path = week_dir / f"{content_type}_{idx:02d}.{'txt' if item.format == 'text' else 'md'}"
+                async with aiofiles.open(path, 'w', encoding='utf-8') as f:
+                    await f.write(item.content)
+                item.content_path = str(path)
+                item.content = ""
+    
+    async def _hand_off_week(
+        self,
+        week_content: WeeklyContent,
+        on_week_ready: Optional[Callable[[WeeklyContent], Awaitable[None]]]
+    ):
+        """Pass a finished week to the callback, then drop its generated text unless it is to be spooled"""
+        
+        if on_week_ready is None:
+            return
+        
+        await on_week_ready(week_content)
+        
+        # Spooling writes the text out and clears it itself
+        if self.spool_dir is not None:
+            return
+        
+        # The callback has persisted the text, so don't hold every week in memory
+        for items in (week_content.lecture_notes, week_content.lecture_slides, week_content.lab_sheets,
+                      week_content.quizzes, week_content.seminar_prompts, week_content.transcripts):
+            for item in items:
+                item.content = ""
+    
+    async def _generate_weeks_with_batch_api(
+        self,
+        module_data: ModuleData,
+        week_plans: List[WeekPlan]
+    ) -> List[WeeklyContent]:
+        """Generate every week through a single OpenAI Batch API job"""
+        
+        week_tasks = [self._build_week_tasks(module_data, week_plan) for week_plan in week_plans]
+        
+        # custom_id is "{week}-{stage}-{index}" so results can be routed back to their slots.
+        # Identical prompts are submitted once and every duplicate slot points at that request.
+        requests = {}
+        source_ids = {}
+        source_tasks = {}
+        first_id_for_description = {}
+        for week_plan, (lecture_tasks, assessment_tasks) in zip(week_plans, week_tasks):
+            for stage, tasks in (("lecture", lecture_tasks), ("assessment", assessment_tasks)):
+                for idx, task in enumerate(tasks):
+                    custom_id = f"{week_plan.week_number}-{stage}-{idx}"
+                    source_id = first_id_for_description.setdefault(task.description, custom_id)
+                    source_ids[custom_id] = source_id
+                    if source_id == custom_id:
+                        requests[custom_id] = self._task_messages(task)
+                        source_tasks[custom_id] = task
+        
+        results = await openai_batch.run_chat_batch(
+            requests,
+            model=getattr(self.llm, "model_name", "gpt-4o-mini"),
+            temperature=getattr(self.llm, "temperature", 0.4),
+            max_tokens=getattr(self.llm, "max_tokens", 4000)
+        )
+        
+        # Requests the batch could not complete (already logged) are run directly instead,
+        # so a failure surfaces as an error rather than as an empty material
+        failed_ids = [custom_id for custom_id in requests if custom_id not in results]
+        if failed_ids:
+            outputs = await asyncio.gather(*[
+                self._run_task(source_tasks[custom_id].agent, source_tasks[custom_id]) for custom_id in failed_ids
+            ])
+            results.update(zip(failed_ids, outputs))
+        
+        return [
+            self._assemble_week(
+                module_data,
+                week_plan,
+                [results[source_ids[f"{week_plan.week_number}-lecture-{idx}"]] for idx in range(len(lecture_tasks))],
+                [results[source_ids[f"{week_plan.week_number}-assessment-{idx}"]] for idx in range(len(assessment_tasks))]
+            )
+            for week_plan, (lecture_tasks, assessment_tasks) in zip(week_plans, week_tasks)
+        ]
+    
+    def _task_messages(self, task: Task) -> List[dict]:
+        """Render a CrewAI task as chat messages for a direct API request"""
+        
+        agent = task.agent
+        return [
+            {"role": "system", "content": f"You are {agent.role}. {agent.backstory}\nYour goal: {agent.goal}"},
+            {"role": "user", "content": f"{task.description}\n\nExpected output: {task.expected_output}"}
+        ]
+    
     async def _generate_enhanced_weekly_content(
         self, 
         module_data: ModuleData, 
@@ -83,16 +474,78 @@ class ContentGenerator:
     ) -> WeeklyContent:
         """Generate enhanced content for a specific week"""
         
+        lecture_tasks, assessment_tasks = self._build_week_tasks(module_data, week_plan)
+        
+        lecture_outputs, assessment_outputs = await asyncio.gather(
+            self._run_tasks(self.lecture_agent, lecture_tasks),
+            self._run_tasks(self.assessment_agent, assessment_tasks)
+        )
+        
+        return self._assemble_week(module_data, week_plan, lecture_outputs, assessment_outputs)
+    
+    def _build_week_tasks(self, module_data: ModuleData, week_plan: WeekPlan):
+        """Build the lecture-agent and assessment-agent task lists for a week"""
+        
+        wanted = set(module_data.content_types or CONTENT_TYPES)
+        
         # Prepare context with enhanced information
         context = self._prepare_enhanced_context(module_data, week_plan)
         
-        # Generate content with enhanced context
-        lecture_notes = await self._generate_enhanced_lecture_notes(module_data, week_plan, context)
-        lecture_slides = await self._generate_enhanced_lecture_slides(module_data, week_plan, context)
-        lab_sheets = await self._generate_enhanced_lab_sheets(module_data, week_plan, context)
-        quizzes = await self._generate_enhanced_quizzes(module_data, week_plan, context)
-        seminar_prompts = await self._generate_enhanced_seminar_prompts(module_data, week_plan, context)
-        transcripts = await self._generate_enhanced_transcripts(module_data, week_plan, context)
+        # Split the week by agent: the lecture agent writes notes, slides and transcripts,
+        # the assessment agent writes the quiz, seminar and lab sheets.
+        # Content types the user didn't ask for are never sent to the LLM.
+        lecture_tasks = []
+        if "lecture_notes" in wanted:
+            lecture_tasks += self._lecture_notes_tasks(module_data, week_plan, context)
+        if "lecture_slides" in wanted:
+            lecture_tasks += self._lecture_slides_tasks(module_data, week_plan, context)
+        if "transcripts" in wanted:
+            lecture_tasks += self._transcript_tasks(module_data, week_plan, context)
+        
+        assessment_tasks = []
+        if "quizzes" in wanted:
+            assessment_tasks.append(self._quiz_task(module_data, week_plan, context))
+        if "seminar_prompts" in wanted and week_plan.tutorial_activities:
+            assessment_tasks.append(self._seminar_task(module_data, week_plan, context))
+        if "lab_sheets" in wanted:
+            assessment_tasks += self._lab_sheet_tasks(module_data, week_plan, context)
+        
+        return lecture_tasks, assessment_tasks
+    
+    def _assemble_week(
+        self,
+        module_data: ModuleData,
+        week_plan: WeekPlan,
+        lecture_outputs: List[str],
+        assessment_outputs: List[str]
+    ) -> WeeklyContent:
+        """Split the per-task outputs of a week back into their content types"""
+        
+        wanted = set(module_data.content_types or CONTENT_TYPES)
+        topics = week_plan.lecture_topics
+        
+        # Outputs are in the order _build_week_tasks queued the tasks; consume them in that order
+        lecture_outputs = iter(lecture_outputs)
+        assessment_outputs = iter(assessment_outputs)
+        
+        lecture_notes, lecture_slides, transcripts = [], [], []
+        if "lecture_notes" in wanted:
+            lecture_notes = self._to_items([f"Lecture Notes - {topic}" for topic in topics], lecture_outputs)
+        if "lecture_slides" in wanted:
+            lecture_slides = self._to_items([f"Slides - {topic}" for topic in topics], lecture_outputs)
+        if "transcripts" in wanted:
+            transcripts = self._to_items([f"Enhanced Transcript - {topic}" for topic in topics], lecture_outputs, "text")
+        
+        quizzes, seminar_prompts, lab_sheets = [], [], []
+        if "quizzes" in wanted:
+            quizzes = self._to_items([f"Week {week_plan.week_number} Enhanced Quiz"], assessment_outputs)
+        if "seminar_prompts" in wanted and week_plan.tutorial_activities:
+            seminar_prompts = self._to_items([f"Week {week_plan.week_number} Enhanced Seminar"], assessment_outputs)
+        if "lab_sheets" in wanted:
+            lab_sheets = self._to_items(
+                [f"Lab Exercise - {activity}" for activity in week_plan.lab_activities],
+                assessment_outputs
+            )
         
         return WeeklyContent(
             week_number=week_plan.week_number,
@@ -143,63 +596,52 @@ class ContentGenerator:
     ) -> List[ContentItem]:
         """Generate enhanced lecture notes incorporating teaching methods and resources"""
         
-        lecture_notes = []
+        tasks = self._lecture_notes_tasks(module_data, week_plan, context)
+        outputs = await self._run_tasks(self.lecture_agent, tasks)
         
-        for i, topic in enumerate(week_plan.lecture_topics):
-            # Determine teaching method approach for this topic
-            teaching_methods_text = ", ".join(module_data.teaching_methods) if module_data.teaching_methods else "traditional lecture"
-            learning_approaches_text = ", ".join(module_data.learning_approaches) if module_data.learning_approaches else "passive learning"
-            
-            task = Task(
-                description=f"""
-                Create comprehensive lecture notes for:
-                
-                {context}
-                Topic: {topic}
-                Learning Outcomes: {', '.join(week_plan.learning_outcomes)}
-                
-                TEACHING METHOD REQUIREMENTS:
-                Teaching Methods to Incorporate: {teaching_methods_text}
-                Learning Approaches to Apply: {learning_approaches_text}
-                
-                CONTENT REQUIREMENTS:
-                1. Topic introduction aligned with specified teaching methods
-                2. Key concepts with examples that support the learning approaches
-                3. Interactive elements appropriate for the teaching methods
-                4. Activities that engage students using specified learning approaches
-                5. Assessment checkpoints that match the pedagogical approach
-                6. Summary and reflection prompts
-                7. Connection to learning outcomes and real-world applications
-                
-                PEDAGOGICAL INTEGRATION:
-                - If collaborative learning is specified: include group activities and discussions
-                - If problem-based learning is used: structure content around problems to solve
-                - If experimental learning is emphasized: include hands-on activities and experiments
-                - If case study approach is used: incorporate relevant case studies
-                - If project-based learning is applied: connect to ongoing projects
-                - If flipped classroom is used: create pre-class and in-class components
-                
-                RESOURCE INTEGRATION:
-                {f"Incorporate references to uploaded resources: {[rf['original_name'] for rf in week_plan.resource_files]}" if week_plan.resource_files else ""}
-                {f"Reference external resources: {week_plan.external_resources}" if week_plan.external_resources else ""}
-                
-                Use markdown format with proper headings and structure.
-                Aim for 2000-2500 words of substantive, pedagogically-informed content.
-                """,
+        return self._to_items([f"Lecture Notes - {topic}" for topic in week_plan.lecture_topics], outputs)
+    
+    def _lecture_notes_tasks(
+        self,
+        module_data: ModuleData,
+        week_plan: WeekPlan,
+        context: str
+    ) -> List[Task]:
+        """Build one lecture notes task per topic"""
+        from crewai import Task
+        
+        # Determine teaching method approach for this week
+        teaching_methods_text = ", ".join(module_data.teaching_methods) if module_data.teaching_methods else "traditional lecture"
+        learning_approaches_text = ", ".join(module_data.learning_approaches) if module_data.learning_approaches else "passive learning"
+        learning_outcomes_text = ", ".join(week_plan.learning_outcomes)
+        resource_names_str = ", ".join(rf['original_name'] for rf in week_plan.resource_files)
+        external_resources_str = ", ".join(week_plan.external_resources)
+        
+        # Everything but the topic is shared, so build the prompt prefix once
+        prefix = f"""{LECTURE_NOTES_RUBRIC}
+            {context}
+
+            TEACHING METHOD REQUIREMENTS:
+            Teaching Methods to Incorporate: {teaching_methods_text}
+            Learning Approaches to Apply: {learning_approaches_text}
+
+            RESOURCE INTEGRATION:
+            {f"Incorporate references to uploaded resources: {resource_names_str}" if resource_names_str else ""}
+            {f"Reference external resources: {external_resources_str}" if external_resources_str else ""}
+"""
+        
+        return [
+            Task(
+                description=f"""{prefix}
+            Topic: {topic}
+            Learning Outcomes: {learning_outcomes_text}
+            """,
                 agent=self.lecture_agent,
-                expected_output="Comprehensive pedagogically-informed lecture notes in markdown format"
+                expected_output="Comprehensive pedagogically-informed lecture notes in markdown format",
+                context=[]
             )
-            
-            crew = Crew(agents=[self.lecture_agent], tasks=[task], verbose=False)
-            result = crew.kickoff()
-            
-            lecture_notes.append(ContentItem(
-                title=f"Lecture Notes - {topic}",
-                content=str(result),
-                format="markdown"
-            ))
-        
-        return lecture_notes
+            for topic in week_plan.lecture_topics
+        ]
     
     async def _generate_enhanced_lecture_slides(
         self, 
@@ -209,55 +651,38 @@ class ContentGenerator:
     ) -> List[ContentItem]:
         """Generate enhanced lecture slides incorporating teaching methods"""
         
-        slides = []
+        tasks = self._lecture_slides_tasks(module_data, week_plan, context)
+        outputs = await self._run_tasks(self.lecture_agent, tasks)
         
-        for i, topic in enumerate(week_plan.lecture_topics):
-            teaching_methods_text = ", ".join(module_data.teaching_methods) if module_data.teaching_methods else "traditional"
-            
-            task = Task(
-                description=f"""
-                Create interactive lecture slide content for:
-                
-                {context}
-                Topic: {topic}
-                Teaching Methods: {teaching_methods_text}
-                
-                Create slide content with:
-                1. Title slide with topic and learning outcomes
-                2. 10-15 content slides designed for the specified teaching methods:
-                   - Include interaction prompts if collaborative learning is used
-                   - Add problem-solving slides if problem-based learning is emphasized
-                   - Include reflection slides if experimental learning is applied
-                   - Add case study slides if case study approach is used
-                   - Include project connection slides if project-based learning is used
-                3. Interactive elements appropriate for the teaching method
-                4. Summary slide with reflection questions
-                5. Next steps and preparation for tutorials/labs
-                
-                SLIDE DESIGN PRINCIPLES:
-                - Each slide should have a clear title and 3-5 bullet points maximum
-                - Include speaker notes with pedagogical guidance
-                - Add interaction cues for specified teaching methods
-                - Include timing suggestions for activities
-                - Reference uploaded resources where relevant
-                
-                Format as markdown with clear slide breaks (use ---).
-                Include detailed speaker notes with teaching method implementation guidance.
-                """,
+        return self._to_items([f"Slides - {topic}" for topic in week_plan.lecture_topics], outputs)
+    
+    def _lecture_slides_tasks(
+        self,
+        module_data: ModuleData,
+        week_plan: WeekPlan,
+        context: str
+    ) -> List[Task]:
+        """Build one lecture slides task per topic"""
+        from crewai import Task
+        
+        teaching_methods_text = ", ".join(module_data.teaching_methods) if module_data.teaching_methods else "traditional"
+        
+        prefix = f"""{LECTURE_SLIDES_RUBRIC}
+            {context}
+            Teaching Methods: {teaching_methods_text}
+"""
+        
+        return [
+            Task(
+                description=f"""{prefix}
+            Topic: {topic}
+            """,
                 agent=self.lecture_agent,
-                expected_output="Interactive slide content optimized for specified teaching methods"
+                expected_output="Interactive slide content optimized for specified teaching methods",
+                context=[]
             )
-            
-            crew = Crew(agents=[self.lecture_agent], tasks=[task], verbose=False)
-            result = crew.kickoff()
-            
-            slides.append(ContentItem(
-                title=f"Slides - {topic}",
-                content=str(result),
-                format="markdown"
-            ))
-        
-        return slides
+            for topic in week_plan.lecture_topics
+        ]
     
     async def _generate_enhanced_lab_sheets(
         self, 
@@ -267,58 +692,44 @@ class ContentGenerator:
     ) -> List[ContentItem]:
         """Generate enhanced lab exercises aligned with learning approaches"""
         
-        lab_sheets = []
-        
-        if week_plan.lab_activities:
-            for activity in week_plan.lab_activities:
-                learning_approaches_text = ", ".join(module_data.learning_approaches) if module_data.learning_approaches else "traditional"
-                
-                task = Task(
-                    description=f"""
-                    Create an enhanced practical lab exercise for:
-                    
-                    {context}
-                    Activity: {activity}
-                    Learning Approaches: {learning_approaches_text}
-                    
-                    Design the lab to incorporate the specified learning approaches:
-                    
-                    LAB STRUCTURE:
-                    1. Learning objectives aligned with module outcomes
-                    2. Prerequisites and setup (including resource file references)
-                    3. Theoretical background connecting to lecture content
-                    4. Step-by-step instructions adapted for learning approaches:
-                       - Collaborative elements if collaborative learning is used
-                       - Problem-solving scenarios if problem-based learning is emphasized
-                       - Experimental design if experimental learning is applied
-                       - Case analysis if case study approach is used
-                       - Project integration if project-based learning is used
-                    5. Data collection and analysis sections
-                    6. Reflection and discussion questions
-                    7. Assessment criteria aligned with learning approaches
-                    8. Extension activities for advanced students
-                    9. Connections to real-world applications
-                    
-                    RESOURCE INTEGRATION:
-                    {f"Incorporate uploaded resources: {[rf['original_name'] for rf in week_plan.resource_files]}" if week_plan.resource_files else ""}
-                    {f"Reference external resources: {week_plan.external_resources}" if week_plan.external_resources else ""}
-                    
-                    Make it practical, hands-on, and pedagogically sound with clear deliverables.
-                    """,
-                    agent=self.assessment_agent,
-                    expected_output="Comprehensive pedagogically-informed lab exercise sheet"
-                )
-                
-                crew = Crew(agents=[self.assessment_agent], tasks=[task], verbose=False)
-                result = crew.kickoff()
-                
-                lab_sheets.append(ContentItem(
-                    title=f"Lab Exercise - {activity}",
-                    content=str(result),
-                    format="markdown"
-                ))
-        
-        return lab_sheets
+        tasks = self._lab_sheet_tasks(module_data, week_plan, context)
+        outputs = await self._run_tasks(self.assessment_agent, tasks)
+        
+        return self._to_items([f"Lab Exercise - {activity}" for activity in week_plan.lab_activities], outputs)
+    
+    def _lab_sheet_tasks(
+        self,
+        module_data: ModuleData,
+        week_plan: WeekPlan,
+        context: str
+    ) -> List[Task]:
+        """Build one lab sheet task per lab activity"""
+        from crewai import Task
+        
+        learning_approaches_text = ", ".join(module_data.learning_approaches) if module_data.learning_approaches else "traditional"
+        resource_names_str = ", ".join(rf['original_name'] for rf in week_plan.resource_files)
+        external_resources_str = ", ".join(week_plan.external_resources)
+        
+        prefix = f"""{LAB_SHEET_RUBRIC}
+            {context}
+            Learning Approaches: {learning_approaches_text}
+            
+            RESOURCE INTEGRATION:
+            {f"Incorporate uploaded resources: {resource_names_str}" if resource_names_str else ""}
+            {f"Reference external resources: {external_resources_str}" if external_resources_str else ""}
+"""
+        
+        return [
+            Task(
+                description=f"""{prefix}
+            Activity: {activity}
+            """,
+                agent=self.assessment_agent,
+                expected_output="Comprehensive pedagogically-informed lab exercise sheet",
+                context=[]
+            )
+            for activity in week_plan.lab_activities
+        ]
     
     # Continue with other enhanced generation methods...
     async def _generate_enhanced_quizzes(
@@ -329,49 +740,33 @@ class ContentGenerator:
     ) -> List[ContentItem]:
         """Generate enhanced quizzes aligned with learning approaches"""
         
+        outputs = await self._run_tasks(self.assessment_agent, [self._quiz_task(module_data, week_plan, context)])
+        
+        return self._to_items([f"Week {week_plan.week_number} Enhanced Quiz"], outputs)
+    
+    def _quiz_task(
+        self,
+        module_data: ModuleData,
+        week_plan: WeekPlan,
+        context: str
+    ) -> Task:
+        """Build the weekly quiz task"""
+        from crewai import Task
+        
         learning_approaches_text = ", ".join(module_data.learning_approaches) if module_data.learning_approaches else "traditional assessment"
         
-        quiz_task = Task(
-            description=f"""
-            Create an enhanced assessment quiz for:
-            
+        return Task(
+            description=f"""{QUIZ_RUBRIC}
             {context}
-            Topics: {', '.join(week_plan.lecture_topics)}
-            Learning Outcomes: {', '.join(week_plan.learning_outcomes)}
             Learning Approaches: {learning_approaches_text}
             
-            Design assessment questions that align with the learning approaches:
-            
-            QUESTION TYPES (adapt based on learning approaches):
-            - 5 multiple choice questions (varying complexity levels)
-            - 3 short answer questions that test application
-            - 2 scenario-based questions if problem-based learning is used
-            - 1 collaborative reflection question if collaborative learning is emphasized
-            - 1 case analysis question if case study approach is used
-            - 1 experimental design question if experimental learning is applied
-            
-            ASSESSMENT PRINCIPLES:
-            - Test understanding and application, not just recall
-            - Include questions that require synthesis of multiple concepts
-            - Align difficulty with learning outcomes and approaches
-            - Provide detailed feedback explanations
-            - Include rubrics for subjective questions
-            
-            Include correct answers, explanations, and marking guidance.
-            Ensure questions promote the specified learning approaches.
+            Topics: {', '.join(week_plan.lecture_topics)}
+            Learning Outcomes: {', '.join(week_plan.learning_outcomes)}
             """,
             agent=self.assessment_agent,
-            expected_output="Comprehensive pedagogically-aligned quiz with answers and rubrics"
+            expected_output="Comprehensive pedagogically-aligned quiz with answers and rubrics",
+            context=[]
         )
-        
-        crew = Crew(agents=[self.assessment_agent], tasks=[quiz_task], verbose=False)
-        result = crew.kickoff()
-        
-        return [ContentItem(
-            title=f"Week {week_plan.week_number} Enhanced Quiz",
-            content=str(result),
-            format="markdown"
-        )]
     
     async def _generate_enhanced_seminar_prompts(
         self, 
@@ -384,57 +779,38 @@ class ContentGenerator:
         if not week_plan.tutorial_activities:
             return []
         
+        outputs = await self._run_tasks(self.assessment_agent, [self._seminar_task(module_data, week_plan, context)])
+        
+        return self._to_items([f"Week {week_plan.week_number} Enhanced Seminar"], outputs)
+    
+    def _seminar_task(
+        self,
+        module_data: ModuleData,
+        week_plan: WeekPlan,
+        context: str
+    ) -> Task:
+        """Build the weekly seminar task"""
+        from crewai import Task
+        
         teaching_methods_text = ", ".join(module_data.teaching_methods) if module_data.teaching_methods else "traditional discussion"
         learning_approaches_text = ", ".join(module_data.learning_approaches) if module_data.learning_approaches else "traditional"
+        resource_names_str = ", ".join(rf['original_name'] for rf in week_plan.resource_files)
         
-        seminar_task = Task(
-            description=f"""
-            Create engaging seminar/tutorial materials for:
-            
+        return Task(
+            description=f"""{SEMINAR_RUBRIC}
             {context}
-            Activities: {', '.join(week_plan.tutorial_activities)}
             Teaching Methods: {teaching_methods_text}
             Learning Approaches: {learning_approaches_text}
             
-            Design seminar content that incorporates specified methods and approaches:
-            
-            SEMINAR STRUCTURE:
-            1. Opening and learning objectives review
-            2. Warm-up activity aligned with teaching methods
-            3. Main activities designed for learning approaches:
-               - Collaborative discussions if collaborative learning is used
-               - Problem-solving sessions if problem-based learning is emphasized
-               - Hands-on exploration if experimental learning is applied
-               - Case study analysis if case study approach is used
-               - Project work sessions if project-based learning is used
-               - Peer teaching if flipped classroom is used
-            4. Reflection and synthesis activities
-            5. Preparation for next week
-            
-            FACILITATION GUIDANCE:
-            - Detailed facilitator notes with timing
-            - Question banks for different scenarios
-            - Troubleshooting common issues
-            - Assessment integration points
-            - Technology integration suggestions
-            
             RESOURCE INTEGRATION:
-            {f"Utilize uploaded resources: {[rf['original_name'] for rf in week_plan.resource_files]}" if week_plan.resource_files else ""}
+            {f"Utilize uploaded resources: {resource_names_str}" if resource_names_str else ""}
             
-            Encourage critical thinking, peer interaction, and active engagement.
+            Activities: {', '.join(week_plan.tutorial_activities)}
             """,
             agent=self.assessment_agent,
-            expected_output="Comprehensive seminar materials with facilitation guidance"
+            expected_output="Comprehensive seminar materials with facilitation guidance",
+            context=[]
         )
-        
-        crew = Crew(agents=[self.assessment_agent], tasks=[seminar_task], verbose=False)
-        result = crew.kickoff()
-        
-        return [ContentItem(
-            title=f"Week {week_plan.week_number} Enhanced Seminar",
-            content=str(result),
-            format="markdown"
-        )]
     
     async def _generate_enhanced_transcripts(
         self, 
@@ -444,52 +820,35 @@ class ContentGenerator:
     ) -> List[ContentItem]:
         """Generate enhanced lecture transcripts with pedagogical cues"""
         
-        transcripts = []
+        tasks = self._transcript_tasks(module_data, week_plan, context)
+        outputs = await self._run_tasks(self.lecture_agent, tasks)
         
-        for topic in week_plan.lecture_topics:
-            teaching_methods_text = ", ".join(module_data.teaching_methods) if module_data.teaching_methods else "traditional lecture"
-            
-            task = Task(
-                description=f"""
-                Create an enhanced lecture transcript/narration script for:
-                
-                {context}
-                Topic: {topic}
-                Teaching Methods: {teaching_methods_text}
-                
-                Write as a 20-25 minute interactive lecture incorporating:
-                
-                SCRIPT ELEMENTS:
-                1. Natural speaking rhythm with pedagogical cues
-                2. Interactive moments marked with [INTERACTION]
-                3. Pauses for reflection marked with [PAUSE]
-                4. Emphasis on key points marked with [EMPHASIS]
-                5. Activity transitions marked with [ACTIVITY]
-                6. Technology integration points marked with [TECH]
-                7. Assessment checkpoints marked with [CHECK]
-                
-                TEACHING METHOD INTEGRATION:
-                - Include discussion prompts if collaborative learning is used
-                - Add problem presentation if problem-based learning is emphasized
-                - Include demonstration cues if experimental learning is applied
-                - Reference case studies if case study approach is used
-                - Connect to projects if project-based learning is used
-                
-                Write in a conversational but academic tone.
-                Include clear instructions for implementing different teaching methods.
-                Provide timing guidance and alternative delivery options.
-                """,
+        return self._to_items([f"Enhanced Transcript - {topic}" for topic in week_plan.lecture_topics], outputs, "text")
+    
+    def _transcript_tasks(
+        self,
+        module_data: ModuleData,
+        week_plan: WeekPlan,
+        context: str
+    ) -> List[Task]:
+        """Build one lecture transcript task per topic"""
+        from crewai import Task
+        
+        teaching_methods_text = ", ".join(module_data.teaching_methods) if module_data.teaching_methods else "traditional lecture"
+        
+        prefix = f"""{TRANSCRIPT_RUBRIC}
+            {context}
+            Teaching Methods: {teaching_methods_text}
+"""
+        
+        return [
+            Task(
+                description=f"""{prefix}
+            Topic: {topic}
+            """,
                 agent=self.lecture_agent,
-                expected_output="Enhanced interactive lecture transcript with pedagogical cues"
+                expected_output="Enhanced interactive lecture transcript with pedagogical cues",
+                context=[]
             )
-            
-            crew = Crew(agents=[self.lecture_agent], tasks=[task], verbose=False)
-            result = crew.kickoff()
-            
-            transcripts.append(ContentItem(
-                title=f"Enhanced Transcript - {topic}",
-                content=str(result),
-                format="text"
-            ))
-        
-        return transcripts
+            for topic in week_plan.lecture_topics
+        ]
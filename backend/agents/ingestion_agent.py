@@ -2,43 +2,98 @@
 Enhanced Ingestion Agent with improved AI instruction clarity
 """
 
+import asyncio
+import logging
 import re
 from pathlib import Path
-from typing import List, Optional
-from crewai import Agent, Task, Crew
-from langchain_openai import ChatOpenAI
+from string import Template
+from typing import List
 from models.schemas import ModuleData, LearningOutcome, Assessment
+from utils.export_tools import EXPORT_POOL
 from utils.file_parser import FileParser
 from utils.ai_helpers import AIHelpers
+from utils.llm_config import LLMConfig
+from utils.semantic_cache import SemanticCache
+from utils.text_retrieval import select_relevant_chunks
 
-class IngestionAgent:
-    """Agent responsible for ingesting and parsing module specifications"""
-    """
-Enhanced Ingestion Agent - Fixed LLM configuration
-"""
+logger = logging.getLogger(__name__)
 
-import re
-from pathlib import Path
-from typing import List, Optional
-from crewai import Agent, Task, Crew
-from langchain_openai import ChatOpenAI
-from models.schemas import ModuleData, LearningOutcome, Assessment
-from utils.file_parser import FileParser
-from utils.ai_helpers import AIHelpers
+# First run of digits in a weight such as "60%"
+WEIGHT_NUMBER = re.compile(r'\d+')
+
+# Extraction prompt with every fixed instruction ahead of the per-call spec text, so the
+# long static prefix is identical across calls and eligible for OpenAI prompt caching
+EXTRACTION_PROMPT = Template("""
+Extract information from the module specification and return it as clean JSON.
+
+IMPORTANT: Return ONLY simple values, no nested objects with metadata.
+
+Required format:
+{
+    "title": "string - exact module title",
+    "code": "string - module code like CS101",
+    "credits": integer - just the number (e.g., 15, 20, 30),
+    "semester": "string - semester name (e.g., 'Semester 1', 'Fall 2024')",
+    "academic_year": "string - academic year (e.g., '2024/25')",
+    "description": "string - brief module description",
+    "learning_outcomes": ["string1", "string2", "string3"],
+    "assessments": [
+        {
+            "name": "string - assessment name",
+            "type": "string - assessment type",
+            "weight": integer - percentage as number (e.g., 60, 40)
+        }
+    ],
+    "prerequisites": ["string1", "string2"] or [] if none,
+    "topics": ["string1", "string2", "string3"],
+    "teaching_methods": ["lectures", "tutorials", "seminars", "workshops"],
+    "learning_approaches": ["collaborative", "problemBased", "experimental"]
+}
+
+EXTRACTION RULES:
+1. credits: Extract ONLY the number (15, 20, 30, etc.)
+2. semester: Extract as simple string ("Semester 1", "Fall", etc.)
+3. prerequisites: If none mentioned, use empty array []
+4. learning_outcomes: Extract as simple strings, no IDs or metadata
+5. assessments: weight should be just the percentage number
+6. topics: Infer main subject areas covered
+7. teaching_methods: Common methods like "lectures", "tutorials", "seminars"
+8. learning_approaches: Use values like "collaborative", "problemBased", "experimental"
+
+Return only the JSON object, no explanations or additional text.
+
+Textbooks available: $textbook_titles
+
+Module content to analyze:
+$module_excerpt
+""")
+
+# Specs longer than this are reduced to their most relevant passages before extraction
+MAX_SPEC_CHARS = 6000
+
+# What the extraction prompt needs to find in a long specification
+EXTRACTION_QUERIES = [
+    "module title, module code, credits, semester and academic year",
+    "learning outcomes: on successful completion students will be able to",
+    "assessment methods, weightings and percentages",
+    "syllabus, indicative content and main topics",
+    "teaching methods, learning approaches and prerequisites"
+]
 
 class IngestionAgent:
     """Agent responsible for ingesting and parsing module specifications"""
     
+    # Document parsing is CPU-bound and holds the GIL, so it shares the export worker processes
+    _parse_pool = EXPORT_POOL
+    
     def __init__(self):
-        # Fix: Use correct model name and configuration
-        self.llm = ChatOpenAI(
-            model="gpt-4o-mini",  # Changed from gpt-4 to gpt-4o-mini (correct model name)
-            temperature=0.1,
-            max_tokens=4000,
-            request_timeout=120
-        )
+        from crewai import Agent
+        
+        # Shared client configured in settings.AGENT_CONFIGS
+        self.llm = LLMConfig.get_agent_llm("ingestion")
         self.file_parser = FileParser()
         self.ai_helpers = AIHelpers()
+        self.semantic_cache = SemanticCache("ingestion", EXTRACTION_PROMPT.template)
         
         # Define the enhanced extraction agent
         self.extraction_agent = Agent(
@@ -56,83 +111,53 @@ class IngestionAgent:
     async def process_module_spec(
         self, 
         module_file_path: Path, 
-        textbook_paths: List[Path] = None
+        textbook_paths: List[Path] = None,
+        use_cache: bool = True
     ) -> ModuleData:
-        """Process module specification and extract clean structured data"""
+        """Process module specification and extract clean structured data
+
+        use_cache=False always runs a fresh extraction (its result still refreshes the cache).
+        """
+        from crewai import Task
         
         # Parse the main module file
-        module_text = self.file_parser.extract_text(module_file_path)
+        loop = asyncio.get_running_loop()
+        module_text = await loop.run_in_executor(self._parse_pool, self.file_parser.extract_text, module_file_path)
+        
+        # Long specs keep the passages relevant to each extracted field instead of just the first page
+        if len(module_text) > MAX_SPEC_CHARS:
+            module_excerpt = await select_relevant_chunks(module_text, EXTRACTION_QUERIES, MAX_SPEC_CHARS)
+        else:
+            module_excerpt = module_text
         
         # Parse textbooks if provided
-        textbook_titles = []
-        if textbook_paths:
-            for textbook_path in textbook_paths:
-                textbook_titles.append(textbook_path.stem)
+        textbook_titles = [textbook_path.stem for textbook_path in textbook_paths or []]
         
         # Create extraction task with very specific output format requirements
         extraction_task = Task(
-            description=f"""
-            Extract information from the module specification and return it as clean JSON.
-            
-            IMPORTANT: Return ONLY simple values, no nested objects with metadata.
-            
-            Required format:
-            {{
-                "title": "string - exact module title",
-                "code": "string - module code like CS101",
-                "credits": integer - just the number (e.g., 15, 20, 30),
-                "semester": "string - semester name (e.g., 'Semester 1', 'Fall 2024')",
-                "academic_year": "string - academic year (e.g., '2024/25')",
-                "description": "string - brief module description",
-                "learning_outcomes": ["string1", "string2", "string3"],
-                "assessments": [
-                    {{
-                        "name": "string - assessment name",
-                        "type": "string - assessment type",
-                        "weight": integer - percentage as number (e.g., 60, 40)
-                    }}
-                ],
-                "prerequisites": ["string1", "string2"] or [] if none,
-                "topics": ["string1", "string2", "string3"],
-                "teaching_methods": ["lectures", "tutorials", "seminars", "workshops"],
-                "learning_approaches": ["collaborative", "problemBased", "experimental"]
-            }}
-            
-            Module content to analyze:
-            {module_text[:6000]}...
-            
-            Textbooks available: {textbook_titles}
-            
-            EXTRACTION RULES:
-            1. credits: Extract ONLY the number (15, 20, 30, etc.)
-            2. semester: Extract as simple string ("Semester 1", "Fall", etc.)
-            3. prerequisites: If none mentioned, use empty array []
-            4. learning_outcomes: Extract as simple strings, no IDs or metadata
-            5. assessments: weight should be just the percentage number
-            6. topics: Infer main subject areas covered
-            7. teaching_methods: Common methods like "lectures", "tutorials", "seminars"
-            8. learning_approaches: Use values like "collaborative", "problemBased", "experimental"
-            
-            Return only the JSON object, no explanations or additional text.
-            """,
+            description=EXTRACTION_PROMPT.substitute(
+                module_excerpt=module_excerpt,
+                textbook_titles=textbook_titles
+            ),
             agent=self.extraction_agent,
             expected_output="Clean JSON object with simple values only"
         )
         
-        # Execute extraction
-        crew = Crew(
-            agents=[self.extraction_agent],
-            tasks=[extraction_task],
-            verbose=True
-        )
+        # Re-uploads of the same spec reuse the previous extraction; the
+        # cache is keyed on the spec and textbooks alone, not the instructions around them
+        cache_key = f"Textbooks: {textbook_titles}\n{module_excerpt}"
+        result = await self.semantic_cache.get(cache_key) if use_cache else None
         
-        result = crew.kickoff()
+        if result is None:
+            # Execute extraction; a single task runs on the agent directly without a crew
+            result = str(await asyncio.to_thread(self.extraction_agent.execute_task, extraction_task))
+            await self.semantic_cache.put(cache_key, result)
         
         # Parse the result and create ModuleData
         parsed_data = self.ai_helpers.parse_extraction_result(str(result))
         
         # Add debugging information
-        print("Parsed data:", parsed_data)
+        logger.debug("Parsed data: %s", parsed_data)
         
         return self._create_module_data(parsed_data, textbook_titles)
     
@@ -142,21 +167,19 @@ class IngestionAgent:
         try:
             # Extract learning outcomes with proper structure
             learning_outcomes = []
-            if 'learning_outcomes' in parsed_data and isinstance(parsed_data['learning_outcomes'], list):
-                for i, lo in enumerate(parsed_data['learning_outcomes']):
-                    if isinstance(lo, str) and lo.strip():
-                        learning_outcomes.append(LearningOutcome(
-                            id=f"LO{i+1}",
-                            description=lo.strip(),
-                            level=None
-                        ))
+            if isinstance(parsed_data.get('learning_outcomes'), list):
+                learning_outcomes = [
+                    LearningOutcome(id=f"LO{i+1}", description=lo.strip(), level=None)
+                    for i, lo in enumerate(parsed_data['learning_outcomes'])
+                    if isinstance(lo, str) and lo.strip()
+                ]
             
-            # If no learning outcomes found, create defaults
+            # If no learning outcomes found, create defaults (constants, so validation is skipped)
             if not learning_outcomes:
                 learning_outcomes = [
-                    LearningOutcome(id="LO1", description="Understand key concepts", level=None),
-                    LearningOutcome(id="LO2", description="Apply knowledge to problems", level=None),
-                    LearningOutcome(id="LO3", description="Analyze and evaluate information", level=None)
+                    LearningOutcome.model_construct(id="LO1", description="Understand key concepts", level=None),
+                    LearningOutcome.model_construct(id="LO2", description="Apply knowledge to problems", level=None),
+                    LearningOutcome.model_construct(id="LO3", description="Analyze and evaluate information", level=None)
                 ]
             
             # Extract assessments with proper structure
@@ -168,8 +191,8 @@ class IngestionAgent:
                             weight = assessment_data.get('weight', 0)
                             if isinstance(weight, str):
                                 # Extract number from string like "60%"
-                                weight_match = re.search(r'(\d+)', weight)
-                                weight = int(weight_match.group(1)) if weight_match else 0
+                                weight_match = WEIGHT_NUMBER.search(weight)
+                                weight = int(weight_match.group()) if weight_match else 0
                             elif isinstance(weight, float):
                                 weight = int(weight)
                             
@@ -180,14 +203,14 @@ class IngestionAgent:
                                 description=assessment_data.get('description')
                             ))
                         except (ValueError, TypeError) as e:
-                            print(f"Error processing assessment: {e}")
+                            logger.debug("Error processing assessment: %s", e)
                             continue
             
-            # If no assessments found, create defaults
+            # If no assessments found, create defaults (constants, so validation is skipped)
             if not assessments:
                 assessments = [
-                    Assessment(name="Final Exam", type="Examination", weight=60.0),
-                    Assessment(name="Coursework", type="Assignment", weight=40.0)
+                    Assessment.model_construct(name="Final Exam", type="Examination", weight=60.0),
+                    Assessment.model_construct(name="Coursework", type="Assignment", weight=40.0)
                 ]
             
             # Ensure all required fields have proper types
@@ -209,22 +232,21 @@ class IngestionAgent:
             
             return module_data
             
-        except Exception as e:
-            print(f"Error creating ModuleData: {e}")
-            print(f"Parsed data: {parsed_data}")
+        except Exception:
+            logger.exception("Error creating ModuleData from parsed data: %s", parsed_data)
             
-            # Return a minimal valid ModuleData object
-            return ModuleData(
+            # Return a minimal ModuleData object; every value is a known-good constant, so skip validation
+            return ModuleData.model_construct(
                 title="Unknown Module",
                 code="UNKNOWN",
                 credits=15,
                 semester="Unknown",
                 academic_year="2024/25",
                 learning_outcomes=[
-                    LearningOutcome(id="LO1", description="Understand key concepts", level=None)
+                    LearningOutcome.model_construct(id="LO1", description="Understand key concepts", level=None)
                 ],
                 assessments=[
-                    Assessment(name="Assessment", type="Unknown", weight=100.0)
+                    Assessment.model_construct(name="Assessment", type="Unknown", weight=100.0)
                 ],
                 description=None,
                 prerequisites=[],
@@ -2,25 +2,71 @@
 Packaging Agent - Creates final downloadable packages
 """
 
+import asyncio
+import os
+import re
 import zipfile
+from collections import namedtuple
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, Any
-from crewai import Agent, Task, Crew
-from langchain_openai import ChatOpenAI
+from typing import Any, List, Optional, Tuple
+from jinja2 import Environment, FileSystemLoader
+from config.settings import settings
 from models.schemas import ModuleData, GeneratedContent
-from utils.export_tools import ExportTools
+from utils.export_tools import EXPORT_POOL, export_markdown
+from utils.llm_config import LLMConfig
+from utils.material_layout import FORMAT_NAMES, MATERIAL_LAYOUT
+
+# These formats are already zip/deflate containers; compressing them again only burns CPU
+STORED_SUFFIXES = {'.pdf', '.docx', '.pptx', '.xlsx', '.zip', '.png', '.jpg', '.jpeg', '.mp3', '.mp4'}
+
+# Filename sanitization, built once instead of on every call
+_UNSAFE_CHARS = str.maketrans('<>:"/\\|?*', '_________')
+_WHITESPACE = re.compile(r'\s+')
+
+# Output folders of a package, in the order they appear in the zip
+PackageFolders = namedtuple('PackageFolders', list(MATERIAL_LAYOUT))
+
+# WeeklyContent field holding the items of each material type
+WEEKLY_CONTENT_FIELDS = {
+    'lecture_notes': 'lecture_notes',
+    'lecture_slides': 'lecture_slides',
+    'lab_materials': 'lab_sheets',
+    'assessments': 'quizzes',
+    'seminar_materials': 'seminar_prompts',
+    'transcripts': 'transcripts'
+}
+
+# Folder list of the instructor guide as (folder, what it holds, formats)
+GUIDE_FOLDERS = [
+    (layout.folder, layout.label, " and ".join(FORMAT_NAMES[file_format] for file_format in layout.formats))
+    for layout in MATERIAL_LAYOUT.values()
+]
+
+# Markdown templates for the documents derived from module data
+_TEMPLATE_ENV = Environment(
+    loader=FileSystemLoader(Path(__file__).resolve().parent.parent / "templates"),
+    trim_blocks=True,
+    lstrip_blocks=True,
+    keep_trailing_newline=True
+)
+_OVERVIEW_TEMPLATE = _TEMPLATE_ENV.get_template("module_overview.md.j2")
+_GUIDE_TEMPLATE = _TEMPLATE_ENV.get_template("instructor_guide.md.j2")
 
 class PackagingAgent:
     """Agent responsible for packaging and exporting content"""
     
-    def __init__(self):
-        self.llm = ChatOpenAI(
-            model="gpt-4o-mini",  # Changed from gpt-4 to gpt-4o-mini (correct model name)
-            temperature=0.3,
-            #max_tokens=4000,
-            #request_timeout=120
-        )
-        self.export_tools = ExportTools()
+    # Worker processes shared with the app, so exports from every session draw on one pool
+    _export_pool = EXPORT_POOL
+    
+    def __init__(self, enable_llm_polish: Optional[bool] = None):
+        from crewai import Agent
+        
+        # Shared client configured in settings.AGENT_CONFIGS
+        self.llm = LLMConfig.get_agent_llm("packaging")
+        
+        # When set, the instructor guide's delivery tips are written by the LLM instead of the template
+        self.enable_llm_polish = settings.ENABLE_LLM_POLISH if enable_llm_polish is None else enable_llm_polish
         
         # Define the packaging agent
         self.packaging_agent = Agent(
@@ -46,126 +92,93 @@ class PackagingAgent:
         output_dir.mkdir(parents=True, exist_ok=True)
         
         # Create folder structure
-        folders = {
-            "lecture_notes": output_dir / "01_Lecture_Notes",
-            "lecture_slides": output_dir / "02_Lecture_Slides", 
-            "lab_materials": output_dir / "03_Lab_Materials",
-            "assessments": output_dir / "04_Assessments",
-            "seminar_materials": output_dir / "05_Seminar_Materials",
-            "transcripts": output_dir / "06_Transcripts"
-        }
-        
-        for folder in folders.values():
+        folders = PackageFolders(**{
+            material_type: output_dir / layout.folder for material_type, layout in MATERIAL_LAYOUT.items()
+        })
+        
+        for folder in folders:
             folder.mkdir(exist_ok=True)
         
         # Export content in various formats
         await self._export_weekly_content(generated_content, folders)
         
-        # Create module overview document
-        await self._create_module_overview(module_data, output_dir)
-        
-        # Create instructor guide
-        await self._create_instructor_guide(module_data, generated_content, output_dir)
+        # Create module overview document and instructor guide; the two LLM calls are independent
+        await asyncio.gather(
+            self._create_module_overview(module_data, output_dir),
+            self._create_instructor_guide(module_data, generated_content, output_dir)
+        )
         
         # Create zip package
         package_path = output_dir / "complete_package.zip"
-        self._create_zip_package(output_dir, package_path)
+        await asyncio.to_thread(self._create_zip_package, output_dir, package_path)
         
         return package_path
     
     async def _export_weekly_content(
         self, 
         generated_content: GeneratedContent, 
-        folders: Dict[str, Path]
+        folders: PackageFolders
     ):
         """Export all weekly content to appropriate folders"""
         
+        # Collect every document conversion first, then render them all concurrently in the export pool.
+        # Items exported to several formats are one export, so the markdown is parsed once.
+        exports = []
+        text_files = []
+        
         for week_content in generated_content.weekly_content:
-            week_num = week_content.week_number
-            
-            # Export lecture notes
-            for note in week_content.lecture_notes:
-                # Export as PDF
-                pdf_path = folders["lecture_notes"] / f"Week_{week_num:02d}_{self._sanitize_filename(note.title)}.pdf"
-                self.export_tools.markdown_to_pdf(note.content, pdf_path)
-                
-                # Export as Word
-                docx_path = folders["lecture_notes"] / f"Week_{week_num:02d}_{self._sanitize_filename(note.title)}.docx"
-                self.export_tools.markdown_to_docx(note.content, docx_path)
-            
-            # Export lecture slides
-            for slide in week_content.lecture_slides:
-                # Export as PowerPoint
-                pptx_path = folders["lecture_slides"] / f"Week_{week_num:02d}_{self._sanitize_filename(slide.title)}.pptx"
-                self.export_tools.markdown_to_pptx(slide.content, pptx_path)
-                
-                # Export as PDF
-                pdf_path = folders["lecture_slides"] / f"Week_{week_num:02d}_{self._sanitize_filename(slide.title)}.pdf"
-                self.export_tools.markdown_to_pdf(slide.content, pdf_path)
-            
-            # Export lab materials
-            for lab in week_content.lab_sheets:
-                pdf_path = folders["lab_materials"] / f"Week_{week_num:02d}_{self._sanitize_filename(lab.title)}.pdf"
-                self.export_tools.markdown_to_pdf(lab.content, pdf_path)
-                
-                docx_path = folders["lab_materials"] / f"Week_{week_num:02d}_{self._sanitize_filename(lab.title)}.docx"
-                self.export_tools.markdown_to_docx(lab.content, docx_path)
-            
-            # Export assessments
-            for quiz in week_content.quizzes:
-                pdf_path = folders["assessments"] / f"Week_{week_num:02d}_{self._sanitize_filename(quiz.title)}.pdf"
-                self.export_tools.markdown_to_pdf(quiz.content, pdf_path)
+            week_prefix = f"Week_{week_content.week_number:02d}"
             
-            # Export seminar materials
-            for seminar in week_content.seminar_prompts:
-                pdf_path = folders["seminar_materials"] / f"Week_{week_num:02d}_{self._sanitize_filename(seminar.title)}.pdf"
-                self.export_tools.markdown_to_pdf(seminar.content, pdf_path)
-            
-            # Export transcripts
-            for transcript in week_content.transcripts:
-                txt_path = folders["transcripts"] / f"Week_{week_num:02d}_{self._sanitize_filename(transcript.title)}.txt"
-                with open(txt_path, 'w', encoding='utf-8') as f:
-                    f.write(transcript.content)
+            # Each material type goes to its folder in every format listed in MATERIAL_LAYOUT
+            for material_type, field in WEEKLY_CONTENT_FIELDS.items():
+                folder = getattr(folders, material_type)
+                formats = MATERIAL_LAYOUT[material_type].formats
+                for item in getattr(week_content, field):
+                    name = f"{week_prefix}_{self._sanitize_filename(item.title)}"
+                    if formats == ('txt',):
+                        text_files.append((folder / f"{name}.txt", item.get_content().encode('utf-8')))
+                    else:
+                        exports.append((item.get_content(), {
+                            folder / f"{name}.{file_format}": file_format for file_format in formats
+                        }))
+        
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(
+            *[
+                loop.run_in_executor(self._export_pool, export_markdown, content, outputs)
+                for content, outputs in exports
+            ],
+            # Plain-text files need no conversion, so one thread writes them all in a single pass
+            loop.run_in_executor(None, self._write_files, text_files)
+        )
+    
+    @staticmethod
+    def _write_files(files: List[Tuple[Path, bytes]]):
+        """Write already-encoded files with raw descriptors, skipping the buffered file object per file"""
+        
+        flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0)
+        for path, data in files:
+            fd = os.open(path, flags, 0o644)
+            try:
+                view = memoryview(data)
+                while view:
+                    view = view[os.write(fd, view):]
+            finally:
+                os.close(fd)
     
     async def _create_module_overview(self, module_data: ModuleData, output_dir: Path):
         """Create a module overview document"""
         
-        task = Task(
-            description=f"""
-            Create a comprehensive module overview document for:
-            
-            Module: {module_data.title} ({module_data.code})
-            Credits: {module_data.credits}
-            Semester: {module_data.semester}
-            
-            Learning Outcomes:
-            {chr(10).join([f"- {lo.description}" for lo in module_data.learning_outcomes])}
-            
-            Assessments:
-            {chr(10).join([f"- {a.name} ({a.weight}%): {a.type}" for a in module_data.assessments])}
-            
-            Include:
-            1. Module description and objectives
-            2. Learning outcomes mapped to weeks
-            3. Assessment schedule and requirements
-            4. Reading list and resources
-            5. Module structure overview
-            
-            Format as a professional academic document in markdown.
-            """,
-            agent=self.packaging_agent,
-            expected_output="Module overview document in markdown"
-        )
-        
-        crew = Crew(agents=[self.packaging_agent], tasks=[task], verbose=False)
-        result = crew.kickoff()
+        # Everything in the overview comes straight from the module data, so no LLM call is needed
+        overview = _OVERVIEW_TEMPLATE.render(module=module_data)
         
         # Export as both PDF and Word
-        overview_pdf = output_dir / "00_Module_Overview.pdf"
-        overview_docx = output_dir / "00_Module_Overview.docx"
-        
-        self.export_tools.markdown_to_pdf(str(result), overview_pdf)
-        self.export_tools.markdown_to_docx(str(result), overview_docx)
+        await asyncio.get_running_loop().run_in_executor(
+            self._export_pool, export_markdown, overview, {
+                output_dir / "00_Module_Overview.pdf": 'pdf',
+                output_dir / "00_Module_Overview.docx": 'docx'
+            }
+        )
     
     async def _create_instructor_guide(
         self, 
@@ -175,48 +188,69 @@ class PackagingAgent:
     ):
         """Create an instructor guide"""
         
+        # Only the delivery tips benefit from the model; they fall back to generic tips in the template
+        delivery_tips = None
+        if self.enable_llm_polish and module_data.description:
+            delivery_tips = await self._generate_delivery_tips(module_data)
+        
+        guide = _GUIDE_TEMPLATE.render(
+            module=module_data,
+            generated_content=generated_content,
+            package_folders=GUIDE_FOLDERS,
+            delivery_tips=delivery_tips
+        )
+        
+        # Export as PDF
+        await asyncio.get_running_loop().run_in_executor(
+            self._export_pool, export_markdown, guide, {output_dir / "00_Instructor_Guide.pdf": 'pdf'}
+        )
+    
+    async def _generate_delivery_tips(self, module_data: ModuleData) -> str:
+        """Ask the packaging agent for delivery tips specific to this module"""
+        from crewai import Task
+        
         task = Task(
             description=f"""
-            Create an instructor guide for the module "{module_data.title}".
+            Write 4-6 practical tips for delivering the module "{module_data.title}" effectively.
             
-            The module has {len(generated_content.weekly_content)} weeks of content
-            with {generated_content.total_files} total files generated.
+            Module description:
+            {module_data.description}
             
-            Include:
-            1. How to use the generated materials
-            2. Customization suggestions
-            3. Technical requirements
-            4. Assessment guidance
-            5. File organization explanation
-            6. Tips for effective delivery
+            Teaching methods: {", ".join(module_data.teaching_methods)}
             
-            Make it practical and actionable for university lecturers.
+            Return only a markdown bullet list, one tip per line starting with "- ".
             """,
             agent=self.packaging_agent,
-            expected_output="Comprehensive instructor guide"
+            expected_output="Markdown bullet list of delivery tips"
         )
         
-        crew = Crew(agents=[self.packaging_agent], tasks=[task], verbose=False)
-        result = crew.kickoff()
-        
-        # Export as PDF
-        guide_pdf = output_dir / "00_Instructor_Guide.pdf"
-        self.export_tools.markdown_to_pdf(str(result), guide_pdf)
+        return str(await asyncio.to_thread(self.packaging_agent.execute_task, task)).strip()
     
     def _create_zip_package(self, source_dir: Path, zip_path: Path):
         """Create a zip file containing all materials"""
         
-        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            for file_path in source_dir.rglob('*'):
-                if file_path.is_file() and file_path != zip_path:
-                    arcname = file_path.relative_to(source_dir)
-                    zipf.write(file_path, arcname)
+        source_str = str(source_dir)
+        zip_str = str(zip_path)
+        
+        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED, compresslevel=6) as zipf:
+            # Walk with scandir so file/dir checks come from the directory listing instead of a stat per path
+            pending = [source_str]
+            while pending:
+                with os.scandir(pending.pop()) as entries:
+                    for entry in entries:
+                        if entry.is_dir():
+                            pending.append(entry.path)
+                        elif entry.is_file() and entry.path != zip_str:
+                            arcname = entry.path[len(source_str) + 1:]
+                            if os.path.splitext(entry.name)[1].lower() in STORED_SUFFIXES:
+                                zipf.write(entry.path, arcname, compress_type=zipfile.ZIP_STORED)
+                            else:
+                                zipf.write(entry.path, arcname)
     
-    def _sanitize_filename(self, filename: str) -> str:
+    @staticmethod
+    @lru_cache(maxsize=1024)
+    def _sanitize_filename(filename: str) -> str:
         """Sanitize filename for cross-platform compatibility"""
         
-        import re
-        # Remove or replace problematic characters
-        filename = re.sub(r'[<>:"/\\|?*]', '_', filename)
-        filename = re.sub(r'\s+', '_', filename)
-        return filename[:50]  # Limit length 
+        # Replace problematic characters and whitespace runs, then limit length
+        return _WHITESPACE.sub('_', filename.translate(_UNSAFE_CHARS))[:50] 
@@ -1,36 +1,69 @@
- 
 """
 Planning Agent - Creates weekly breakdown and content structure
 """
 
+import asyncio
+from string import Template
 from typing import List
-from crewai import Agent, Task, Crew
-from langchain_openai import ChatOpenAI
 from models.schemas import ModuleData, WeekPlan
 from utils.ai_helpers import AIHelpers
+from utils.llm_config import LLMConfig
+from utils.semantic_cache import SemanticCache
 
-"""
-Planning Agent - Fixed LLM configuration
-"""
+# Static planning prompt; module details are substituted per call
+PLANNING_PROMPT = Template("""
+Create a $num_weeks-week teaching plan for the module "$module_title".
 
-from typing import List
-from crewai import Agent, Task, Crew
-from langchain_openai import ChatOpenAI
-from models.schemas import ModuleData, WeekPlan
-from utils.ai_helpers import AIHelpers
+Module Details:
+- Code: $module_code
+- Credits: $module_credits
+- Description: $module_description
+
+Main Topics to Cover:
+$topics_text
+
+Teaching Methods to Use:
+$teaching_methods_text
+
+Learning Approaches to Apply:
+$learning_approaches_text
+
+Learning Outcomes:
+$learning_outcomes_text
+
+Assessments:
+$assessments_text
+
+Available Textbooks:
+$textbooks_text
+
+For each week, provide:
+1. Week number and descriptive title
+2. Detailed description of the week's focus and objectives
+3. Learning outcomes addressed (reference LO numbers)
+4. 2-3 main lecture topics aligned with teaching methods
+5. Tutorial/seminar activities that use the specified learning approaches
+6. Lab activities (if applicable)
+7. Recommended readings
+8. Any deliverables or milestones
+
+Ensure logical progression, even distribution of learning outcomes, and
+alignment with the specified teaching methods and learning approaches.
+Consider assessment deadlines and provide preparation weeks.
+
+Return as structured JSON array with each week as an object.
+""")
 
 class PlanningAgent:
     """Agent responsible for creating weekly teaching plans"""
     
     def __init__(self):
-        # Fix: Use correct model name and configuration
-        self.llm = ChatOpenAI(
-            model="gpt-4o-mini",  # Changed from gpt-4 to gpt-4o-mini
-            temperature=0.5,
-            max_tokens=4000,
-            request_timeout=120
-        )
+        from crewai import Agent
+        
+        # Shared client configured in settings.AGENT_CONFIGS
+        self.llm = LLMConfig.get_agent_llm("planning")
         self.ai_helpers = AIHelpers()
+        self.semantic_cache = SemanticCache("planning", PLANNING_PROMPT.template)
         
         # Define the planning agent
         self.planning_agent = Agent(
@@ -46,8 +79,12 @@ class PlanningAgent:
     
 
 
-    async def generate_weekly_plan(self, module_data: ModuleData) -> List[WeekPlan]:
-        """Generate weekly breakdown for the module with enhanced information"""
+    async def generate_weekly_plan(self, module_data: ModuleData, use_cache: bool = True) -> List[WeekPlan]:
+        """Generate weekly breakdown for the module with enhanced information
+
+        use_cache=False always plans afresh (its result still refreshes the cache).
+        """
+        from crewai import Task
 
         # Calculate number of weeks (typically 12 for a semester)
         num_weeks = 12
@@ -64,66 +101,42 @@ class PlanningAgent:
             for assessment in module_data.assessments
         ])
 
+        textbooks_text = ', '.join(module_data.textbooks) if module_data.textbooks else 'None specified'
+
         # Include topics and teaching methods in the prompt
         topics_text = "\n".join(module_data.topics) if module_data.topics else "Not specified"
         teaching_methods_text = ", ".join(module_data.teaching_methods) if module_data.teaching_methods else "Traditional methods"
         learning_approaches_text = ", ".join(module_data.learning_approaches) if module_data.learning_approaches else "Standard approaches"
 
-        planning_task = Task(
-            description=f"""
-            Create a {num_weeks}-week teaching plan for the module "{module_data.title}".
-
-            Module Details:
-            - Code: {module_data.code}
-            - Credits: {module_data.credits}
-            - Description: {module_data.description}
-
-            Main Topics to Cover:
-            {topics_text}
-
-            Teaching Methods to Use:
-            {teaching_methods_text}
-
-            Learning Approaches to Apply:
-            {learning_approaches_text}
-
-            Learning Outcomes:
-            {learning_outcomes_text}
-
-            Assessments:
-            {assessments_text}
-
-            Available Textbooks:
-            {', '.join(module_data.textbooks) if module_data.textbooks else 'None specified'}
-
-            For each week, provide:
-            1. Week number and descriptive title
-            2. Detailed description of the week's focus and objectives
-            3. Learning outcomes addressed (reference LO numbers)
-            4. 2-3 main lecture topics aligned with teaching methods
-            5. Tutorial/seminar activities that use the specified learning approaches
-            6. Lab activities (if applicable)
-            7. Recommended readings
-            8. Any deliverables or milestones
-
-            Ensure logical progression, even distribution of learning outcomes, and
-            alignment with the specified teaching methods and learning approaches.
-            Consider assessment deadlines and provide preparation weeks.
+        prompt_values = dict(
+            num_weeks=num_weeks,
+            module_title=module_data.title,
+            module_code=module_data.code,
+            module_credits=module_data.credits,
+            module_description=module_data.description,
+            topics_text=topics_text,
+            teaching_methods_text=teaching_methods_text,
+            learning_approaches_text=learning_approaches_text,
+            learning_outcomes_text=learning_outcomes_text,
+            assessments_text=assessments_text,
+            textbooks_text=textbooks_text
+        )
 
-            Return as structured JSON array with each week as an object.
-            """,
+        planning_task = Task(
+            description=PLANNING_PROMPT.substitute(**prompt_values),
             agent=self.planning_agent,
             expected_output="JSON array of weekly plans with enhanced information"
         )
 
-        # Execute planning (rest remains the same)
-        crew = Crew(
-            agents=[self.planning_agent],
-            tasks=[planning_task],
-            verbose=True
-        )
+        # Modules with identical details reuse the previous plan; the cache is keyed on the
+        # module details alone, not the instructions around them
+        cache_key = "\n".join(f"{name}: {value}" for name, value in prompt_values.items())
+        result = await self.semantic_cache.get(cache_key) if use_cache else None
 
-        result = crew.kickoff()
+        if result is None:
+            # Execute planning; a single task runs on the agent directly without a crew
+            result = str(await asyncio.to_thread(self.planning_agent.execute_task, planning_task))
+            await self.semantic_cache.put(cache_key, result)
 
         # Parse result and create WeekPlan objects
         parsed_weeks = self.ai_helpers.parse_weekly_plan_result(str(result))
@@ -2,11 +2,24 @@
 Configuration settings for the AI Course Generator
 """
 
+import asyncio
 import os
+import sys
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# CrewAI sets up an OpenTelemetry exporter on every crew unless telemetry is switched off
+os.environ.setdefault("OTEL_SDK_DISABLED", "true")
+
+# Prefer the libuv-based event loop where it is available (uvicorn picks it up with loop="auto")
+if sys.platform != "win32":
+    try:
+        import uvloop
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    except ImportError:
+        pass
+
 class Settings:
     # OpenAI Configuration
     OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
@@ -27,6 +40,12 @@ class Settings:
     OUTPUT_DIR = os.getenv("OUTPUT_DIR", "outputs")
     UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads")
     
+    # Cache Settings
+    CACHE_TTL = int(os.getenv("CACHE_TTL", 7 * 24 * 60 * 60))  # seconds
+    
+    # Packaging Settings
+    ENABLE_LLM_POLISH = os.getenv("ENABLE_LLM_POLISH", "False").lower() == "true"
+    
     # Model-specific settings for different agents
     AGENT_CONFIGS = {
         "ingestion": {
@@ -1,127 +1,620 @@
-import sqlite3
-import json
+try:
+    # Bundles a current SQLite with JSON1 and FTS5, independent of the system libsqlite3
+    import pysqlite3 as sqlite3
+except ImportError:
+    import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from uuid import uuid4
 from pathlib import Path
 from datetime import datetime
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+
+try:
+    import orjson
+
+    def _dumps(obj: Any) -> bytes:
+        # Non-string keys are coerced to strings, as json.dumps does
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+
+    _loads = orjson.loads
+
+    def _copy(obj: Any) -> Any:
+        # Cached sessions hold only decoded JSON, and an orjson round trip copies that
+        # faster than copy.deepcopy
+        return orjson.loads(orjson.dumps(obj))
+except ImportError:
+    import json
+    from copy import deepcopy as _copy
+
+    def _dumps(obj: Any) -> bytes:
+        return json.dumps(obj).encode()
+
+    _loads = json.loads
+
+# DELETE ... RETURNING needs SQLite 3.35+
+HAS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+# Ids per IN (...) list, well under SQLite's bound-parameter limit
+MAX_IDS_PER_QUERY = 500
+
+# Fields kept in their own columns rather than in the JSON blob; spliced back in on read
+COLUMN_FIELDS = ("session_id", "created_at", "last_activity")
+
+CREATE_SESSIONS_TABLE = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    data BLOB NOT NULL,
+    created_at TEXT NOT NULL,
+    last_activity TEXT NOT NULL
+);
+"""
+
+# Manifest of files generated for each session, so listing them needs no directory walk
+CREATE_MATERIALS_TABLE = """
+CREATE TABLE IF NOT EXISTS materials (
+    session_id TEXT NOT NULL,
+    rel_path TEXT NOT NULL,
+    name TEXT NOT NULL,
+    week INTEGER NOT NULL,
+    type TEXT NOT NULL,
+    format TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    status TEXT NOT NULL,
+    PRIMARY KEY (session_id, rel_path)
+);
+"""
+
+# Adds to the running total_size kept in a session's data
+ADD_TOTAL_SIZE = (
+    "UPDATE sessions SET data = CAST(json_set(CAST(data AS TEXT), '$.total_size', "
+    "coalesce(json_extract(CAST(data AS TEXT), '$.total_size'), 0) + ?) AS BLOB) WHERE session_id = ?"
+)
+
+# Sets total_size on sessions from before it was kept, from the manifest or, for sessions
+# older than the manifest, from the sizes listed in completed_materials
+BACKFILL_TOTAL_SIZE = """
+UPDATE sessions SET data = CAST(json_set(CAST(data AS TEXT), '$.total_size', coalesce(
+    (SELECT sum(size) FROM materials WHERE materials.session_id = sessions.session_id),
+    (SELECT CAST(total(json_extract(value, '$.size')) AS INTEGER)
+     FROM json_each(CAST(data AS TEXT), '$.completed_materials') WHERE type = 'object'),
+    0)) AS BLOB)
+WHERE json_type(CAST(data AS TEXT), '$.total_size') IS NULL;
+"""
+
+# Progress updates for each session, appended as they happen and read back by id
+CREATE_PROGRESS_TABLE = """
+CREATE TABLE IF NOT EXISTS progress_updates (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT NOT NULL,
+    ts TEXT NOT NULL,
+    payload BLOB NOT NULL
+);
+"""
+
+MATERIAL_FIELDS = ("rel_path", "name", "week", "type", "format", "size", "mtime", "status")
+
+# Per-connection settings; journal_mode=WAL is persistent and set once in _init_db.
+# These hold for the stdlib and pysqlite3 builds alike, so neither needs a custom compile.
+CONNECTION_PRAGMAS = (
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-64000",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA wal_autocheckpoint=1000",
+)
 
 
 class SessionStore:
     """SQLite-backed store for session data as JSON blobs."""
 
-    def __init__(self, db_path: Path):
+    def __init__(
+        self,
+        db_path: Path,
+        cache_size: int = 512,
+        cache_ttl: float = 5.0,
+        activity_flush_interval: float = 30.0,
+        checkpoint_every: int = 1000,
+    ):
         self.db_path = Path(db_path)
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        # Parsed sessions recently returned by get(), keyed by id, as (expiry, session).
+        # Every write through this store evicts the entries it touches; the TTL bounds
+        # staleness when another process writes to the same database file.
+        self._cache: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._cache_size = cache_size
+        self._cache_ttl = cache_ttl
+        # One long-lived connection shared by every thread; the lock serializes access to it
+        self._lock = threading.RLock()
+        self._batch_depth = 0
+        self._batch_now: Optional[str] = None
+        # last_activity stamps set by update() but not yet written, keyed by id. Reads overlay
+        # them; flush_activity() writes them all at once, at the latest every flush interval.
+        self._pending_activity: Dict[str, str] = {}
+        self._activity_flush_interval = activity_flush_interval
+        self._activity_flushed_at = time.monotonic()
+        # Commits since the WAL was last truncated; see checkpoint()
+        self._checkpoint_every = checkpoint_every
+        self._commits = 0
+        self._conn = self._connect()
         self._init_db()
 
-    def _get_conn(self) -> sqlite3.Connection:
-        conn = sqlite3.connect(self.db_path)
+    def _connect(self) -> sqlite3.Connection:
+        # Autocommit mode: transactions are opened explicitly by _write(), batch() and _init_db()
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, cached_statements=256, isolation_level=None)
         conn.row_factory = sqlite3.Row
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
         return conn
 
     def _init_db(self) -> None:
-        with self._get_conn() as conn:
-            conn.execute(
-                """
-                CREATE TABLE IF NOT EXISTS sessions (
-                    session_id TEXT PRIMARY KEY,
-                    data TEXT NOT NULL,
-                    created_at TEXT NOT NULL,
-                    last_activity TEXT NOT NULL
+        with self._lock:
+            conn = self._conn
+            # WAL lets readers run alongside a writer and avoids an fsync of the main file per commit.
+            # journal_mode cannot change inside a transaction, so it runs before the schema script.
+            conn.execute("PRAGMA journal_mode=WAL")
+
+            # Databases from before data was stored as raw JSON bytes are converted once
+            columns = {row["name"]: row["type"] for row in conn.execute("PRAGMA table_info(sessions)")}
+            migrate = columns.get("data", "").upper() == "TEXT"
+
+            script = ["BEGIN IMMEDIATE;"]
+            if migrate:
+                script.append("ALTER TABLE sessions RENAME TO sessions_text;")
+            script.append(CREATE_SESSIONS_TABLE)
+            if migrate:
+                script.append(
+                    "INSERT INTO sessions (session_id, data, created_at, last_activity) "
+                    "SELECT session_id, CAST(data AS BLOB), created_at, last_activity FROM sessions_text;"
                 )
-                """
-            )
-            conn.commit()
+                script.append("DROP TABLE sessions_text;")
+            script.append("CREATE INDEX IF NOT EXISTS idx_sessions_last_activity ON sessions(last_activity);")
+            script.append(CREATE_MATERIALS_TABLE)
+            script.append(BACKFILL_TOTAL_SIZE)
+            script.append(CREATE_PROGRESS_TABLE)
+            script.append("CREATE INDEX IF NOT EXISTS idx_progress_session ON progress_updates(session_id, id);")
+            script.append("COMMIT;")
+
+            # One script, one transaction, one commit
+            try:
+                conn.executescript("\n".join(script))
+            except sqlite3.Error:
+                if conn.in_transaction:
+                    conn.rollback()
+                raise
+
+    def close(self) -> None:
+        with self._lock:
+            self.flush_activity()
+            self._conn.close()
+
+    @contextmanager
+    def _write(self) -> Iterator[sqlite3.Connection]:
+        """Run a write in its own transaction, or in the enclosing batch() or write if there is one."""
+        with self._lock:
+            if self._batch_depth or self._conn.in_transaction:
+                yield self._conn
+                return
+
+            # IMMEDIATE takes the write lock up front, so reads inside the write see what gets written
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            self._committed()
+
+    @contextmanager
+    def batch(self) -> Iterator["SessionStore"]:
+        """Group every write in the block into one transaction with a single commit.
+
+        Other threads wait for the batch to finish, since they share the connection.
+        """
+        with self._lock:
+            if not self._batch_depth:
+                self._conn.execute("BEGIN IMMEDIATE")
+                # Everything in the batch commits together, so it shares one timestamp
+                self._batch_now = datetime.now().isoformat()
+            self._batch_depth += 1
+            try:
+                yield self
+            except BaseException:
+                self._batch_depth -= 1
+                if not self._batch_depth:
+                    self._batch_now = None
+                    self._conn.rollback()
+                    # get() may have cached rows written by the rolled-back batch
+                    self._cache.clear()
+                raise
+            self._batch_depth -= 1
+            if not self._batch_depth:
+                self._batch_now = None
+                self.flush_activity()
+                self._conn.commit()
+                self._committed()
+
+    def _committed(self) -> None:
+        self._commits += 1
+        if self._commits >= self._checkpoint_every:
+            self.checkpoint()
+
+    def checkpoint(self) -> None:
+        """Copy the WAL back into the database file and truncate it.
+
+        Automatic checkpoints never shrink the WAL file, and one stalled by a long
+        read lets it keep growing; this resets it to zero bytes.
+        """
+        with self._lock:
+            self._commits = 0
+            if self._conn.in_transaction:
+                return
+            busy, _, _ = self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+            if busy:
+                # Another connection is reading; the next checkpoint will catch up
+                self._commits = self._checkpoint_every // 2
+
+    def _now(self) -> str:
+        return self._batch_now or datetime.now().isoformat()
 
     def create(self, initial_data: Optional[Dict[str, Any]] = None) -> str:
         session_id = initial_data.get("session_id") if initial_data else None
         if not session_id:
-            # Do not import uuid here to keep this module self-contained
             # The caller should set session_id when needed; but generate if not provided
-            import uuid
-            session_id = str(uuid.uuid4())
+            session_id = uuid4().hex
 
-        now = datetime.now().isoformat()
-        data = initial_data or {}
-        data["session_id"] = session_id
+        now = self._now()
+        if initial_data:
+            initial_data["session_id"] = session_id
+            created_at = initial_data.get("created_at") or now
+            last_activity = initial_data.get("last_activity") or now
+            payload = _dumps({k: v for k, v in initial_data.items() if k not in COLUMN_FIELDS})
+        else:
+            # A blank session has nothing outside its columns, so there is nothing to encode
+            created_at = last_activity = now
+            payload = b"{}"
 
-        with self._get_conn() as conn:
+        with self._write() as conn:
             conn.execute(
                 "INSERT OR REPLACE INTO sessions (session_id, data, created_at, last_activity) VALUES (?, ?, ?, ?)",
-                (session_id, json.dumps(data), now, now),
+                (session_id, payload, created_at, last_activity),
             )
-            conn.commit()
+            self._cache.pop(session_id, None)
+            self._pending_activity.pop(session_id, None)
         return session_id
 
     def get(self, session_id: str) -> Dict[str, Any]:
-        with self._get_conn() as conn:
-            cur = conn.execute(
-                "SELECT data FROM sessions WHERE session_id = ?",
+        with self._lock:
+            cached = self._cache.get(session_id)
+            if cached and cached[0] > time.monotonic():
+                self._cache.move_to_end(session_id)
+                # Callers mutate what they get, nested lists and dicts included, so every hit
+                # hands out a deep copy and the cached session only changes through writes
+                return _copy(cached[1])
+
+            row = self._conn.execute(
+                "SELECT session_id, data, created_at, last_activity FROM sessions WHERE session_id = ?",
                 (session_id,),
-            )
-            row = cur.fetchone()
+            ).fetchone()
             if not row:
                 return {}
             try:
-                return json.loads(row["data"]) or {}
+                session = self._to_session(row)
             except Exception:
                 return {}
+            # Cached entries keep the overlaid stamp; update() evicts them when it changes
+
+            self._cache[session_id] = (time.monotonic() + self._cache_ttl, session)
+            self._cache.move_to_end(session_id)
+            if len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+            return _copy(session)
+
+    def get_many(self, session_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Fetch several sessions with one query per 500 ids. Unknown ids are left out."""
+        results: Dict[str, Dict[str, Any]] = {}
+        with self._lock:
+            now = time.monotonic()
+            missing = []
+            for session_id in dict.fromkeys(session_ids):
+                cached = self._cache.get(session_id)
+                if cached and cached[0] > now:
+                    results[session_id] = _copy(cached[1])
+                else:
+                    missing.append(session_id)
+
+            for start in range(0, len(missing), MAX_IDS_PER_QUERY):
+                chunk = missing[start:start + MAX_IDS_PER_QUERY]
+                placeholders = ", ".join("?" for _ in chunk)
+                rows = self._conn.execute(
+                    "SELECT session_id, data, created_at, last_activity FROM sessions "
+                    f"WHERE session_id IN ({placeholders})",
+                    chunk,
+                ).fetchall()
+                for row in rows:
+                    try:
+                        results[row["session_id"]] = self._to_session(row)
+                    except Exception:
+                        continue
+        return results
+
+    def _to_session(self, row: sqlite3.Row) -> Dict[str, Any]:
+        data = _loads(row["data"]) or {}
+        for field in COLUMN_FIELDS:
+            data[field] = row[field]
+        pending = self._pending_activity.get(data["session_id"])
+        if pending:
+            data["last_activity"] = pending
+        return data
 
     def exists(self, session_id: str) -> bool:
-        with self._get_conn() as conn:
-            cur = conn.execute(
-                "SELECT 1 FROM sessions WHERE session_id = ?",
+        with self._lock:
+            cached = self._cache.get(session_id)
+            if cached and cached[0] > time.monotonic():
+                return True
+            cur = self._conn.execute(
+                "SELECT 1 FROM sessions WHERE session_id = ? LIMIT 1",
                 (session_id,),
             )
             return cur.fetchone() is not None
 
     def update(self, session_id: str, data_updates: Dict[str, Any]) -> bool:
-        current = self.get(session_id)
-        if not current:
-            return False
-        current.update(data_updates)
-        current["last_activity"] = datetime.now().isoformat()
-        with self._get_conn() as conn:
-            conn.execute(
-                "UPDATE sessions SET data = ?, last_activity = ? WHERE session_id = ?",
-                (json.dumps(current), current["last_activity"], session_id),
-            )
-            conn.commit()
-        return True
+        updates = {k: v for k, v in data_updates.items() if k not in COLUMN_FIELDS}
+        last_activity = self._now()
+
+        # Set each top-level key inside SQLite rather than rewriting the whole blob;
+        # json_set replaces values the same way dict.update does. JSON functions read
+        # BLOB arguments as SQLite's binary JSONB, so the stored bytes go through TEXT.
+        # last_activity is not written here; it is held in memory until flush_activity()
+        params: List[Any] = []
+        encoded: Dict[str, bytes] = {}
+        if updates:
+            assignments = ", ".join("?, json(?)" for _ in updates)
+            data_sql = f"CAST(json_set(CAST(data AS TEXT), {assignments}) AS BLOB)"
+            for key, value in updates.items():
+                encoded[key] = _dumps(value)
+                params.extend((f'$."{key}"', encoded[key].decode()))
+        else:
+            data_sql = "data"
+        created_at = data_updates.get("created_at")
+
+        with self._write() as conn:
+            cached = self._cache.get(session_id)
+            if cached and cached[0] <= time.monotonic():
+                cached = None
+            if updates or created_at:
+                cur = conn.execute(
+                    f"UPDATE sessions SET data = {data_sql}, created_at = COALESCE(?, created_at) "
+                    "WHERE session_id = ?",
+                    (*params, created_at, session_id),
+                )
+                found = cur.rowcount > 0
+            else:
+                # Nothing but activity to record, so the row is only checked, not rewritten
+                found = cached is not None or conn.execute(
+                    "SELECT 1 FROM sessions WHERE session_id = ? LIMIT 1", (session_id,)
+                ).fetchone() is not None
+
+            if found and cached:
+                # Apply the write to the cached copy instead of dropping it, so the next get()
+                # needs no query or parse. Values are decoded from the bytes just stored, which
+                # matches what a re-read would return and shares nothing with the caller.
+                session = dict(cached[1])
+                for key, value in encoded.items():
+                    session[key] = _loads(value)
+                if created_at:
+                    session["created_at"] = created_at
+                session["last_activity"] = last_activity
+                # The original expiry stands; it bounds staleness against other writers
+                self._cache[session_id] = (cached[0], session)
+            else:
+                self._cache.pop(session_id, None)
+
+            if found:
+                self._pending_activity[session_id] = last_activity
+                if time.monotonic() - self._activity_flushed_at >= self._activity_flush_interval:
+                    self.flush_activity()
+            return found
+
+    def flush_activity(self) -> int:
+        """Write every pending last_activity stamp in one transaction. Returns the number written."""
+        with self._lock:
+            self._activity_flushed_at = time.monotonic()
+            if not self._pending_activity:
+                return 0
+            pending = [(stamp, session_id) for session_id, stamp in self._pending_activity.items()]
+            with self._write() as conn:
+                conn.executemany("UPDATE sessions SET last_activity = ? WHERE session_id = ?", pending)
+                self._pending_activity.clear()
+            return len(pending)
 
     def delete(self, session_id: str) -> bool:
-        with self._get_conn() as conn:
+        with self._write() as conn:
             cur = conn.execute(
                 "DELETE FROM sessions WHERE session_id = ?",
                 (session_id,),
             )
-            conn.commit()
+            conn.execute("DELETE FROM materials WHERE session_id = ?", (session_id,))
+            conn.execute("DELETE FROM progress_updates WHERE session_id = ?", (session_id,))
+            self._cache.pop(session_id, None)
+            self._pending_activity.pop(session_id, None)
             return cur.rowcount > 0
 
+    def delete_many(self, session_ids: List[str]) -> int:
+        """Delete several sessions in one transaction. Returns the number deleted."""
+        ids = list(dict.fromkeys(session_ids))
+        deleted = 0
+        with self._write() as conn:
+            for start in range(0, len(ids), MAX_IDS_PER_QUERY):
+                chunk = ids[start:start + MAX_IDS_PER_QUERY]
+                placeholders = ", ".join("?" for _ in chunk)
+                cur = conn.execute(f"DELETE FROM sessions WHERE session_id IN ({placeholders})", chunk)
+                deleted += cur.rowcount
+                conn.execute(f"DELETE FROM materials WHERE session_id IN ({placeholders})", chunk)
+                conn.execute(f"DELETE FROM progress_updates WHERE session_id IN ({placeholders})", chunk)
+            for session_id in ids:
+                self._cache.pop(session_id, None)
+                self._pending_activity.pop(session_id, None)
+        return deleted
+
+    def iter_all(self, page_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        """Yield every session, fetching and parsing one page of rows at a time."""
+        last_id = ""
+        while True:
+            # Keyset pagination: the lock is only held while a page is fetched, never across a yield
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT session_id, data, created_at, last_activity FROM sessions "
+                    "WHERE session_id > ? ORDER BY session_id LIMIT ?",
+                    (last_id, page_size),
+                ).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                try:
+                    yield self._to_session(row)
+                except Exception:
+                    continue
+            last_id = rows[-1]["session_id"]
+
     def list_all(self) -> List[Dict[str, Any]]:
-        with self._get_conn() as conn:
-            cur = conn.execute("SELECT data FROM sessions")
-            rows = cur.fetchall()
-            results: List[Dict[str, Any]] = []
+        return list(self.iter_all())
+
+    def iter_fields(self, fields: Dict[str, str], page_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        """Yield selected values from every session without decoding whole blobs.
+
+        fields maps each output key to a JSON path into the session data, e.g.
+        {"title": "$.module_data.title"}. Missing paths come back as None, and the
+        session_id, created_at and last_activity columns are always included.
+        """
+        names = list(fields)
+        # SQLite extracts the fields and packs them into one small JSON object per row
+        projection = ", ".join("?, json_extract(doc, ?)" for _ in names)
+        sql = (
+            f"SELECT session_id, created_at, last_activity, json_object({projection}) AS data "
+            "FROM (SELECT session_id, created_at, last_activity, CAST(data AS TEXT) AS doc FROM sessions "
+            "WHERE session_id > ? ORDER BY session_id LIMIT ?)"
+        )
+        params: List[Any] = []
+        for name in names:
+            params.extend((name, fields[name]))
+
+        last_id = ""
+        while True:
+            with self._lock:
+                rows = self._conn.execute(sql, (*params, last_id, page_size)).fetchall()
+            if not rows:
+                return
             for row in rows:
                 try:
-                    results.append(json.loads(row["data"]))
+                    yield self._to_session(row)
                 except Exception:
                     continue
-            return results
+            last_id = rows[-1]["session_id"]
+
+    def list_page(self, columns: Dict[str, str], limit: int, offset: int = 0) -> List[Dict[str, Any]]:
+        """Return one page of sessions, most recently active first, without decoding whole blobs.
+
+        columns maps each output key to an SQL expression over doc, the session data as JSON
+        text, e.g. {"weeks": "json_array_length(doc, '$.week_plans')"}. The expressions are
+        spliced into the query, so they must come from code, never from input. The
+        session_id, created_at and last_activity columns are always included.
+        """
+        names = list(columns)
+        projection = ", ".join(f"?, {columns[name]}" for name in names)
+        sql = (
+            f"SELECT session_id, created_at, last_activity, json_object({projection}) AS data "
+            "FROM (SELECT session_id, created_at, last_activity, CAST(data AS TEXT) AS doc FROM sessions "
+            "ORDER BY last_activity DESC LIMIT ? OFFSET ?)"
+        )
+        with self._lock:
+            # Pending stamps decide the order, so they land first
+            self.flush_activity()
+            rows = self._conn.execute(sql, (*names, limit, offset)).fetchall()
+        results = []
+        for row in rows:
+            try:
+                results.append(self._to_session(row))
+            except Exception:
+                continue
+        return results
 
     def prune_inactive_before(self, cutoff_iso: str) -> List[str]:
         """Delete sessions with last_activity earlier than cutoff. Returns deleted ids."""
-        with self._get_conn() as conn:
-            cur = conn.execute(
-                "SELECT session_id, last_activity FROM sessions WHERE last_activity < ?",
-                (cutoff_iso,),
-            )
-            ids = [r["session_id"] for r in cur.fetchall()]
-            if ids:
-                conn.executemany(
-                    "DELETE FROM sessions WHERE session_id = ?",
-                    [(sid,) for sid in ids],
+        with self._write() as conn:
+            # Pending stamps may move sessions past the cutoff, so they land first
+            self.flush_activity()
+            # Pruning is rare and may remove many sessions; start the cache over
+            self._cache.clear()
+            if HAS_RETURNING:
+                cur = conn.execute(
+                    "DELETE FROM sessions WHERE last_activity < ? RETURNING session_id",
+                    (cutoff_iso,),
+                )
+                ids = [r["session_id"] for r in cur.fetchall()]
+            else:
+                # _write() already holds the write lock, so the ids read match the rows deleted
+                cur = conn.execute(
+                    "SELECT session_id FROM sessions WHERE last_activity < ?",
+                    (cutoff_iso,),
                 )
-                conn.commit()
+                ids = [r["session_id"] for r in cur.fetchall()]
+                if ids:
+                    conn.execute(
+                        "DELETE FROM sessions WHERE last_activity < ?",
+                        (cutoff_iso,),
+                    )
+            if ids:
+                conn.execute("DELETE FROM materials WHERE session_id NOT IN (SELECT session_id FROM sessions)")
+                conn.execute("DELETE FROM progress_updates WHERE session_id NOT IN (SELECT session_id FROM sessions)")
             return ids
 
+    def add_material(self, session_id: str, material: Dict[str, Any]) -> None:
+        """Record a generated file in the manifest, replacing any entry for the same path."""
+        placeholders = ", ".join("?" for _ in MATERIAL_FIELDS)
+        size = int(material["size"])
+        with self._write() as conn:
+            previous = conn.execute(
+                "SELECT size FROM materials WHERE session_id = ? AND rel_path = ?",
+                (session_id, material["rel_path"]),
+            ).fetchone()
+            conn.execute(
+                f"INSERT OR REPLACE INTO materials (session_id, {', '.join(MATERIAL_FIELDS)}) "
+                f"VALUES (?, {placeholders})",
+                (session_id, *(size if field == "size" else material[field] for field in MATERIAL_FIELDS)),
+            )
+            # The session keeps a running total_size so summaries never have to sum the manifest
+            delta = size - (previous["size"] if previous else 0)
+            if delta:
+                conn.execute(ADD_TOTAL_SIZE, (delta, session_id))
+                self._cache.pop(session_id, None)
+
+    def list_materials(self, session_id: str) -> List[Dict[str, Any]]:
+        """Return the manifest entries for a session, ordered by week and then name."""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(MATERIAL_FIELDS)} FROM materials WHERE session_id = ? ORDER BY week, name",
+                (session_id,),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def append_progress(self, session_id: str, updates: List[Dict[str, Any]]) -> None:
+        """Append progress updates for a session, one row each, without touching the session row."""
+        now = self._now()
+        rows = [(session_id, update.get("timestamp") or now, _dumps(update)) for update in updates]
+        with self._write() as conn:
+            conn.executemany("INSERT INTO progress_updates (session_id, ts, payload) VALUES (?, ?, ?)", rows)
+
+    def progress_since(self, session_id: str, after_id: int = 0) -> List[Tuple[int, Dict[str, Any]]]:
+        """Return (id, update) for a session's progress updates with ids above after_id, oldest first."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, payload FROM progress_updates WHERE session_id = ? AND id > ? ORDER BY id",
+                (session_id, after_id),
+            ).fetchall()
+        return [(row["id"], _loads(row["payload"])) for row in rows]
@@ -4,68 +4,78 @@ Main FastAPI application for the AI-Powered Course Material Generator
 
 import os
 import shutil
-import json
+from stat import S_ISREG
+import orjson
 import re
-import math
 import logging
+import importlib
+from functools import cache
 from pathlib import Path
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Set
 import uuid
 from datetime import datetime
-import logging
 import asyncio
-import shutil
-import tempfile
-import zipfile
+import time
 from concurrent.futures import ThreadPoolExecutor
 
-from fastapi import FastAPI, File, UploadFile, Request, Form, HTTPException, Depends
+from fastapi import FastAPI, File, UploadFile, Request, Form, HTTPException
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse, FileResponse, JSONResponse, StreamingResponse
+from fastapi.responses import HTMLResponse, FileResponse, ORJSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
 import uvicorn
+import aiofiles
 from dotenv import load_dotenv
+from streaming_form_data import StreamingFormDataParser
+from streaming_form_data.parser import ParseFailedException
+from streaming_form_data.targets import BaseTarget, ValueTarget
+from zipstream import ZipStream
 
 # Import the models from the models module
 from models.schemas import (
     ModuleData, 
     WeekPlan, 
     GeneratedContent, 
-    LearningOutcome, 
-    Assessment,
-    ContentItem,
-    WeeklyContent,
-    SessionData,
-    ResourceFile,
-    MaterialGenerationRequest,
-    RegenerationRequest
+    ContentItem
 )
 
 try:
-    from agents.ingestion_agent import IngestionAgent
-    from agents.planning_agent import PlanningAgent
-    from agents.content_generator import ContentGenerator
-    from agents.packaging_agent import PackagingAgent
-    from utils.file_parser import FileParser
-    from utils.export_tools import ExportTools
+    from utils.export_tools import EXPORT_POOL, export_markdown
+    from utils.llm_config import LLMConfig
 except ImportError as e:
     print(f"Warning: Could not import some modules: {e}")
     print("Some features may not work properly until all dependencies are installed.")
 
+# Agent classes pull in CrewAI and LangChain, so they are imported on first use rather than at startup
+AGENT_MODULES = {
+    'IngestionAgent': 'agents.ingestion_agent',
+    'PlanningAgent': 'agents.planning_agent',
+    'ContentGenerator': 'agents.content_generator',
+    'PackagingAgent': 'agents.packaging_agent'
+}
+
+@cache
+def get_agent_class(name: str):
+    """Import and return an agent class by name"""
+    return getattr(importlib.import_module(AGENT_MODULES[name]), name)
+
 # Load environment variables
 load_dotenv()
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+# Configure logging; this is the only place the root logger is set up. LOG_LEVEL=DEBUG turns on
+# the diagnostic logging in the agents, which is otherwise never formatted.
+logging.basicConfig(
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
 logger = logging.getLogger(__name__)
 
 # Initialize FastAPI app
 app = FastAPI(
     title="AI Course Material Generator", 
     version="1.0.0",
-    description="Generate comprehensive course materials with AI assistance"
+    description="Generate comprehensive course materials with AI assistance",
+    default_response_class=ORJSONResponse
 )
 
 # Add CORS middleware
@@ -91,13 +101,23 @@ UPLOAD_DIR.mkdir(exist_ok=True)
 
 # Persistent storage for session data (SQLite-backed)
 from db import SessionStore
+from utils.material_layout import MATERIAL_LAYOUT
 session_store = SessionStore(Path("data") / "app.db")
 regeneration_requests = {}
 
+# Every session store call runs on this one thread, as aiosqlite does with its connection,
+# so SQLite I/O never blocks the event loop and calls reach the store one at a time
+DB_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="session-db")
+
+async def run_db(func, *args):
+    """Run a session store function on the database thread"""
+    return await asyncio.get_running_loop().run_in_executor(DB_EXECUTOR, func, *args)
+
 class SessionManager:
     @staticmethod
-    def create_session() -> str:
+    async def create_session() -> str:
         session_id = str(uuid.uuid4())
+        now = datetime.now().isoformat()
         base = {
             'session_id': session_id,
             'module_data': None,
@@ -105,26 +125,30 @@ class SessionManager:
             'generated_content': {},
             'status': 'initialized',
             'generation_status': 'initialized',
-            'created_at': datetime.now().isoformat(),
-            'last_activity': datetime.now().isoformat(),
+            'created_at': now,
+            'last_activity': now,
             'total_materials': 0,
             'completed_materials': [],
-            'progress_updates': [],
             'teaching_methods': [],
             'learning_approaches': [],
             'resource_files': {}
         }
-        session_store.create(base)
+        await run_db(session_store.create, base)
         return session_id
     
     @staticmethod
-    def get_session(session_id: str) -> dict:
-        return session_store.get(session_id)
+    async def get_session(session_id: str) -> dict:
+        return await run_db(session_store.get, session_id)
     
     @staticmethod
-    def update_session(session_id: str, data: dict):
-        if session_store.exists(session_id):
-            session_store.update(session_id, data)
+    async def update_session(session_id: str, data: dict):
+        # update() is a single UPDATE that leaves unknown sessions untouched, so no existence check first
+        await run_db(session_store.update, session_id, data)
+    
+    @staticmethod
+    async def delete_session(session_id: str) -> bool:
+        materials_cache.pop(session_id, None)
+        return await run_db(session_store.delete, session_id)
 
 # Error handling middleware
 @app.middleware("http")
@@ -135,7 +159,7 @@ async def error_handling_middleware(request: Request, call_next):
     except Exception as e:
         logger.error(f"Unhandled error in {request.url.path}: {str(e)}")
         if request.url.path.startswith("/api/"):
-            return JSONResponse(
+            return ORJSONResponse(
                 status_code=500,
                 content={"detail": f"Internal server error: {str(e)}"}
             )
@@ -145,111 +169,318 @@ async def error_handling_middleware(request: Request, call_next):
                 "error": "An unexpected error occurred. Please try again."
             })
 
+# Filename patterns, built once; unsafe characters are replaced with str.translate
+UNSAFE_FILENAME_CHARS = str.maketrans(dict.fromkeys('<>:"/\\|?*', '_'))
+WHITESPACE_RUN = re.compile(r'\s+')
+WEEK_NUMBER = re.compile(r'Week_(\d+)')
+
+FILE_SIZE_UNITS = ('B', 'KB', 'MB', 'GB')
+
 # Utility functions
 def format_file_size(bytes_size: int) -> str:
     """Format file size in human readable format"""
     if bytes_size == 0:
         return '0 B'
     
-    size_names = ['B', 'KB', 'MB', 'GB']
-    i = int(math.floor(math.log(bytes_size, 1024)))
-    p = math.pow(1024, i)
-    s = round(bytes_size / p, 2)
+    # Each unit is 10 bits up from the last, so the bit length picks it without any logarithm
+    i = min((bytes_size.bit_length() - 1) // 10, len(FILE_SIZE_UNITS) - 1)
+    s = round(bytes_size / (1 << (i * 10)), 2)
     
-    return f"{s} {size_names[i]}"
+    return f"{s} {FILE_SIZE_UNITS[i]}"
+
+MEDIA_TYPES = {
+    '.pdf': 'application/pdf',
+    '.docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    '.pptx': 'application/vnd.openxmlformats-officedocument.presentationml.presentation',
+    '.txt': 'text/plain',
+    '.png': 'image/png',
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.gif': 'image/gif'
+}
 
 def get_media_type(file_extension: str) -> str:
     """Get media type for file extension"""
-    media_types = {
-        '.pdf': 'application/pdf',
-        '.docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
-        '.pptx': 'application/vnd.openxmlformats-officedocument.presentationml.presentation',
-        '.txt': 'text/plain',
-        '.png': 'image/png',
-        '.jpg': 'image/jpeg',
-        '.jpeg': 'image/jpeg',
-        '.gif': 'image/gif'
-    }
-    return media_types.get(file_extension.lower(), 'application/octet-stream')
+    return MEDIA_TYPES.get(file_extension.lower(), 'application/octet-stream')
 
 def sanitize_filename(filename: str) -> str:
     """Sanitize filename for cross-platform compatibility"""
-    filename = re.sub(r'[<>:"/\\|?*]', '_', filename)
-    filename = re.sub(r'\s+', '_', filename)
-    return filename[:50]
+    return WHITESPACE_RUN.sub('_', filename.translate(UNSAFE_FILENAME_CHARS))[:50]
+
+# Progress updates are queued and written by a single task, which appends everything queued
+# since its last write in one transaction; see progress_writer()
+PROGRESS_WRITE_BATCH = 100
+progress_queue: asyncio.Queue = asyncio.Queue()
+progress_writer_task: Optional[asyncio.Task] = None
+
+# Events of the progress streams open for each session; set whenever updates for it are written,
+# so streams wake on new updates instead of polling
+progress_listeners: Dict[str, Set[asyncio.Event]] = {}
+
+# Update types after which a progress stream ends; errors may concern a single material,
+# so the stream ends on them only once the session status says the run failed
+PROGRESS_END_TYPES = {'generation_complete'}
+
+# Seconds an idle progress stream waits before re-checking the session and sending a heartbeat
+PROGRESS_KEEPALIVE = 15.0
+
+# Progress streams must reach the browser as written, so neither caches nor reverse proxies
+# such as nginx may hold them back
+PROGRESS_STREAM_HEADERS = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+
+# Update types whose latest occurrence is also kept on the session as last_milestone, so status
+# checks can report progress without reading the progress table
+PROGRESS_MILESTONE_TYPES = {'generation_start', 'week_complete', 'material_complete', 'generation_complete', 'error'}
+
+def append_progress_updates(batch: Dict[str, tuple]):
+    """Append progress updates for several sessions, with their other session changes, in one
+    transaction on the database thread. batch maps each session id to (updates, session_updates).
+    
+    A session itself is only rewritten when its updates include a milestone or session_updates are given.
+    """
+    with session_store.batch():
+        for session_id, (updates, session_updates) in batch.items():
+            data = dict(session_updates)
+            for update in reversed(updates):
+                if update.get('type') in PROGRESS_MILESTONE_TYPES:
+                    data['last_milestone'] = update
+                    break
+            session_store.append_progress(session_id, updates)
+            session_store.update(session_id, data)
 
-def send_progress_update(session_id: str, update: dict):
-    """Send progress update to session with timestamp"""
-    session_data = SessionManager.get_session(session_id)
-    progress_updates = session_data.get('progress_updates', [])
-    
+def poll_progress(session_id: str, after_id: int) -> tuple:
+    """Return the session and its progress updates newer than after_id, on the database thread"""
+    return session_store.get(session_id), session_store.progress_since(session_id, after_id)
+
+async def progress_writer():
+    """Write queued progress updates until a None is queued, then return.
+    
+    Each write takes up to PROGRESS_WRITE_BATCH queued items, whichever sessions they belong to,
+    and wakes the progress streams of those sessions once it has committed.
+    """
+    running = True
+    while running:
+        items = [await progress_queue.get()]
+        while len(items) < PROGRESS_WRITE_BATCH and not progress_queue.empty():
+            items.append(progress_queue.get_nowait())
+        
+        batch: Dict[str, tuple] = {}
+        waiters = []
+        for item in items:
+            if item is None:
+                running = False
+                continue
+            session_id, update, session_updates, written = item
+            updates, data = batch.setdefault(session_id, ([], {}))
+            updates.append(update)
+            if session_updates:
+                data.update(session_updates)
+            if written:
+                waiters.append(written)
+        if not batch:
+            continue
+        
+        try:
+            await run_db(append_progress_updates, batch)
+        except Exception as e:
+            logger.error(f"Error writing progress updates: {str(e)}")
+            for written in waiters:
+                if not written.done():
+                    written.set_exception(e)
+            continue
+        
+        for written in waiters:
+            if not written.done():
+                written.set_result(None)
+        for session_id in batch:
+            for event in progress_listeners.get(session_id, ()):
+                event.set()
+
+async def send_progress_update(session_id: str, update: dict, session_updates: Optional[dict] = None):
+    """Send progress update to session with timestamp
+    
+    session_updates, such as a status change the update announces, are written with it, and
+    the call then waits until both are stored. Other updates are queued without waiting.
+    """
     # Add timestamp to update
     update['timestamp'] = datetime.now().isoformat()
     
-    progress_updates.append(update)
-    SessionManager.update_session(session_id, {'progress_updates': progress_updates})
-
-def get_session_materials(session_id: str) -> list:
-    """Get all materials for a session"""
-    materials = []
+    written = asyncio.get_running_loop().create_future() if session_updates else None
+    progress_queue.put_nowait((session_id, update, session_updates, written))
+    if written:
+        await written
+
+# Generation runs in progress; the event loop keeps only weak references to tasks
+background_tasks: Set[asyncio.Task] = set()
+
+def start_background_task(coro) -> asyncio.Task:
+    """Run a coroutine as a task that is kept alive until it finishes"""
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+# Set by the pause and stop endpoints; the running generation task checks it between materials
+generation_cancel_events: Dict[str, asyncio.Event] = {}
+
+def start_generation_run(session_id: str) -> asyncio.Event:
+    """Register a generation run for the session and return its cancel event"""
+    cancel_event = asyncio.Event()
+    generation_cancel_events[session_id] = cancel_event
+    return cancel_event
+
+def end_generation_run(session_id: str, cancel_event: asyncio.Event):
+    """Drop the session's cancel event unless a newer run has replaced it"""
+    if generation_cancel_events.get(session_id) is cancel_event:
+        del generation_cancel_events[session_id]
+
+def cancel_generation_run(session_id: str):
+    """Signal the session's running generation task, if any, to stop after its current material"""
+    cancel_event = generation_cancel_events.get(session_id)
+    if cancel_event:
+        cancel_event.set()
+
+# Recent stat results by path, so a file written and registered is not stat'ed again for its progress update
+STAT_CACHE_TTL = 1.0
+STAT_CACHE_MAX = 4096
+stat_cache: Dict[str, tuple] = {}
+
+def refresh_stat(file_path: Path) -> os.stat_result:
+    """Stat a file and cache the result; called whenever the file has just been written"""
+    if len(stat_cache) >= STAT_CACHE_MAX:
+        stat_cache.clear()
+    stat = file_path.stat()
+    stat_cache[str(file_path)] = (time.monotonic(), stat)
+    return stat
+
+def stat_file(file_path: Path) -> os.stat_result:
+    """Return the cached stat result for a file if it is recent, otherwise stat it again"""
+    cached = stat_cache.get(str(file_path))
+    if cached and time.monotonic() - cached[0] < STAT_CACHE_TTL:
+        return cached[1]
+    return refresh_stat(file_path)
+
+def index_session_materials(session_id: str) -> list:
+    """Add every file in the session's output directory to the manifest and return its entries"""
     output_dir = OUTPUT_DIR / session_id
-    
     if not output_dir.exists():
-        return materials
+        return []
+    with session_store.batch():
+        for rel_path, entry in scan_output_files(str(output_dir)):
+            session_store.add_material(session_id, material_entry(rel_path, entry.name, entry.stat(follow_symlinks=False)))
+    return session_store.list_materials(session_id)
+
+def scan_output_files(directory: str, prefix: str = ''):
+    """Yield (relative path, DirEntry) for every non-hidden file below a directory"""
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.name[0] == '.':
+                continue
+            rel_path = prefix + entry.name
+            if entry.is_dir(follow_symlinks=False):
+                yield from scan_output_files(entry.path, rel_path + os.sep)
+            elif entry.is_file(follow_symlinks=False):
+                yield rel_path, entry
+
+# Materials listings and their totals by session, as built by load_session_materials.
+# record_material drops a session's entry, so a listing is rebuilt only after a file is added.
+MATERIALS_CACHE_MAX = 256
+materials_cache: Dict[str, dict] = {}
+
+def load_session_materials(session_id: str) -> dict:
+    """Return the session's materials listing and totals, from the cache or the manifest.
+    
+    Runs on the database thread, so no record_material can land between the read and the caching.
+    """
+    cached = materials_cache.get(session_id)
+    if cached is not None:
+        return cached
+    
+    rows = session_store.list_materials(session_id)
+    if not rows:
+        # Outputs written before the manifest existed are indexed from disk once
+        rows = index_session_materials(session_id)
+    
+    materials = [
+        {
+            'id': str(material_id),
+            'name': row['name'],
+            'path': row['rel_path'],
+            'week': row['week'],
+            'type': row['type'],
+            'format': row['format'],
+            'size': row['size'],
+            'generated_at': datetime.fromtimestamp(row['mtime']).isoformat(),
+            'status': row['status']
+        }
+        for material_id, row in enumerate(rows, 1)
+    ]
+    total_size = sum(row['size'] for row in rows)
+    listing = {
+        'materials': materials,
+        'total_files': len(materials),
+        'total_size': total_size,
+        'total_size_text': format_file_size(total_size),
+        'total_weeks': len({row['week'] for row in rows if row['week'] > 0})
+    }
     
-    material_id = 1
+    if len(materials_cache) >= MATERIALS_CACHE_MAX:
+        materials_cache.clear()
+    materials_cache[session_id] = listing
+    return listing
+
+async def get_session_materials(session_id: str) -> list:
+    """Get all materials for a session"""
+    return (await run_db(load_session_materials, session_id))['materials']
+
+async def register_material(session_id: str, file_path: Path):
+    """Add a file written under the session's output directory to the materials manifest"""
+    await run_db(record_material, session_id, file_path)
+
+def record_material(session_id: str, file_path: Path):
+    """Stat a generated file and store its manifest entry, on the database thread"""
+    relative_path = file_path.relative_to(OUTPUT_DIR / session_id)
+    session_store.add_material(session_id, material_entry(str(relative_path), file_path.name, refresh_stat(file_path)))
+    materials_cache.pop(session_id, None)
+
+def material_entry(rel_path: str, name: str, stat: os.stat_result) -> dict:
+    """Build the manifest entry for a file from its path relative to the output directory"""
+    # Determine week number from filename
+    week_match = WEEK_NUMBER.search(name)
     
-    # Scan all files in output directory
-    for file_path in output_dir.rglob('*'):
-        if file_path.is_file() and not file_path.name.startswith('.'):
-            # Extract information from file path and name
-            relative_path = file_path.relative_to(output_dir)
-            
-            # Determine week number from filename or path
-            week_match = re.search(r'Week_(\d+)', file_path.name)
-            week = int(week_match.group(1)) if week_match else 0
-            
-            # Determine material type from path
-            material_type = determine_material_type(relative_path)
-            
-            materials.append({
-                'id': str(material_id),
-                'name': file_path.name,
-                'path': str(relative_path),
-                'week': week,
-                'type': material_type,
-                'format': file_path.suffix[1:].upper(),
-                'size': file_path.stat().st_size,
-                'generated_at': datetime.fromtimestamp(file_path.stat().st_mtime).isoformat(),
-                'status': 'completed'
-            })
-            
-            material_id += 1
-    
-    return materials
-
-def determine_material_type(file_path: Path) -> str:
-    """Determine material type from file path"""
-    path_str = str(file_path).lower()
-    
-    if 'lecture_notes' in path_str:
-        return 'lecture_notes'
-    elif 'lecture_slides' in path_str:
-        return 'lecture_slides'
-    elif 'transcripts' in path_str:
-        return 'transcripts'
-    elif 'lab_materials' in path_str:
-        return 'lab_materials'
-    elif 'assessments' in path_str:
-        return 'assessments'
-    elif 'seminar_materials' in path_str:
-        return 'seminar_materials'
-    elif 'module_overview' in path_str:
-        return 'module_overview'
-    elif 'instructor_guide' in path_str:
-        return 'instructor_guide'
-    else:
-        return 'other'
+    return {
+        'rel_path': rel_path,
+        'name': name,
+        'week': int(week_match.group(1)) if week_match else 0,
+        'type': determine_material_type(rel_path),
+        'format': os.path.splitext(name)[1][1:].upper(),
+        'size': stat.st_size,
+        'mtime': stat.st_mtime,
+        'status': 'completed'
+    }
+
+# Folder of each weekly material type within the session's output directory
+MATERIAL_SUBDIRS = {material_type: layout.folder for material_type, layout in MATERIAL_LAYOUT.items()}
+
+# Material type by top-level folder, or by file stem for files at the top of the output directory
+MATERIAL_TYPE_BY_PATH = {
+    **{subdir: material_type for material_type, subdir in MATERIAL_SUBDIRS.items()},
+    '00_Module_Overview': 'module_overview',
+    '00_Instructor_Guide': 'instructor_guide'
+}
+
+def create_material_dirs(session_id: str) -> Path:
+    """Create the session's output directory and its material folders, once per generation run"""
+    output_dir = OUTPUT_DIR / session_id
+    for subdir in MATERIAL_SUBDIRS.values():
+        (output_dir / subdir).mkdir(parents=True, exist_ok=True)
+    return output_dir
+
+def determine_material_type(rel_path: str) -> str:
+    """Determine material type from file path relative to the session's output directory"""
+    top, sep, _ = rel_path.partition(os.sep)
+    key = top if sep else os.path.splitext(top)[0]
+    return MATERIAL_TYPE_BY_PATH.get(key, 'other')
 
 # Main routes
 @app.get("/", response_class=HTMLResponse)
@@ -260,7 +491,7 @@ async def home(request: Request):
 @app.get("/upload", response_class=HTMLResponse)
 async def upload_page(request: Request):
     """Upload page for module specifications"""
-    session_id = SessionManager.create_session()
+    session_id = await SessionManager.create_session()
     return templates.TemplateResponse("upload.html", {
         "request": request,
         "session_id": session_id
@@ -271,94 +502,117 @@ async def health_check():
     """Health check endpoint"""
     return {"status": "healthy", "timestamp": datetime.now().isoformat()}
 
+class UploadFilesTarget(BaseTarget):
+    """Streams each file sent under one form field straight to its own file in UPLOAD_DIR"""
+    
+    def __init__(self, prefix: str):
+        super().__init__()
+        self.prefix = prefix
+        # (client filename, path the part was written to), in upload order
+        self.files: List[tuple] = []
+        self._fd = None
+    
+    async def on_start_async(self):
+        path = UPLOAD_DIR / f"{self.prefix}_{len(self.files)}.part"
+        self.files.append((self.multipart_filename or '', path))
+        self._fd = await aiofiles.open(path, 'wb')
+    
+    async def on_data_received_async(self, chunk: bytes):
+        await self._fd.write(chunk)
+    
+    async def on_finish_async(self):
+        await self._fd.close()
+        self._fd = None
+
 # Upload and processing endpoints
 @app.post("/api/upload")
-async def upload_files(
-    session_id: str = Form(...),
-    module_file: UploadFile = File(...),
-    textbook_files: List[UploadFile] = File(default=[])
-):
+async def upload_files(request: Request):
     """Handle file uploads and process module specifications"""
     
-    # Validate file types
-    allowed_extensions = ['pdf', 'docx', 'doc']
-    if not any(module_file.filename.lower().endswith(ext) for ext in allowed_extensions):
-        raise HTTPException(status_code=400, detail="Invalid file type for module specification")
+    # Parts are written to disk as they arrive, so large textbooks are never held in memory.
+    # The session id may come after the files in the form, so they land under a per-request
+    # name first and are renamed once the whole body has been read.
+    upload_id = uuid.uuid4().hex
+    session_target = ValueTarget()
+    regenerate_target = ValueTarget()
+    module_target = UploadFilesTarget(f"{upload_id}_module")
+    textbook_target = UploadFilesTarget(f"{upload_id}_textbook")
     
     try:
-        logger.info(f"Processing upload for session {session_id}")
+        try:
+            parser = StreamingFormDataParser(headers=request.headers)
+            parser.register('session_id', session_target)
+            parser.register('regenerate', regenerate_target)
+            parser.register('module_file', module_target)
+            parser.register('textbook_files', textbook_target)
+            async for chunk in request.stream():
+                await parser.adata_received(chunk)
+        except ParseFailedException as e:
+            raise HTTPException(status_code=400, detail=f"Invalid upload: {str(e)}")
+        
+        session_id = session_target.value.decode()
+        if not session_id or not module_target.files:
+            raise HTTPException(status_code=400, detail="session_id and module_file are required")
         
-        # Save uploaded files
-        module_path = UPLOAD_DIR / f"{session_id}_{module_file.filename}"
-        with open(module_path, "wb") as buffer:
-            shutil.copyfileobj(module_file.file, buffer)
+        # Validate file types
+        allowed_extensions = ['pdf', 'docx', 'doc']
+        module_filename = Path(module_target.files[0][0]).name
+        if not any(module_filename.lower().endswith(ext) for ext in allowed_extensions):
+            raise HTTPException(status_code=400, detail="Invalid file type for module specification")
         
+        # Move the streamed parts to their final names
+        module_path = UPLOAD_DIR / f"{session_id}_{module_filename}"
+        module_target.files[0][1].replace(module_path)
+        
+        textbook_filenames = []
         textbook_paths = []
-        for textbook in textbook_files:
-            if textbook.filename:
-                textbook_path = UPLOAD_DIR / f"{session_id}_{textbook.filename}"
-                with open(textbook_path, "wb") as buffer:
-                    shutil.copyfileobj(textbook.file, buffer)
+        for filename, part_path in textbook_target.files:
+            # Empty file inputs still send a part, with no filename
+            filename = Path(filename).name
+            if filename:
+                textbook_path = UPLOAD_DIR / f"{session_id}_{filename}"
+                part_path.replace(textbook_path)
+                textbook_filenames.append(filename)
                 textbook_paths.append(textbook_path)
-        
+    finally:
+        # Whatever was not moved into place is left over from a rejected or partial upload
+        for _, part_path in module_target.files + textbook_target.files:
+            part_path.unlink(missing_ok=True)
+    
+    try:
         logger.info(f"Files saved for session {session_id}")
         
         # Process files with ingestion agent
-        ingestion_agent = IngestionAgent()
+        # A "regenerate" field set to true re-runs extraction instead of reusing a cached result
+        ingestion_agent = get_agent_class('IngestionAgent')()
         module_data = await ingestion_agent.process_module_spec(
-            module_path, textbook_paths
+            module_path, textbook_paths,
+            use_cache=regenerate_target.value.decode().lower() not in ('true', '1', 'on')
         )
         
         logger.info(f"Module data processed: {module_data.title}")
         
         # Convert ModuleData to dict for storage
-        module_data_dict = {
-            'title': module_data.title,
-            'code': module_data.code,
-            'credits': module_data.credits,
-            'semester': module_data.semester,
-            'academic_year': module_data.academic_year,
-            'learning_outcomes': [
-                {
-                    'id': lo.id,
-                    'description': lo.description,
-                    'level': lo.level
-                } for lo in module_data.learning_outcomes
-            ],
-            'assessments': [
-                {
-                    'name': assessment.name,
-                    'type': assessment.type,
-                    'weight': assessment.weight,
-                    'description': assessment.description
-                } for assessment in module_data.assessments
-            ],
-            'description': module_data.description,
-            'prerequisites': module_data.prerequisites,
-            'textbooks': module_data.textbooks,
-            'topics': module_data.topics,
-            'teaching_methods': module_data.teaching_methods,
-            'learning_approaches': module_data.learning_approaches
-        }
+        module_data_dict = module_data.model_dump(mode='json')
         
         # Update session with proper logging
-        SessionManager.update_session(session_id, {
+        await SessionManager.update_session(session_id, {
             'module_data': module_data_dict,
             'status': 'ingested',
             'upload_files': {
-                'module_file': module_file.filename,
-                'textbook_files': [f.filename for f in textbook_files if f.filename]
+                'module_file': module_filename,
+                'textbook_files': textbook_filenames
             }
         })
         
         # Verify the data was stored
-        stored_session = SessionManager.get_session(session_id)
+        stored_session = await SessionManager.get_session(session_id)
         if not stored_session.get('module_data'):
             raise Exception("Failed to store module data in session")
         
         logger.info(f"Session {session_id} updated successfully with module data")
         
-        return JSONResponse({
+        return ORJSONResponse({
             "status": "success",
             "message": "Files processed successfully",
             "module_data": module_data_dict,
@@ -397,12 +651,13 @@ def create_fallback_module_data(filename: str) -> dict:
 @app.post("/api/generate-plan")
 async def generate_weekly_plan(
     session_id: str = Form(...),
-    module_info: Optional[str] = Form(None)
+    module_info: Optional[str] = Form(None),
+    regenerate: bool = Form(False)
 ):
-    """Generate weekly plan using planning agent"""
+    """Generate weekly plan using planning agent; regenerate skips the plan cache"""
     
     try:
-        session_data = SessionManager.get_session(session_id)
+        session_data = await SessionManager.get_session(session_id)
         
         if not session_data:
             raise HTTPException(status_code=404, detail="Session not found. Please start a new session.")
@@ -417,41 +672,7 @@ async def generate_weekly_plan(
         
         # Convert dict back to ModuleData object
         try:
-            # Reconstruct learning outcomes
-            learning_outcomes = []
-            for lo_data in module_data_dict.get('learning_outcomes', []):
-                learning_outcomes.append(LearningOutcome(
-                    id=lo_data.get('id', ''),
-                    description=lo_data.get('description', ''),
-                    level=lo_data.get('level')
-                ))
-            
-            # Reconstruct assessments
-            assessments = []
-            for assess_data in module_data_dict.get('assessments', []):
-                assessments.append(Assessment(
-                    name=assess_data.get('name', ''),
-                    type=assess_data.get('type', ''),
-                    weight=assess_data.get('weight', 0),
-                    description=assess_data.get('description')
-                ))
-            
-            # Create ModuleData object
-            module_data = ModuleData(
-                title=module_data_dict.get('title', ''),
-                code=module_data_dict.get('code', ''),
-                credits=module_data_dict.get('credits', 15),
-                semester=module_data_dict.get('semester', ''),
-                academic_year=module_data_dict.get('academic_year', ''),
-                description=module_data_dict.get('description'),
-                prerequisites=module_data_dict.get('prerequisites', []),
-                textbooks=module_data_dict.get('textbooks', []),
-                topics=module_data_dict.get('topics', []),
-                teaching_methods=module_data_dict.get('teaching_methods', []),
-                learning_approaches=module_data_dict.get('learning_approaches', []),
-                learning_outcomes=learning_outcomes,
-                assessments=assessments
-            )
+            module_data = ModuleData.model_validate(module_data_dict)
             
         except Exception as e:
             logger.error(f"Error reconstructing module data: {str(e)}")
@@ -463,46 +684,31 @@ async def generate_weekly_plan(
         # Update module data with any additional info from the form
         if module_info:
             try:
-                additional_info = json.loads(module_info)
+                additional_info = orjson.loads(module_info)
                 if 'topics' in additional_info:
                     module_data.topics.extend(additional_info['topics'])
                 if 'teaching_methods' in additional_info:
                     module_data.teaching_methods = additional_info['teaching_methods']
                 if 'learning_approaches' in additional_info:
                     module_data.learning_approaches = additional_info['learning_approaches']
-            except json.JSONDecodeError:
+            except orjson.JSONDecodeError:
                 logger.warning("Could not parse additional module info")
         
         # Generate weekly plan
-        planning_agent = PlanningAgent()
-        week_plans = await planning_agent.generate_weekly_plan(module_data)
+        planning_agent = get_agent_class('PlanningAgent')()
+        week_plans = await planning_agent.generate_weekly_plan(module_data, use_cache=not regenerate)
         
         # Convert WeekPlan objects to dicts for storage
-        week_plans_dict = []
-        for plan in week_plans:
-            week_plans_dict.append({
-                "week_number": plan.week_number,
-                "title": plan.title,
-                "description": plan.description or "",
-                "learning_outcomes": plan.learning_outcomes,
-                "lecture_topics": plan.lecture_topics,
-                "tutorial_activities": plan.tutorial_activities,
-                "lab_activities": plan.lab_activities,
-                "readings": plan.readings,
-                "deliverables": plan.deliverables,
-                "external_resources": plan.external_resources,
-                "resource_files": plan.resource_files,
-                "teaching_notes": plan.teaching_notes or ""
-            })
+        week_plans_dict = [plan.model_dump(mode='json') for plan in week_plans]
         
         # Update session
-        SessionManager.update_session(session_id, {
+        await SessionManager.update_session(session_id, {
             'week_plans': week_plans_dict,
             'status': 'planned',
             'plan_generated_at': datetime.now().isoformat()
         })
         
-        return JSONResponse({
+        return ORJSONResponse({
             "status": "success",
             "week_plans": week_plans_dict
         })
@@ -513,25 +719,29 @@ async def generate_weekly_plan(
         logger.error(f"Error generating plan for session {session_id}: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error generating plan: {str(e)}")
 
+# Weeks of the fallback plan that carry a lab exercise or an assignment
+FALLBACK_LAB_WEEKS = frozenset({3, 6, 9, 12})
+FALLBACK_ASSIGNMENT_WEEKS = frozenset({4, 8, 12})
+
 def create_fallback_weekly_plan() -> List[dict]:
     """Create fallback weekly plan when AI agents are not available"""
-    weeks = []
-    for i in range(1, 13):
-        weeks.append({
+    return [
+        {
             'week_number': i,
             'title': f'Week {i} - Topic {i}',
             'description': f'This week covers topic {i} with related activities and assessments',
             'learning_outcomes': [f'LO{min(i, 3)}'],
             'lecture_topics': [f'Topic {i}.1', f'Topic {i}.2'],
             'tutorial_activities': [f'Tutorial Activity {i}'],
-            'lab_activities': [] if i % 3 != 0 else [f'Lab Exercise {i}'],
+            'lab_activities': [f'Lab Exercise {i}'] if i in FALLBACK_LAB_WEEKS else [],
             'readings': [f'Reading {i}'],
-            'deliverables': [] if i % 4 != 0 else [f'Assignment {i}'],
+            'deliverables': [f'Assignment {i}'] if i in FALLBACK_ASSIGNMENT_WEEKS else [],
             'external_resources': [],
             'resource_files': [],
             'teaching_notes': f'Focus on practical application of concepts in week {i}'
-        })
-    return weeks
+        }
+        for i in range(1, 13)
+    ]
 
 # Review and approval endpoints
 @app.get("/review/{session_id}", response_class=HTMLResponse)
@@ -541,7 +751,7 @@ async def review_plan(request: Request, session_id: str):
     try:
         logger.info(f"Loading review page for session {session_id}")
         
-        session_data = SessionManager.get_session(session_id)
+        session_data = await SessionManager.get_session(session_id)
         
         if not session_data:
             logger.error(f"Session {session_id} not found")
@@ -585,13 +795,13 @@ async def approve_plan(
     """Approve or modify weekly plans"""
     
     try:
-        week_plans = json.loads(approved_weeks)
-        SessionManager.update_session(session_id, {
+        week_plans = orjson.loads(approved_weeks)
+        await SessionManager.update_session(session_id, {
             'week_plans': week_plans,
             'status': 'approved'
         })
         
-        return JSONResponse({"status": "success", "message": "Plan approved"})
+        return ORJSONResponse({"status": "success", "message": "Plan approved"})
         
     except Exception as e:
         logger.error(f"Error approving plan: {str(e)}")
@@ -600,10 +810,10 @@ async def approve_plan(
 @app.post("/api/save-weekly-plan")
 async def save_weekly_plan(request: Request):
     """Save weekly plan to text file with enhanced information"""
-    data = await request.json()
+    data = orjson.loads(await request.body())
     session_id = data.get('session_id')
     
-    session_data = SessionManager.get_session(session_id)
+    session_data = await SessionManager.get_session(session_id)
     if not session_data.get('week_plans'):
         raise HTTPException(status_code=400, detail="No weekly plan found")
     
@@ -612,99 +822,105 @@ async def save_weekly_plan(request: Request):
         output_dir = OUTPUT_DIR / session_id
         output_dir.mkdir(exist_ok=True)
         
-        # Save detailed weekly plan as text file
+        # Save detailed weekly plan as text file, assembled in memory and written in one call
         plan_file = output_dir / "weekly_plan_detailed.txt"
-        with open(plan_file, 'w', encoding='utf-8') as f:
-            f.write(f"DETAILED WEEKLY PLAN\n")
-            f.write(f"Session: {session_id}\n")
-            f.write(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-            f.write("=" * 60 + "\n\n")
+        parts = []
+        write = parts.append
+        write(f"DETAILED WEEKLY PLAN\n")
+        write(f"Session: {session_id}\n")
+        write(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+        write("=" * 60 + "\n\n")
+        
+        module_data = session_data.get('module_data', {})
+        write(f"MODULE INFORMATION\n")
+        write("-" * 30 + "\n")
+        write(f"Title: {module_data.get('title', 'Unknown')}\n")
+        write(f"Code: {module_data.get('code', 'Unknown')}\n")
+        write(f"Credits: {module_data.get('credits', 'Unknown')}\n")
+        write(f"Semester: {module_data.get('semester', 'Unknown')}\n\n")
+        
+        # Add teaching methods and learning approaches if available
+        teaching_methods = session_data.get('teaching_methods', [])
+        if teaching_methods:
+            write(f"Teaching Methods: {', '.join(teaching_methods)}\n")
+        
+        learning_approaches = session_data.get('learning_approaches', [])
+        if learning_approaches:
+            write(f"Learning Approaches: {', '.join(learning_approaches)}\n")
+        
+        write("\n" + "=" * 60 + "\n\n")
+        
+        for week in session_data['week_plans']:
+            write(f"WEEK {week.get('week_number', '?')}: {week.get('title', 'Untitled')}\n")
+            write("=" * 50 + "\n")
             
-            module_data = session_data.get('module_data', {})
-            f.write(f"MODULE INFORMATION\n")
-            f.write("-" * 30 + "\n")
-            f.write(f"Title: {module_data.get('title', 'Unknown')}\n")
-            f.write(f"Code: {module_data.get('code', 'Unknown')}\n")
-            f.write(f"Credits: {module_data.get('credits', 'Unknown')}\n")
-            f.write(f"Semester: {module_data.get('semester', 'Unknown')}\n\n")
+            # Week description
+            if week.get('description'):
+                write(f"Description:\n{week['description']}\n\n")
             
-            # Add teaching methods and learning approaches if available
-            teaching_methods = session_data.get('teaching_methods', [])
-            if teaching_methods:
-                f.write(f"Teaching Methods: {', '.join(teaching_methods)}\n")
+            if week.get('learning_outcomes'):
+                write("Learning Outcomes:\n")
+                for lo in week['learning_outcomes']:
+                    write(f"  • {lo}\n")
+                write("\n")
             
-            learning_approaches = session_data.get('learning_approaches', [])
-            if learning_approaches:
-                f.write(f"Learning Approaches: {', '.join(learning_approaches)}\n")
+            if week.get('lecture_topics'):
+                write("Lecture Topics:\n")
+                for topic in week['lecture_topics']:
+                    write(f"  • {topic}\n")
+                write("\n")
             
-            f.write("\n" + "=" * 60 + "\n\n")
+            if week.get('tutorial_activities'):
+                write("Tutorial Activities:\n")
+                for activity in week['tutorial_activities']:
+                    write(f"  • {activity}\n")
+                write("\n")
             
-            for week in session_data['week_plans']:
-                f.write(f"WEEK {week.get('week_number', '?')}: {week.get('title', 'Untitled')}\n")
-                f.write("=" * 50 + "\n")
-                
-                # Week description
-                if week.get('description'):
-                    f.write(f"Description:\n{week['description']}\n\n")
-                
-                if week.get('learning_outcomes'):
-                    f.write("Learning Outcomes:\n")
-                    for lo in week['learning_outcomes']:
-                        f.write(f"  • {lo}\n")
-                    f.write("\n")
-                
-                if week.get('lecture_topics'):
-                    f.write("Lecture Topics:\n")
-                    for topic in week['lecture_topics']:
-                        f.write(f"  • {topic}\n")
-                    f.write("\n")
-                
-                if week.get('tutorial_activities'):
-                    f.write("Tutorial Activities:\n")
-                    for activity in week['tutorial_activities']:
-                        f.write(f"  • {activity}\n")
-                    f.write("\n")
-                
-                if week.get('lab_activities'):
-                    f.write("Lab Activities:\n")
-                    for lab in week['lab_activities']:
-                        f.write(f"  • {lab}\n")
-                    f.write("\n")
-                
-                if week.get('readings'):
-                    f.write("Required Readings:\n")
-                    for reading in week['readings']:
-                        f.write(f"  • {reading}\n")
-                    f.write("\n")
-                
-                if week.get('deliverables'):
-                    f.write("Deliverables:\n")
-                    for deliverable in week['deliverables']:
-                        f.write(f"  • {deliverable}\n")
-                    f.write("\n")
-                
-                if week.get('external_resources'):
-                    f.write("External Resources:\n")
-                    for resource in week['external_resources']:
-                        f.write(f"  • {resource}\n")
-                    f.write("\n")
-                
-                # Resource files information
-                resource_files = session_data.get('resource_files', {}).get(f"week_{week.get('week_number', 0)}", [])
-                if resource_files:
-                    f.write("Uploaded Resource Files:\n")
-                    for file_info in resource_files:
-                        f.write(f"  • {file_info.get('original_name', 'Unknown')} ({format_file_size(file_info.get('size', 0))})\n")
-                    f.write("\n")
-                
-                # Teaching notes
-                if week.get('teaching_notes'):
-                    f.write("Teaching Notes:\n")
-                    f.write(f"{week['teaching_notes']}\n\n")
-                
-                f.write("\n" + "-" * 50 + "\n\n")
+            if week.get('lab_activities'):
+                write("Lab Activities:\n")
+                for lab in week['lab_activities']:
+                    write(f"  • {lab}\n")
+                write("\n")
+            
+            if week.get('readings'):
+                write("Required Readings:\n")
+                for reading in week['readings']:
+                    write(f"  • {reading}\n")
+                write("\n")
+            
+            if week.get('deliverables'):
+                write("Deliverables:\n")
+                for deliverable in week['deliverables']:
+                    write(f"  • {deliverable}\n")
+                write("\n")
+            
+            if week.get('external_resources'):
+                write("External Resources:\n")
+                for resource in week['external_resources']:
+                    write(f"  • {resource}\n")
+                write("\n")
+            
+            # Resource files information
+            resource_files = session_data.get('resource_files', {}).get(f"week_{week.get('week_number', 0)}", [])
+            if resource_files:
+                write("Uploaded Resource Files:\n")
+                for file_info in resource_files:
+                    write(f"  • {file_info.get('original_name', 'Unknown')} ({format_file_size(file_info.get('size', 0))})\n")
+                write("\n")
+            
+            # Teaching notes
+            if week.get('teaching_notes'):
+                write("Teaching Notes:\n")
+                write(f"{week['teaching_notes']}\n\n")
+            
+            write("\n" + "-" * 50 + "\n\n")
+        
+        async with aiofiles.open(plan_file, 'w', encoding='utf-8') as f:
+            await f.write(''.join(parts))
+        
+        await register_material(session_id, plan_file)
         
-        return JSONResponse({"status": "success", "file_path": str(plan_file)})
+        return ORJSONResponse({"status": "success", "file_path": str(plan_file)})
         
     except Exception as e:
         logger.error(f"Error saving plan: {str(e)}")
@@ -732,11 +948,11 @@ async def generation_page(request: Request, session_id: str, materials: str = ""
 @app.post("/api/start-generation")
 async def start_generation(request: Request):
     """Start the generation process"""
-    data = await request.json()
+    data = orjson.loads(await request.body())
     session_id = data.get('session_id')
     materials = data.get('materials', [])
     
-    session_data = SessionManager.get_session(session_id)
+    session_data = await SessionManager.get_session(session_id)
     if not session_data:
         raise HTTPException(status_code=400, detail="Session not found")
     
@@ -761,7 +977,7 @@ async def start_generation(request: Request):
     total_materials = (materials_per_week * total_weeks) + overview_materials
     
     # Store generation parameters
-    SessionManager.update_session(session_id, {
+    await SessionManager.update_session(session_id, {
         'generation_materials': materials,
         'generation_status': 'started',
         'total_materials': total_materials,
@@ -769,69 +985,89 @@ async def start_generation(request: Request):
     })
     
     # Start background generation
-    import asyncio
-    asyncio.create_task(generate_materials_background(session_id, materials))
+    start_background_task(generate_materials_background(session_id, materials))
     
-    return JSONResponse({
+    return ORJSONResponse({
         "status": "started",
         "total_weeks": total_weeks,
         "total_materials": total_materials
     })
 
 @app.get("/api/generation-progress/{session_id}")
-async def generation_progress_stream(session_id: str):
-    """Server-sent events for generation progress"""
-    import asyncio
+async def generation_progress_stream(request: Request, session_id: str, last_id: int = 0):
+    """Server-sent events for generation progress
     
-    async def event_stream():
-        while True:
-            session_data = SessionManager.get_session(session_id)
-            status = session_data.get('generation_status', 'unknown')
-            
-            if status == 'completed':
-                yield f"data: {json.dumps({'type': 'generation_complete'})}\n\n"
-                break
-            elif status == 'error':
-                yield f"data: {json.dumps({'type': 'error', 'message': session_data.get('error_message', 'Unknown error')})}\n\n"
-                break
-            
-            # Check for progress updates
-            progress_updates = session_data.get('progress_updates', [])
-            for update in progress_updates:
-                yield f"data: {json.dumps(update)}\n\n"
-            
-            # Clear sent updates
-            SessionManager.update_session(session_id, {'progress_updates': []})
-            
-            await asyncio.sleep(1)  # Check every second
+    Each event carries its update id, so a reconnecting EventSource resumes after the
+    last one it received (Last-Event-ID); last_id does the same for other clients.
+    """
+    last_event_id = request.headers.get('last-event-id', '')
+    if last_event_id.isdigit():
+        last_id = int(last_event_id)
     
-    return StreamingResponse(event_stream(), media_type="text/plain")
+    async def event_stream():
+        nonlocal last_id
+        # Registered before the backlog is read, so nothing written in between is missed
+        new_updates = asyncio.Event()
+        progress_listeners.setdefault(session_id, set()).add(new_updates)
+        try:
+            while True:
+                new_updates.clear()
+                session_data, progress_updates = await run_db(poll_progress, session_id, last_id)
+                
+                for last_id, update in progress_updates:
+                    yield f"id: {last_id}\ndata: {orjson.dumps(update).decode()}\n\n"
+                    if update.get('type') in PROGRESS_END_TYPES:
+                        return
+                
+                # Sessions finished without a final update, e.g. recovered ones, still end the stream
+                status = session_data.get('generation_status', 'unknown')
+                if status == 'completed':
+                    yield f"data: {orjson.dumps({'type': 'generation_complete'}).decode()}\n\n"
+                    return
+                elif status == 'error':
+                    # The failure is written together with its error update, which may just have been sent
+                    if not progress_updates or progress_updates[-1][1].get('type') != 'error':
+                        yield f"data: {orjson.dumps({'type': 'error', 'message': session_data.get('error_message', 'Unknown error')}).decode()}\n\n"
+                    return
+                
+                try:
+                    await asyncio.wait_for(new_updates.wait(), PROGRESS_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield f"data: {orjson.dumps({'type': 'heartbeat'}).decode()}\n\n"
+        finally:
+            listeners = progress_listeners.get(session_id)
+            if listeners is not None:
+                listeners.discard(new_updates)
+                if not listeners:
+                    del progress_listeners[session_id]
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers=PROGRESS_STREAM_HEADERS)
 
 async def generate_materials_background1(session_id: str, materials: List[str]):
     """Background task to generate materials with fallback"""
+    cancel_event = start_generation_run(session_id)
     try:
-        session_data = SessionManager.get_session(session_id)
+        session_data = await SessionManager.get_session(session_id)
         module_data_dict = session_data['module_data']
         week_plans = session_data['week_plans']
         
         # Send generation start event
-        send_progress_update(session_id, {
+        await send_progress_update(session_id, {
             'type': 'generation_start',
             'module_title': module_data_dict.get('title', 'Unknown Module'),
             'total_weeks': len(week_plans)
         })
         
         # Simulate generation process
-        import asyncio
+        create_material_dirs(session_id)
         
         for i, week_plan in enumerate(week_plans):
             # Check if generation should continue
-            current_status = SessionManager.get_session(session_id).get('generation_status')
-            if current_status in ['paused', 'stopped']:
+            if cancel_event.is_set():
                 break
             
             # Send week start update
-            send_progress_update(session_id, {
+            await send_progress_update(session_id, {
                 'type': 'week_start',
                 'week_number': week_plan.get('week_number', i + 1),
                 'week_title': week_plan.get('title', f'Week {i + 1}')
@@ -839,17 +1075,21 @@ async def generate_materials_background1(session_id: str, materials: List[str]):
             
             # Generate materials for this week
             for material_type in materials:
-                if current_status in ['paused', 'stopped']:
+                if cancel_event.is_set():
                     break
                 
                 await simulate_material_generation(session_id, week_plan, material_type)
             
             # Send week complete update
-            send_progress_update(session_id, {
+            await send_progress_update(session_id, {
                 'type': 'week_complete',
                 'week_number': week_plan.get('week_number', i + 1)
             })
         
+        # A paused or stopped run leaves the overview and the completed status for later
+        if cancel_event.is_set():
+            return
+        
         # Generate overview materials
         if 'module_overview' in materials:
             await simulate_overview_generation(session_id, 'module_overview', 'Module Overview')
@@ -858,116 +1098,108 @@ async def generate_materials_background1(session_id: str, materials: List[str]):
             await simulate_overview_generation(session_id, 'instructor_guide', 'Instructor Guide')
         
         # Mark as completed
-        SessionManager.update_session(session_id, {'generation_status': 'completed'})
-        send_progress_update(session_id, {'type': 'generation_complete'})
+        await SessionManager.update_session(session_id, {'generation_status': 'completed'})
+        await send_progress_update(session_id, {'type': 'generation_complete'})
         
     except Exception as e:
         logger.error(f"Error in background generation: {str(e)}")
-        SessionManager.update_session(session_id, {
+        await SessionManager.update_session(session_id, {
             'generation_status': 'error',
             'error_message': str(e)
         })
-        send_progress_update(session_id, {
+        await send_progress_update(session_id, {
             'type': 'error',
             'message': str(e)
         })
+    finally:
+        end_generation_run(session_id, cancel_event)
 
 async def generate_materials_background(session_id: str, materials: List[str]):
     """Background task to generate materials with fallback"""
+    cancel_event = start_generation_run(session_id)
     try:
-        session_data = SessionManager.get_session(session_id)
+        session_data = await SessionManager.get_session(session_id)
         module_data_dict = session_data['module_data']
         week_plans = session_data['week_plans']
         
         # Send generation start event
-        send_progress_update(session_id, {
+        await send_progress_update(session_id, {
             'type': 'generation_start',
             'module_title': module_data_dict.get('title', 'Unknown Module'),
             'total_weeks': len(week_plans)
         })
         
-        # Simulate generation process
-        import asyncio
-        content_generator = ContentGenerator()
+        # The generators take the models, not the stored dicts
+        module_obj = ModuleData.model_validate(module_data_dict)
+        
+        create_material_dirs(session_id)
+        content_generator = get_agent_class('ContentGenerator')()
+        # Materials attempted and saved across the run; a run that saved none has failed
+        attempted = saved = 0
         for i, week_plan in enumerate(week_plans):
             # Check if generation should continue
-            current_status = SessionManager.get_session(session_id).get('generation_status')
-            if current_status in ['paused', 'stopped']:
+            if cancel_event.is_set():
                 break
             
             # Send week start update
-            send_progress_update(session_id, {
+            await send_progress_update(session_id, {
                 'type': 'week_start',
                 'week_number': week_plan.get('week_number', i + 1),
                 'week_title': week_plan.get('title', f'Week {i + 1}')
             })
             
-            # Generate materials for this week
-            if 'lecture_notes' in materials:
-                if current_status in ['paused', 'stopped']:
-                    break
-                await generate_and_save_material(
-                    session_id, content_generator, module_data_dict, week_plan,
-                    'lecture_notes', 'Lecture Notes'
+            # Generate this week's materials concurrently, within the shared limit
+            requested = [(material_type, material_name) for material_type, material_name in WEEKLY_MATERIALS if material_type in materials]
+            week_obj = WeekPlan.model_validate(week_plan)
+            results = await asyncio.gather(*(
+                generate_material_limited(
+                    cancel_event, session_id, content_generator, module_obj, week_obj,
+                    material_type, material_name
                 )
+                for material_type, material_name in requested
+            ), return_exceptions=True)
             
-            if 'lecture_slides' in materials:
-                if current_status in ['paused', 'stopped']:
-                    break
-                await generate_and_save_material(
-                    session_id, content_generator, module_data_dict, week_plan,
-                    'lecture_slides', 'Lecture Slides'
-                )
-            
-            if 'transcripts' in materials:
-                if current_status in ['paused', 'stopped']:
-                    break
-                await generate_and_save_material(
-                    session_id, content_generator, module_data_dict, week_plan,
-                    'transcripts', 'Lecture Transcripts'
-                )
-            
-            if 'lab_materials' in materials:
-                if current_status in ['paused', 'stopped']:
-                    break
-                await generate_and_save_material(
-                    session_id, content_generator, module_data_dict, week_plan,
-                    'lab_materials', 'Lab Materials'
-                )
+            for (material_type, material_name), result in zip(requested, results):
+                if result is not None:
+                    attempted += 1
+                    saved += result is True
+                if isinstance(result, Exception):
+                    logger.error(f"Error generating {material_name}: {str(result)}")
+                    await send_progress_update(session_id, {
+                        'type': 'error',
+                        'message': f"Error generating {material_name} for Week {week_plan.get('week_number', i + 1)}: {str(result)}"
+                    })
             
-            if 'assessments' in materials:
-                if current_status in ['paused', 'stopped']:
-                    break
-                await generate_and_save_material(
-                    session_id, content_generator, module_data_dict, week_plan,
-                    'assessments', 'Assessments'
-                )
-            
-            if 'seminar_materials' in materials:
-                if current_status in ['paused', 'stopped']:
-                    break
-                await generate_and_save_material(
-                    session_id, content_generator, module_data_dict, week_plan,
-                    'seminar_materials', 'Seminar Materials'
-                )
+            if cancel_event.is_set():
+                break
             #for material_type in materials:
-            #    if current_status in ['paused', 'stopped']:
+            #    if cancel_event.is_set():
             #        break
             #    
             #    await simulate_material_generation(session_id, week_plan, material_type)
             
             # Send week complete update
-            send_progress_update(session_id, {
+            await send_progress_update(session_id, {
                 'type': 'week_complete',
                 'week_number': week_plan.get('week_number', i + 1)
             })
         
+        # A paused or stopped run leaves the overview and the completed status for later
+        if cancel_event.is_set():
+            return
+        
+        # Every failure was already reported on its own; the run as a whole must not look complete
+        if attempted and not saved:
+            raise RuntimeError(f"None of the {attempted} requested materials could be generated")
+        
         # Generate overview materials
         if 'module_overview' in materials or 'instructor_guide' in materials:
-            packaging_agent = PackagingAgent()
+            packaging_agent = get_agent_class('PackagingAgent')()
             if 'module_overview' in materials:
                 await packaging_agent._create_module_overview(module_data_dict, OUTPUT_DIR / session_id)
-                send_progress_update(session_id, {
+                await register_material(session_id, OUTPUT_DIR / session_id / "00_Module_Overview.pdf")
+                await register_material(session_id, OUTPUT_DIR / session_id / "00_Module_Overview.docx")
+                await send_progress_update(session_id, {
                     'type': 'material_complete',
                     'week_number': 0,
                     'material_type': 'module_overview',
@@ -983,7 +1215,8 @@ async def generate_materials_background(session_id: str, materials: List[str]):
                     total_files=len(session_data.get('completed_materials', []))
                 )
                 await packaging_agent._create_instructor_guide(module_data_dict, generated_content, OUTPUT_DIR / session_id)
-                send_progress_update(session_id, {
+                await register_material(session_id, OUTPUT_DIR / session_id / "00_Instructor_Guide.pdf")
+                await send_progress_update(session_id, {
                     'type': 'material_complete',
                     'week_number': 0,
                     'material_type': 'instructor_guide',
@@ -997,29 +1230,27 @@ async def generate_materials_background(session_id: str, materials: List[str]):
         #if 'instructor_guide' in materials:
         #    await simulate_overview_generation(session_id, 'instructor_guide', 'Instructor Guide')
         
-        # Mark as completed
-        SessionManager.update_session(session_id, {'generation_status': 'completed'})
-        send_progress_update(session_id, {'type': 'generation_complete'})
+        # Mark as completed; the status and its progress event are written together
+        await send_progress_update(session_id, {'type': 'generation_complete'}, {'generation_status': 'completed'})
         
     except Exception as e:
         logger.error(f"Error in background generation: {str(e)}")
-        SessionManager.update_session(session_id, {
-            'generation_status': 'error',
-            'error_message': str(e)
-        })
-        send_progress_update(session_id, {
+        await send_progress_update(session_id, {
             'type': 'error',
             'message': str(e)
+        }, {
+            'generation_status': 'error',
+            'error_message': str(e)
         })
+    finally:
+        end_generation_run(session_id, cancel_event)
 
 async def simulate_material_generation(session_id: str, week_plan: dict, material_type: str):
     """Simulate material generation for demonstration"""
-    import asyncio
-    
     material_name = f"{material_type.replace('_', ' ').title()} for {week_plan.get('title', 'Week')}"
     
     # Send start update
-    send_progress_update(session_id, {
+    await send_progress_update(session_id, {
         'type': 'material_start',
         'week_number': week_plan.get('week_number', 1),
         'material_type': material_type,
@@ -1029,22 +1260,9 @@ async def simulate_material_generation(session_id: str, week_plan: dict, materia
     # Simulate generation time
     await asyncio.sleep(2)
     
-    # Create output directory
+    # Folders were created when the run started
     output_dir = OUTPUT_DIR / session_id
-    output_dir.mkdir(exist_ok=True)
-    
-    # Create material-specific directories
-    material_dirs = {
-        'lecture_notes': output_dir / "01_Lecture_Notes",
-        'lecture_slides': output_dir / "02_Lecture_Slides",
-        'lab_materials': output_dir / "03_Lab_Materials",
-        'assessments': output_dir / "04_Assessments",
-        'seminar_materials': output_dir / "05_Seminar_Materials",
-        'transcripts': output_dir / "06_Transcripts"
-    }
-    
-    material_dir = material_dirs.get(material_type, output_dir)
-    material_dir.mkdir(exist_ok=True)
+    material_dir = output_dir / MATERIAL_SUBDIRS.get(material_type, '')
     
     # Create sample file
     week_num = week_plan.get('week_number', 1)
@@ -1058,22 +1276,21 @@ async def simulate_material_generation(session_id: str, week_plan: dict, materia
         f.write(f"Description: {week_plan.get('description', 'No description')}\n")
         f.write(f"Generated at: {datetime.now().isoformat()}\n\n")
         f.write("This is a sample generated content file.\n")
+    await register_material(session_id, file_path)
     
     # Send completion update
-    send_progress_update(session_id, {
+    await send_progress_update(session_id, {
         'type': 'material_complete',
         'week_number': week_num,
         'material_type': material_type,
         'material_name': material_name,
-        'file_path': str(file_path.relative_to(OUTPUT_DIR / session_id)),
+        'file_path': str(file_path.relative_to(output_dir)),
         'file_format': 'TXT',
-        'file_size': file_path.stat().st_size
+        'file_size': stat_file(file_path).st_size
     })
 
 async def simulate_overview_generation(session_id: str, material_type: str, material_name: str):
     """Simulate overview material generation"""
-    import asyncio
-    
     await asyncio.sleep(1)
     
     output_dir = OUTPUT_DIR / session_id
@@ -1084,23 +1301,85 @@ async def simulate_overview_generation(session_id: str, material_type: str, mate
         f.write(f"Generated {material_name}\n")
         f.write(f"Generated at: {datetime.now().isoformat()}\n\n")
         f.write("This is a sample overview document.\n")
+    await register_material(session_id, file_path)
     
-    send_progress_update(session_id, {
+    await send_progress_update(session_id, {
         'type': 'material_complete',
         'week_number': 0,
         'material_type': material_type,
         'material_name': material_name,
-        'file_path': str(file_path.relative_to(OUTPUT_DIR / session_id)),
+        'file_path': str(file_path.relative_to(output_dir)),
         'file_format': 'TXT',
-        'file_size': file_path.stat().st_size
+        'file_size': stat_file(file_path).st_size
     })
 
 
-async def generate_and_save_material(session_id: str, content_generator, module_data, week_plan, material_type: str, material_name: str):
-    """Generate and save a specific material type"""
+# Material types generated for every week, in the order they are started
+WEEKLY_MATERIALS = (
+    ('lecture_notes', 'Lecture Notes'),
+    ('lecture_slides', 'Lecture Slides'),
+    ('transcripts', 'Lecture Transcripts'),
+    ('lab_materials', 'Lab Materials'),
+    ('assessments', 'Assessments'),
+    ('seminar_materials', 'Seminar Materials')
+)
+
+# Materials generated at once across all sessions, to bound concurrent LLM calls and exports
+MAX_CONCURRENT_MATERIALS = int(os.getenv("MAX_CONCURRENT_MATERIALS", 4))
+material_semaphore = asyncio.Semaphore(MAX_CONCURRENT_MATERIALS)
+
+async def export_document(markdown_content: str, outputs: Dict[Path, str]):
+    """Write markdown content to each output path in its format ('pdf', 'docx', 'pptx') in the export pool"""
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(EXPORT_POOL, export_markdown, markdown_content, outputs)
+
+async def generate_material_limited(cancel_event: asyncio.Event, *args) -> Optional[bool]:
+    """Run generate_and_save_material once a slot is free, unless the run was paused or stopped meanwhile
+
+    Returns whether the material was saved, or None if it was skipped.
+    """
+    async with material_semaphore:
+        if cancel_event.is_set():
+            return None
+        return await generate_and_save_material(*args)
+
+# ContentGenerator method producing each weekly material type; each takes
+# (module_data, week_plan, context) and returns the generated ContentItems
+MATERIAL_GENERATORS = {
+    'lecture_notes': '_generate_enhanced_lecture_notes',
+    'lecture_slides': '_generate_enhanced_lecture_slides',
+    'lab_materials': '_generate_enhanced_lab_sheets',
+    'assessments': '_generate_enhanced_quizzes',
+    'seminar_materials': '_generate_enhanced_seminar_prompts',
+    'transcripts': '_generate_enhanced_transcripts'
+}
+
+async def save_material_item(session_id: str, week_number: int, item: ContentItem, material_type: str) -> Path:
+    """Write a generated item in every format MATERIAL_LAYOUT lists for its type and register the files.
+
+    Returns the path of the first format, the one reported as the material's file.
+    """
+    formats = MATERIAL_LAYOUT[material_type].formats
+    material_dir = OUTPUT_DIR / session_id / MATERIAL_SUBDIRS[material_type]
+    stem = f"Week_{week_number:02d}_{sanitize_filename(item.title)}"
+    outputs = {material_dir / f"{stem}.{file_format}": file_format for file_format in formats}
+    
+    if formats == ('txt',):
+        # Plain text needs no conversion
+        await asyncio.to_thread(next(iter(outputs)).write_text, item.content, encoding='utf-8')
+    else:
+        await export_document(item.content, outputs)
+    for path in outputs:
+        await register_material(session_id, path)
+    return next(iter(outputs))
+
+async def generate_and_save_material(
+    session_id: str, content_generator, module_data: ModuleData, week_plan: WeekPlan, material_type: str, material_name: str
+) -> bool:
+    """Generate and save a specific material type; failures are reported as progress errors and return False"""
     
     # Send start update
-    send_progress_update(session_id, {
+    await send_progress_update(session_id, {
         'type': 'material_start',
         'week_number': week_plan.week_number,
         'material_type': material_type,
@@ -1108,155 +1387,42 @@ async def generate_and_save_material(session_id: str, content_generator, module_
     })
     
     try:
+        # Folders were created when the run started
         output_dir = OUTPUT_DIR / session_id
-        output_dir.mkdir(exist_ok=True)
-        
-        # Create material-specific directories
-        material_dirs = {
-            'lecture_notes': output_dir / "01_Lecture_Notes",
-            'lecture_slides': output_dir / "02_Lecture_Slides",
-            'lab_materials': output_dir / "03_Lab_Materials",
-            'assessments': output_dir / "04_Assessments",
-            'seminar_materials': output_dir / "05_Seminar_Materials",
-            'transcripts': output_dir / "06_Transcripts"
-        }
-        
-        material_dir = material_dirs.get(material_type, output_dir)
-        material_dir.mkdir(exist_ok=True)
         
         # Generate content based on type
-        if material_type == 'lecture_notes':
-            notes = await content_generator._generate_lecture_notes(module_data, week_plan)
-            export_tools = ExportTools()
-            
-            for note in notes:
-                # Save as PDF
-                pdf_path = material_dir / f"Week_{week_plan.week_number:02d}_{sanitize_filename(note.title)}.pdf"
-                export_tools.markdown_to_pdf(note.content, pdf_path)
-                
-                # Save as Word
-                docx_path = material_dir / f"Week_{week_plan.week_number:02d}_{sanitize_filename(note.title)}.docx"
-                export_tools.markdown_to_docx(note.content, docx_path)
-                
-                # Send completion update
-                send_progress_update(session_id, {
-                    'type': 'material_complete',
-                    'week_number': week_plan.week_number,
-                    'material_type': material_type,
-                    'material_name': f"{material_name} - {note.title}",
-                    'file_path': str(pdf_path.relative_to(OUTPUT_DIR / session_id)),
-                    'file_format': 'PDF'
-                })
-        
-        elif material_type == 'lecture_slides':
-            slides = await content_generator._generate_lecture_slides(module_data, week_plan)
-            export_tools = ExportTools()
-            
-            for slide in slides:
-                # Save as PowerPoint
-                pptx_path = material_dir / f"Week_{week_plan.week_number:02d}_{sanitize_filename(slide.title)}.pptx"
-                export_tools.markdown_to_pptx(slide.content, pptx_path)
-                
-                send_progress_update(session_id, {
-                    'type': 'material_complete',
-                    'week_number': week_plan.week_number,
-                    'material_type': material_type,
-                    'material_name': f"{material_name} - {slide.title}",
-                    'file_path': str(pptx_path.relative_to(OUTPUT_DIR / session_id)),
-                    'file_format': 'PPTX'
-                })
-        
-        elif material_type == 'transcripts':
-            transcripts = await content_generator._generate_transcripts(module_data, week_plan)
-            
-            for transcript in transcripts:
-                txt_path = material_dir / f"Week_{week_plan.week_number:02d}_{sanitize_filename(transcript.title)}.txt"
-                with open(txt_path, 'w', encoding='utf-8') as f:
-                    f.write(transcript.content)
-                
-                send_progress_update(session_id, {
-                    'type': 'material_complete',
-                    'week_number': week_plan.week_number,
-                    'material_type': material_type,
-                    'material_name': f"{material_name} - {transcript.title}",
-                    'file_path': str(txt_path.relative_to(OUTPUT_DIR / session_id)),
-                    'file_format': 'TXT'
-                })
-        
-        elif material_type == 'lab_materials':
-            labs = await content_generator._generate_lab_sheets(module_data, week_plan)
-            export_tools = ExportTools()
-            
-            for lab in labs:
-                pdf_path = material_dir / f"Week_{week_plan.week_number:02d}_{sanitize_filename(lab.title)}.pdf"
-                export_tools.markdown_to_pdf(lab.content, pdf_path)
-                
-                send_progress_update(session_id, {
-                    'type': 'material_complete',
-                    'week_number': week_plan.week_number,
-                    'material_type': material_type,
-                    'material_name': f"{material_name} - {lab.title}",
-                    'file_path': str(pdf_path.relative_to(OUTPUT_DIR / session_id)),
-                    'file_format': 'PDF'
-                })
-        
-        elif material_type == 'assessments':
-            quizzes = await content_generator._generate_quizzes(module_data, week_plan)
-            export_tools = ExportTools()
-            
-            for quiz in quizzes:
-                pdf_path = material_dir / f"Week_{week_plan.week_number:02d}_{sanitize_filename(quiz.title)}.pdf"
-                export_tools.markdown_to_pdf(quiz.content, pdf_path)
-                
-                send_progress_update(session_id, {
-                    'type': 'material_complete',
-                    'week_number': week_plan.week_number,
-                    'material_type': material_type,
-                    'material_name': f"{material_name} - {quiz.title}",
-                    'file_path': str(pdf_path.relative_to(OUTPUT_DIR / session_id)),
-                    'file_format': 'PDF'
-                })
-        
-        elif material_type == 'seminar_materials':
-            seminars = await content_generator._generate_seminar_prompts(module_data, week_plan)
-            export_tools = ExportTools()
-            
-            for seminar in seminars:
-                pdf_path = material_dir / f"Week_{week_plan.week_number:02d}_{sanitize_filename(seminar.title)}.pdf"
-                export_tools.markdown_to_pdf(seminar.content, pdf_path)
-                
-                send_progress_update(session_id, {
-                    'type': 'material_complete',
-                    'week_number': week_plan.week_number,
-                    'material_type': material_type,
-                    'material_name': f"{material_name} - {seminar.title}",
-                    'file_path': str(pdf_path.relative_to(OUTPUT_DIR / session_id)),
-                    'file_format': 'PDF'#,
-                    #'file_size': file_path.stat().st_size
-                })
+        generate = getattr(content_generator, MATERIAL_GENERATORS[material_type])
+        items = await generate(module_data, week_plan, content_generator._prepare_enhanced_context(module_data, week_plan))
+        
+        for item in items:
+            main_path = await save_material_item(session_id, week_plan.week_number, item, material_type)
+            await send_progress_update(session_id, {
+                'type': 'material_complete',
+                'week_number': week_plan.week_number,
+                'material_type': material_type,
+                'material_name': f"{material_name} - {item.title}",
+                'file_path': str(main_path.relative_to(output_dir)),
+                'file_format': MATERIAL_LAYOUT[material_type].formats[0].upper()
+            })
+        return True
         
     except Exception as e:
-        send_progress_update(session_id, {
+        logger.error(f"Error generating {material_name} for Week {week_plan.week_number}: {str(e)}")
+        await send_progress_update(session_id, {
             'type': 'error',
             'message': f"Error generating {material_name} for Week {week_plan.week_number}: {str(e)}"
         })
+        return False
 
-def send_progress_update(session_id: str, update: dict):
-    """Send progress update to session"""
-    session_data = SessionManager.get_session(session_id)
-    progress_updates = session_data.get('progress_updates', [])
-    progress_updates.append(update)
-    SessionManager.update_session(session_id, {'progress_updates': progress_updates})
 
-def sanitize_filename(filename: str) -> str:
-    """Sanitize filename for cross-platform compatibility"""
-    import re
-    filename = re.sub(r'[<>:"/\\|?*]', '_', filename)
-    filename = re.sub(r'\s+', '_', filename)
-    return filename[:50]
+# Resource file upload endpoints
+UPLOAD_COPY_BUFFER = 1024 * 1024
 
+def save_upload(source, file_path: Path):
+    """Copy an uploaded file's spooled contents to disk in large chunks, off the event loop"""
+    with open(file_path, "wb") as buffer:
+        shutil.copyfileobj(source, buffer, UPLOAD_COPY_BUFFER)
 
-# Resource file upload endpoints
 @app.post("/api/upload-resource-files")
 async def upload_resource_files(
     session_id: str = Form(...),
@@ -1274,31 +1440,29 @@ async def upload_resource_files(
         
         for file in resource_files:
             if file.filename:
-                # Save file with timestamp to avoid conflicts
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                filename = f"{timestamp}_{file.filename}"
+                # Save file with a nanosecond timestamp to avoid conflicts, even within one request
+                filename = f"{time.time_ns()}_{file.filename}"
                 file_path = resource_dir / filename
                 
-                with open(file_path, "wb") as buffer:
-                    shutil.copyfileobj(file.file, buffer)
+                await asyncio.to_thread(save_upload, file.file, file_path)
+                await register_material(session_id, file_path)
                 
                 uploaded_files.append({
                     "original_name": file.filename,
                     "saved_name": filename,
                     "path": str(file_path.relative_to(OUTPUT_DIR / session_id)),
-                    "size": file_path.stat().st_size,
+                    "size": stat_file(file_path).st_size,
                     "type": file.content_type or "unknown"
                 })
         
         # Update session data with uploaded resources
-        session_data = SessionManager.get_session(session_id)
-        if not session_data.get('resource_files'):
-            session_data['resource_files'] = {}
-        
-        session_data['resource_files'][f'week_{week_number}'] = uploaded_files
-        SessionManager.update_session(session_id, session_data)
+        # Only resource_files is written back; keys such as total_size are kept by the store
+        session_data = await SessionManager.get_session(session_id)
+        resource_files = dict(session_data.get('resource_files') or {})
+        resource_files[f'week_{week_number}'] = uploaded_files
+        await SessionManager.update_session(session_id, {'resource_files': resource_files})
         
-        return JSONResponse({
+        return ORJSONResponse({
             "status": "success",
             "uploaded_files": uploaded_files,
             "message": f"Uploaded {len(uploaded_files)} files for week {week_number}"
@@ -1315,31 +1479,29 @@ async def materials_review_page(request: Request, session_id: str):
     
     try:
         # Get session data
-        session_data = SessionManager.get_session(session_id)
+        session_data = await SessionManager.get_session(session_id)
         if not session_data:
             raise HTTPException(status_code=404, detail="Session not found")
         
-        # Get generated materials
-        materials = get_session_materials(session_id)
-        
-        # Calculate statistics
-        total_files = len(materials)
-        total_size = sum(material.get('size', 0) for material in materials)
-        total_weeks = len(set(m.get('week', 0) for m in materials if m.get('week', 0) > 0))
+        # Get generated materials with their statistics
+        listing = await run_db(load_session_materials, session_id)
         
         return templates.TemplateResponse("materials_review.html", {
             "request": request,
             "session_id": session_id,
-            "materials_json": json.dumps(materials),
-            "total_files": total_files,
-            "total_size": format_file_size(total_size),
-            "total_weeks": total_weeks
+            "materials_json": orjson.dumps(listing['materials']).decode(),
+            "total_files": listing['total_files'],
+            "total_size": listing['total_size_text'],
+            "total_weeks": listing['total_weeks']
         })
         
     except Exception as e:
         logger.error(f"Error loading review page: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error loading review page: {str(e)}")
 
+# Characters of a text file returned for preview
+MAX_PREVIEW_CHARS = 64 * 1024
+
 @app.get("/api/preview-file/{session_id}")
 async def preview_file(session_id: str, file: str):
     """Get preview content for a file"""
@@ -1353,9 +1515,11 @@ async def preview_file(session_id: str, file: str):
         file_extension = file_path.suffix.lower()
         
         if file_extension == '.txt':
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            return {"type": "text", "content": content}
+            # Long transcripts are cut off; one character past the limit tells whether there was more
+            async with aiofiles.open(file_path, 'r', encoding='utf-8') as f:
+                content = await f.read(MAX_PREVIEW_CHARS + 1)
+            truncated = len(content) > MAX_PREVIEW_CHARS
+            return {"type": "text", "content": content[:MAX_PREVIEW_CHARS], "truncated": truncated}
             
         elif file_extension == '.pdf':
             return {"type": "pdf", "path": file, "message": "PDF preview available"}
@@ -1368,6 +1532,23 @@ async def preview_file(session_id: str, file: str):
         raise HTTPException(status_code=500, detail=f"Error generating preview: {str(e)}")
 
 # Download endpoints
+async def stat_regular_file(file_path: Path) -> Optional[os.stat_result]:
+    """Stat a file off the event loop; None if it is missing or not a regular file"""
+    try:
+        file_stat = await asyncio.to_thread(os.stat, file_path)
+    except OSError:
+        return None
+    return file_stat if S_ISREG(file_stat.st_mode) else None
+
+def build_package_stream(output_dir: Path, rel_paths: List[str]) -> ZipStream:
+    """Collect the listed files that still exist into a sized ZipStream; stats every file, so runs off the event loop"""
+    package = ZipStream(sized=True)
+    for rel_path in rel_paths:
+        file_path = output_dir / rel_path
+        if file_path.is_file():
+            package.add_path(file_path, rel_path)
+    return package
+
 @app.get("/download-all/{session_id}")
 async def download_all_materials(session_id: str):
     """Download all materials as a zip file"""
@@ -1376,19 +1557,28 @@ async def download_all_materials(session_id: str):
         output_dir = OUTPUT_DIR / session_id
         package_path = output_dir / "complete_package.zip"
         
-        if not package_path.exists():
-            # Create package
-            import zipfile
-            with zipfile.ZipFile(package_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                for file_path in output_dir.rglob('*'):
-                    if file_path.is_file() and file_path != package_path:
-                        arcname = file_path.relative_to(output_dir)
-                        zipf.write(file_path, arcname)
-        
-        return FileResponse(
-            package_path,
+        package_stat = await stat_regular_file(package_path)
+        if package_stat:
+            return FileResponse(
+                package_path,
+                media_type='application/zip',
+                filename=f"course_materials_{session_id}.zip",
+                stat_result=package_stat
+            )
+        
+        # Otherwise the archive is built while it is sent, so nothing is written or held in memory first.
+        # Entries are stored uncompressed (the documents are compressed formats already), which
+        # lets the archive size be known up front.
+        materials = await get_session_materials(session_id)
+        package = await asyncio.to_thread(build_package_stream, output_dir, [m['path'] for m in materials])
+        
+        return StreamingResponse(
+            package,
             media_type='application/zip',
-            filename=f"course_materials_{session_id}.zip"
+            headers={
+                'Content-Disposition': f'attachment; filename="course_materials_{session_id}.zip"',
+                'Content-Length': str(len(package))
+            }
         )
         
     except Exception as e:
@@ -1400,39 +1590,50 @@ async def download_single_file(session_id: str, file: str):
     """Download a single file"""
     file_path = OUTPUT_DIR / session_id / file
     
-    if not file_path.exists():
+    file_stat = await stat_regular_file(file_path)
+    if not file_stat:
         raise HTTPException(status_code=404, detail="File not found")
     
-    return FileResponse(file_path, filename=file_path.name)
+    # The stat result is passed on, so the response does not stat the file again before sending it
+    return FileResponse(file_path, filename=file_path.name, stat_result=file_stat)
 
 # Dashboard and session management endpoints
+# Dashboard values computed inside SQLite, so lists such as the week plans are counted
+# there instead of being decoded and shipped whole
+DASHBOARD_SESSION_COLUMNS = {
+    'module_title': "json_extract(doc, '$.module_data.title')",
+    'module_description': "json_extract(doc, '$.module_data.description')",
+    'generation_status': "json_extract(doc, '$.generation_status')",
+    'total_materials': "json_extract(doc, '$.total_materials')",
+    'completed_count': "json_array_length(doc, '$.completed_materials')",
+    'total_size': "json_extract(doc, '$.total_size')",
+    'total_weeks': "json_array_length(doc, '$.week_plans')",
+    'generation_materials': "json_extract(doc, '$.generation_materials')",
+    'error_message': "json_extract(doc, '$.error_message')"
+}
+
 @app.get("/api/sessions")
-async def get_user_sessions():
-    """Get all user sessions with summary information (DB-only)."""
+async def get_user_sessions(limit: int = 50, offset: int = 0):
+    """Get one page of user sessions with summary information, most recently active first (DB-only)."""
     try:
-        sessions = session_store.list_all()
         user_sessions = []
-        for s in sessions:
-            completed = s.get('completed_materials', []) or []
-            # compute total size from DB entries if present
-            total_size = sum((m.get('size', 0) or 0) for m in completed if isinstance(m, dict))
+        limit = max(1, min(limit, 500))
+        for s in await run_db(session_store.list_page, DASHBOARD_SESSION_COLUMNS, limit, max(offset, 0)):
             user_sessions.append({
                 'id': s.get('session_id'),
-                'module_title': (s.get('module_data') or {}).get('title', 'Untitled Module') if isinstance(s.get('module_data'), dict) else 'Untitled Module',
-                'module_description': (s.get('module_data') or {}).get('description') if isinstance(s.get('module_data'), dict) else None,
-                'status': s.get('generation_status', 'unknown'),
-                'created_at': s.get('created_at', datetime.now().isoformat()),
-                'last_activity': s.get('last_activity', datetime.now().isoformat()),
-                'total_materials': s.get('total_materials', 0),
-                'completed_materials': len(completed),
-                'total_weeks': len(s.get('week_plans', []) or []),
-                'total_size': total_size,
-                'selected_materials': s.get('generation_materials', []) or [],
+                'module_title': s.get('module_title') or 'Untitled Module',
+                'module_description': s.get('module_description'),
+                'status': s.get('generation_status') or 'unknown',
+                'created_at': s.get('created_at') or datetime.now().isoformat(),
+                'last_activity': s.get('last_activity') or datetime.now().isoformat(),
+                'total_materials': s.get('total_materials') or 0,
+                'completed_materials': s.get('completed_count') or 0,
+                'total_weeks': s.get('total_weeks') or 0,
+                'total_size': s.get('total_size') or 0,
+                'selected_materials': s.get('generation_materials') or [],
                 'error_message': s.get('error_message')
             })
-        # Sort by last activity (most recent first)
-        user_sessions.sort(key=lambda x: x['last_activity'], reverse=True)
-        return JSONResponse(user_sessions)
+        return ORJSONResponse(user_sessions)
     except Exception as e:
         logger.error(f"Error retrieving sessions: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error retrieving sessions: {str(e)}")
@@ -1451,7 +1652,7 @@ async def get_usage_statistics():
             for session_dir in OUTPUT_DIR.iterdir():
                 if session_dir.is_dir():
                     session_id = session_dir.name
-                    session_data = SessionManager.get_session(session_id)
+                    session_data = await SessionManager.get_session(session_id)
                     
                     if session_data:
                         total_sessions += 1
@@ -1459,11 +1660,11 @@ async def get_usage_statistics():
                         if session_data.get('generation_status') == 'completed':
                             completed_sessions += 1
                         
-                        materials = get_session_materials(session_id)
+                        materials = await get_session_materials(session_id)
                         total_materials += len(materials)
                         total_size += sum(m.get('size', 0) for m in materials)
         
-        return JSONResponse({
+        return ORJSONResponse({
             'total_sessions': total_sessions,
             'completed_sessions': completed_sessions,
             'total_materials': total_materials,
@@ -1480,7 +1681,7 @@ async def delete_session(session_id: str):
     
     try:
         # Remove from persistent storage
-        SessionManager.delete_session(session_id)
+        await SessionManager.delete_session(session_id)
         
         # Remove files
         session_dir = OUTPUT_DIR / session_id
@@ -1491,7 +1692,7 @@ async def delete_session(session_id: str):
         for file_path in UPLOAD_DIR.glob(f"{session_id}_*"):
             file_path.unlink()
         
-        return JSONResponse({
+        return ORJSONResponse({
             "status": "success", 
             "message": f"Session {session_id} deleted successfully"
         })
@@ -1505,14 +1706,13 @@ async def delete_session(session_id: str):
 async def pause_generation(session_id: str):
     """Pause the generation process"""
     try:
-        SessionManager.update_session(session_id, {
+        cancel_generation_run(session_id)
+        await send_progress_update(session_id, {'type': 'paused'}, {
             'generation_status': 'paused',
             'paused_at': datetime.now().isoformat()
         })
         
-        send_progress_update(session_id, {'type': 'paused'})
-        
-        return JSONResponse({"status": "success", "message": "Generation paused"})
+        return ORJSONResponse({"status": "success", "message": "Generation paused"})
     except Exception as e:
         logger.error(f"Error pausing generation: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error pausing generation: {str(e)}")
@@ -1521,18 +1721,17 @@ async def pause_generation(session_id: str):
 async def resume_generation(session_id: str):
     """Resume the generation process"""
     try:
-        SessionManager.update_session(session_id, {
+        await SessionManager.update_session(session_id, {
             'generation_status': 'running',
             'resumed_at': datetime.now().isoformat()
         })
         
         # Restart generation from where it left off
-        import asyncio
-        session_data = SessionManager.get_session(session_id)
+        session_data = await SessionManager.get_session(session_id)
         materials = session_data.get('generation_materials', [])
-        asyncio.create_task(generate_materials_background(session_id, materials))
+        start_background_task(generate_materials_background(session_id, materials))
         
-        return JSONResponse({"status": "success", "message": "Generation resumed"})
+        return ORJSONResponse({"status": "success", "message": "Generation resumed"})
     except Exception as e:
         logger.error(f"Error resuming generation: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error resuming generation: {str(e)}")
@@ -1541,14 +1740,13 @@ async def resume_generation(session_id: str):
 async def stop_generation(session_id: str):
     """Stop the generation process"""
     try:
-        SessionManager.update_session(session_id, {
+        cancel_generation_run(session_id)
+        await send_progress_update(session_id, {'type': 'stopped'}, {
             'generation_status': 'stopped',
             'stopped_at': datetime.now().isoformat()
         })
         
-        send_progress_update(session_id, {'type': 'stopped'})
-        
-        return JSONResponse({"status": "success", "message": "Generation stopped"})
+        return ORJSONResponse({"status": "success", "message": "Generation stopped"})
     except Exception as e:
         logger.error(f"Error stopping generation: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error stopping generation: {str(e)}")
@@ -1568,7 +1766,7 @@ async def recover_session(session_id: str):
     """Attempt to recover a session by scanning for existing data"""
     try:
         # Check if session exists in memory
-        session_data = SessionManager.get_session(session_id)
+        session_data = await SessionManager.get_session(session_id)
         
         # If not in memory, try to recover from filesystem
         if not session_data:
@@ -1577,6 +1775,7 @@ async def recover_session(session_id: str):
             
             if output_dir.exists() or upload_files:
                 # Create new session data in store
+                now = datetime.now().isoformat()
                 base = {
                     'session_id': session_id,
                     'module_data': None,
@@ -1584,14 +1783,14 @@ async def recover_session(session_id: str):
                     'generated_content': {},
                     'status': 'recovered',
                     'generation_status': 'recovered',
-                    'created_at': datetime.now().isoformat(),
-                    'last_activity': datetime.now().isoformat(),
+                    'created_at': now,
+                    'last_activity': now,
                     'recovered': True
                 }
-                session_store.create(base)
+                await run_db(session_store.create, base)
                 
                 # Scan for materials
-                materials = get_session_materials(session_id)
+                materials = await get_session_materials(session_id)
                 
                 # Try to recover module data from plan file if it exists
                 plan_file = output_dir / "weekly_plan_detailed.txt"
@@ -1599,20 +1798,22 @@ async def recover_session(session_id: str):
                     # Could parse basic info from the plan file
                     pass
                 
-                SessionManager.update_session(session_id, {
+                # The recreated record starts without the running total, so it is seeded from the manifest
+                await SessionManager.update_session(session_id, {
                     'completed_materials': materials,
+                    'total_size': sum(m['size'] for m in materials),
                     'generation_status': 'completed' if materials else 'recovered'
                 })
                 
                 logger.info(f"Recovered session {session_id} with {len(materials)} materials")
                 
-                return JSONResponse({
+                return ORJSONResponse({
                     'status': 'success',
                     'message': f'Session recovered with {len(materials)} materials',
                     'materials_found': len(materials)
                 })
         
-        return JSONResponse({
+        return ORJSONResponse({
             'status': 'success',
             'message': 'Session already exists',
             'session_data': session_data
@@ -1632,18 +1833,19 @@ async def upload_files(
     
     try:
         # Validate session exists
-        session_data = SessionManager.get_session(session_id)
+        session_data = await SessionManager.get_session(session_id)
         if not session_data:
             # Create session if it doesn't exist
-            session_store.create({
+            now = datetime.now().isoformat()
+            await run_db(session_store.create, {
                 'session_id': session_id,
                 'module_data': None,
                 'week_plans': [],
                 'generated_content': {},
                 'status': 'initialized',
                 'generation_status': 'processing_upload',
-                'created_at': datetime.now().isoformat(),
-                'last_activity': datetime.now().isoformat()
+                'created_at': now,
+                'last_activity': now
             })
             logger.info(f"Created new session for upload: {session_id}")
         
@@ -1658,7 +1860,7 @@ async def upload_files(
             raise HTTPException(status_code=400, detail="File too large. Maximum size is 50MB.")
         
         # Update session status
-        SessionManager.update_session(session_id, {
+        await SessionManager.update_session(session_id, {
             'generation_status': 'uploading_files'
         })
         
@@ -1692,33 +1894,33 @@ async def upload_files(
                     # Continue with other files
         
         # Update session status
-        SessionManager.update_session(session_id, {
+        await SessionManager.update_session(session_id, {
             'generation_status': 'processing_documents'
         })
         
         # Process files with ingestion agent
         try:
-            ingestion_agent = IngestionAgent()
+            ingestion_agent = get_agent_class('IngestionAgent')()
             module_data = await ingestion_agent.process_module_spec(
                 module_path, textbook_paths
             )
             logger.info(f"Successfully processed module spec for session: {session_id}")
         except Exception as e:
             logger.error(f"Error processing module spec: {str(e)}")
-            SessionManager.update_session(session_id, {
+            await SessionManager.update_session(session_id, {
                 'generation_status': 'error',
                 'error_message': f"Error processing uploaded documents: {str(e)}"
             })
             raise HTTPException(status_code=500, detail=f"Error processing uploaded documents: {str(e)}")
         
         # Update session with processed data
-        SessionManager.update_session(session_id, {
+        await SessionManager.update_session(session_id, {
             'module_data': module_data.dict(),
             'generation_status': 'documents_processed',
             'upload_complete': True
         })
         
-        return JSONResponse({
+        return ORJSONResponse({
             "status": "success",
             "message": "Files processed successfully",
             "module_data": module_data.dict(),
@@ -1731,7 +1933,7 @@ async def upload_files(
     except Exception as e:
         logger.error(f"Unexpected error in upload: {str(e)}")
         # Update session with error status
-        SessionManager.update_session(session_id, {
+        await SessionManager.update_session(session_id, {
             'generation_status': 'error',
             'error_message': str(e)
         })
@@ -1743,13 +1945,13 @@ async def upload_files(
 async def get_session_status(session_id: str):
     """Get current status of a session"""
     try:
-        session_data = SessionManager.get_session(session_id)
+        session_data = await SessionManager.get_session(session_id)
         
         if not session_data:
             raise HTTPException(status_code=404, detail="Session not found")
         
         # Get materials information
-        materials = get_session_materials(session_id)
+        materials = await get_session_materials(session_id)
         total_size = sum(m.get('size', 0) for m in materials)
         
         # Calculate progress
@@ -1771,10 +1973,11 @@ async def get_session_status(session_id: str):
             'last_activity': session_data.get('last_activity'),
             'week_plans_count': len(session_data.get('week_plans', [])),
             'has_materials': completed_materials > 0,
+            'last_milestone': session_data.get('last_milestone'),
             'error_message': session_data.get('error_message')
         }
         
-        return JSONResponse(status_info)
+        return ORJSONResponse(status_info)
         
     except HTTPException:
         raise
@@ -1786,10 +1989,10 @@ async def get_session_status(session_id: str):
 async def check_session_health(session_id: str):
     """Health check for a specific session"""
     try:
-        session_data = SessionManager.get_session(session_id)
+        session_data = await SessionManager.get_session(session_id)
         
         if not session_data:
-            return JSONResponse({
+            return ORJSONResponse({
                 'healthy': False,
                 'exists': False,
                 'message': 'Session not found'
@@ -1803,7 +2006,7 @@ async def check_session_health(session_id: str):
         output_dir = OUTPUT_DIR / session_id
         files_exist = output_dir.exists() and any(output_dir.iterdir())
         
-        return JSONResponse({
+        return ORJSONResponse({
             'healthy': healthy,
             'exists': True,
             'status': status,
@@ -1814,7 +2017,7 @@ async def check_session_health(session_id: str):
         
     except Exception as e:
         logger.error(f"Error checking session health: {str(e)}")
-        return JSONResponse({
+        return ORJSONResponse({
             'healthy': False,
             'exists': False,
             'error': str(e),
@@ -1825,21 +2028,21 @@ async def check_session_health(session_id: str):
 async def refresh_session_data(session_id: str):
     """Refresh session data by scanning filesystem"""
     try:
-        session_data = SessionManager.get_session(session_id)
+        session_data = await SessionManager.get_session(session_id)
         
         if not session_data:
             raise HTTPException(status_code=404, detail="Session not found")
         
         # Scan for materials
-        materials = get_session_materials(session_id)
+        materials = await get_session_materials(session_id)
         
         # Update session data
-        SessionManager.update_session(session_id, {
+        await SessionManager.update_session(session_id, {
             'completed_materials': materials,
             'last_scan': datetime.now().isoformat()
         })
         
-        return JSONResponse({
+        return ORJSONResponse({
             'status': 'success',
             'materials_found': len(materials),
             'message': 'Session data refreshed successfully'
@@ -1853,9 +2056,6 @@ async def refresh_session_data(session_id: str):
 
 
 # Add periodic session cleanup
-import asyncio
-from typing import Set
-
 # Keep track of active sessions
 active_sessions: Set[str] = set()
 
@@ -1865,7 +2065,8 @@ async def cleanup_inactive_sessions():
         cutoff_time = datetime.now().timestamp() - (24 * 60 * 60)  # 24 hours ago
         
         sessions_to_remove = []
-        for session in session_store.list_all():
+        # Only the id and timestamp columns are read; no session data is decoded
+        for session in await run_db(list, session_store.iter_fields({})):
             session_id = session.get('session_id')
             session_data = session
             try:
@@ -1878,7 +2079,7 @@ async def cleanup_inactive_sessions():
         # Remove inactive sessions
         for session_id in sessions_to_remove:
             try:
-                SessionManager.delete_session(session_id)
+                await SessionManager.delete_session(session_id)
                 # Also cleanup files
                 session_dir = OUTPUT_DIR / session_id
                 if session_dir.exists():
@@ -1900,6 +2101,9 @@ async def startup_event():
     OUTPUT_DIR.mkdir(exist_ok=True)
     UPLOAD_DIR.mkdir(exist_ok=True)
     
+    global progress_writer_task
+    progress_writer_task = asyncio.create_task(progress_writer())
+    
     # Schedule periodic cleanup (every 6 hours)
     async def schedule_cleanup():
         while True:
@@ -1909,6 +2113,17 @@ async def startup_event():
     asyncio.create_task(schedule_cleanup())
     logger.info("Periodic session cleanup scheduled")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Release shared resources"""
+    # Close the pooled HTTP connections used by every LLM client
+    await LLMConfig.aclose()
+    # Write out queued progress updates and last_activity stamps still held in memory
+    progress_queue.put_nowait(None)
+    await progress_writer_task
+    await run_db(session_store.flush_activity)
+    EXPORT_POOL.shutdown(cancel_futures=True)
+
 # Add session activity tracking middleware
 @app.middleware("http")
 async def track_session_activity(request: Request, call_next):
@@ -1926,7 +2141,7 @@ async def track_session_activity(request: Request, call_next):
             break
     
     # Add to active sessions if found
-    if session_id and session_store.exists(session_id):
+    if session_id and await run_db(session_store.exists, session_id):
         active_sessions.add(session_id)
         # Remove from active set after 1 hour
         asyncio.create_task(remove_from_active_later(session_id))
@@ -1945,7 +2160,7 @@ async def generate_week_content(request: Request):
     """Generate content for a specific week"""
     
     try:
-        data = await request.json()
+        data = orjson.loads(await request.body())
         session_id = data.get('session_id')
         week_number = data.get('week_number')
         material_types = data.get('material_types', [])
@@ -1954,7 +2169,7 @@ async def generate_week_content(request: Request):
             raise HTTPException(status_code=400, detail="Missing session_id or week_number")
         
         # Get session data
-        session_data = SessionManager.get_session(session_id)
+        session_data = await SessionManager.get_session(session_id)
         if not session_data:
             raise HTTPException(status_code=404, detail="Session not found")
         
@@ -1979,8 +2194,10 @@ async def generate_week_content(request: Request):
         module_obj = ModuleData(**module_data)
         week_obj = WeekPlan(**week_plan)
         
-        # Generate content for this week
-        content_generator = ContentGenerator()
+        # Generate content for this week; an on-demand week is a request for fresh content,
+        # so the LLM output cache is bypassed (and refreshed) here
+        content_generator = get_agent_class('ContentGenerator')(use_cache=False)
+        create_material_dirs(session_id)
         
         # Generate specified materials
         generated_materials = []
@@ -2069,14 +2286,13 @@ async def generate_week_content(request: Request):
                     'format': 'PDF'
                 })
         
-        # Update session with generated materials
-        if 'generated_materials' not in session_data:
-            session_data['generated_materials'] = {}
-        
-        session_data['generated_materials'][f'week_{week_number}'] = generated_materials
-        SessionManager.update_session(session_id, session_data)
+        # Update session with generated materials; only that key is written back, since
+        # total_size grew in the store while the files above were registered
+        week_materials = dict(session_data.get('generated_materials') or {})
+        week_materials[f'week_{week_number}'] = generated_materials
+        await SessionManager.update_session(session_id, {'generated_materials': week_materials})
         
-        return JSONResponse({
+        return ORJSONResponse({
             "status": "success",
             "message": f"Generated {len(generated_materials)} materials for week {week_number}",
             "materials": generated_materials
@@ -2092,61 +2308,9 @@ async def save_generated_content(session_id: str, week_number: int, content_item
     """Save generated content to appropriate directory and format"""
     
     try:
-        # Create output directories
-        output_dir = OUTPUT_DIR / session_id
-        
-        # Create material-specific directories
-        material_dirs = {
-            'lecture_notes': output_dir / "01_Lecture_Notes",
-            'lecture_slides': output_dir / "02_Lecture_Slides",
-            'lab_materials': output_dir / "03_Lab_Materials",
-            'assessments': output_dir / "04_Assessments",
-            'seminar_materials': output_dir / "05_Seminar_Materials",
-            'transcripts': output_dir / "06_Transcripts"
-        }
-        
-        material_dir = material_dirs.get(material_type, output_dir)
-        material_dir.mkdir(parents=True, exist_ok=True)
-        
-        # Sanitize filename
-        safe_title = re.sub(r'[<>:"/\\|?*]', '_', content_item.title)
-        safe_title = re.sub(r'\s+', '_', safe_title)[:50]
-        
-        export_tools = ExportTools()
-        
-        # Save content based on material type
-        if material_type == 'lecture_notes':
-            # Save as PDF
-            pdf_path = material_dir / f"Week_{week_number:02d}_{safe_title}.pdf"
-            export_tools.markdown_to_pdf(content_item.content, pdf_path)
-            
-            # Save as Word
-            docx_path = material_dir / f"Week_{week_number:02d}_{safe_title}.docx"
-            export_tools.markdown_to_docx(content_item.content, docx_path)
-            
-            return str(pdf_path.relative_to(output_dir))
-            
-        elif material_type == 'lecture_slides':
-            # Save as PowerPoint
-            pptx_path = material_dir / f"Week_{week_number:02d}_{safe_title}.pptx"
-            export_tools.markdown_to_pptx(content_item.content, pptx_path)
-            
-            return str(pptx_path.relative_to(output_dir))
-            
-        elif material_type == 'transcripts':
-            # Save as text file
-            txt_path = material_dir / f"Week_{week_number:02d}_{safe_title}.txt"
-            with open(txt_path, 'w', encoding='utf-8') as f:
-                f.write(content_item.content)
-            
-            return str(txt_path.relative_to(output_dir))
-            
-        else:
-            # Save as PDF for other types
-            pdf_path = material_dir / f"Week_{week_number:02d}_{safe_title}.pdf"
-            export_tools.markdown_to_pdf(content_item.content, pdf_path)
-            
-            return str(pdf_path.relative_to(output_dir))
+        # Folders were created by generate_week_content
+        main_path = await save_material_item(session_id, week_number, content_item, material_type)
+        return str(main_path.relative_to(OUTPUT_DIR / session_id))
     
     except Exception as e:
         logger.error(f"Error saving content: {str(e)}")
@@ -2158,26 +2322,26 @@ async def session_health_check(session_id: str):
     """Check if session is healthy and accessible"""
     
     try:
-        session_data = SessionManager.get_session(session_id)
+        session_data = await SessionManager.get_session(session_id)
         
-        return JSONResponse({
+        return ORJSONResponse({
             "status": "healthy",
             "exists": bool(session_data),
             "last_activity": session_data.get('last_activity') if session_data else None
         })
         
     except Exception as e:
-        return JSONResponse({
+        return ORJSONResponse({
             "status": "error",
             "exists": False,
             "error": str(e)
         })
 # Update the existing generate-plan endpoint to be more robust
 @app.post("/api/generate-plan")
-async def generate_weekly_plan(session_id: str = Form(...)):
-    """Generate weekly plan using planning agent"""
+async def generate_weekly_plan(session_id: str = Form(...), regenerate: bool = Form(False)):
+    """Generate weekly plan using planning agent; regenerate skips the plan cache"""
     
-    session_data = SessionManager.get_session(session_id)
+    session_data = await SessionManager.get_session(session_id)
     if not session_data:
         raise HTTPException(status_code=404, detail="Session not found")
     
@@ -2186,22 +2350,22 @@ async def generate_weekly_plan(session_id: str = Form(...)):
         raise HTTPException(status_code=400, detail="No module data found in session")
     
     try:
-        planning_agent = PlanningAgent()
+        planning_agent = get_agent_class('PlanningAgent')()
         
         # Convert dict to ModuleData object
         module_obj = ModuleData(**module_data)
         
-        week_plans = await planning_agent.generate_weekly_plan(module_obj)
+        week_plans = await planning_agent.generate_weekly_plan(module_obj, use_cache=not regenerate)
         
         # Convert back to dicts for JSON serialization
         week_plans_dict = [plan.dict() for plan in week_plans]
         
-        SessionManager.update_session(session_id, {
+        await SessionManager.update_session(session_id, {
             'week_plans': week_plans_dict,
             'status': 'planned'
         })
         
-        return JSONResponse({
+        return ORJSONResponse({
             "status": "success",
             "week_plans": week_plans_dict
         })
@@ -49,6 +49,7 @@ class ModuleData(BaseModel):
     topics: List[str] = []
     teaching_methods: List[str] = []
     learning_approaches: List[str] = []
+    content_types: Optional[List[str]] = None  # subset of lecture_notes, lecture_slides, lab_sheets, quizzes, seminar_prompts, transcripts; None generates all
 
 class ContentItem(BaseModel):
     """Individual content item"""
@@ -56,6 +57,14 @@ class ContentItem(BaseModel):
     content: str
     format: str  # markdown, html, etc.
     file_path: Optional[str] = None
+    content_path: Optional[str] = None  # set when the content was spooled to disk instead of kept inline
+    
+    def get_content(self) -> str:
+        """Return the content, reading it back from disk if it was spooled"""
+        if self.content_path:
+            with open(self.content_path, 'r', encoding='utf-8') as f:
+                return f.read()
+        return self.content
 
 class WeeklyContent(BaseModel):
     """Content for a specific week"""
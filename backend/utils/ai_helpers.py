@@ -2,10 +2,13 @@
 Enhanced AI helper utilities for parsing and processing AI-generated content
 """
 
-import json
+import logging
 import re
+import orjson
 from typing import Dict, List, Any, Optional, Union
 
+logger = logging.getLogger(__name__)
+
 class AIHelpers:
     """Utility class for AI-related operations"""
     
@@ -17,13 +20,13 @@ class AIHelpers:
             json_match = re.search(r'\{.*\}', ai_result, re.DOTALL)
             if json_match:
                 json_str = json_match.group()
-                raw_data = json.loads(json_str)
+                raw_data = orjson.loads(json_str)
                 
                 # Clean and extract actual values from AI structured responses
                 return self._extract_values_from_ai_response(raw_data)
                 
-        except (json.JSONDecodeError, AttributeError) as e:
-            print(f"JSON parsing failed: {e}")
+        except (orjson.JSONDecodeError, AttributeError) as e:
+            logger.debug("JSON parsing failed: %s", e)
             pass
         
         # Fallback: parse using patterns
@@ -270,7 +273,7 @@ class AIHelpers:
             json_match = re.search(r'\[.*\]', ai_result, re.DOTALL)
             if json_match:
                 json_str = json_match.group()
-                raw_data = json.loads(json_str)
+                raw_data = orjson.loads(json_str)
                 
                 # Clean each week's data
                 cleaned_weeks = []
@@ -283,7 +286,7 @@ class AIHelpers:
                 
                 return cleaned_weeks
                 
-        except (json.JSONDecodeError, AttributeError):
+        except (orjson.JSONDecodeError, AttributeError):
             pass
         
         # Fallback: create basic structure
@@ -431,8 +434,8 @@ class AIHelpers:
             matches = re.findall(pattern, text, re.DOTALL)
             for match in matches:
                 try:
-                    return json.loads(match)
-                except json.JSONDecodeError:
+                    return orjson.loads(match)
+                except orjson.JSONDecodeError:
                     continue
         
         return None
\ No newline at end of file
@@ -3,8 +3,10 @@ Export utilities for converting content to various formats
 """
 
 import markdown
+import os
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Optional
+from typing import Dict, List, Optional, Tuple
 from docx import Document
 from docx.shared import Inches
 from pptx import Presentation
@@ -16,14 +18,36 @@ from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
 import re
 
+NUMBERED_ITEM = re.compile(r'^\d+\. ')
+HEADING_PREFIXES = (('#### ', 'h4'), ('### ', 'h3'), ('## ', 'h2'), ('# ', 'h1'))
+
 class ExportTools:
     """Utility class for exporting content to various formats"""
     
     def __init__(self):
         self.styles = getSampleStyleSheet()
     
+    def markdown_to_multi(self, markdown_content: str, outputs: Dict[Path, str]):
+        """Convert markdown content to several formats ('pdf', 'docx', 'pptx') sharing one parse"""
+        
+        blocks = self._parse_markdown_blocks(markdown_content)
+        
+        for output_path, output_format in outputs.items():
+            if output_format == 'pdf':
+                self._blocks_to_pdf(blocks, output_path)
+            elif output_format == 'docx':
+                self._blocks_to_docx(blocks, output_path)
+            elif output_format == 'pptx':
+                self.markdown_to_pptx(markdown_content, output_path)
+            else:
+                raise ValueError(f"Unsupported export format: {output_format}")
+    
     def markdown_to_pdf(self, markdown_content: str, output_path: Path):
         """Convert markdown content to PDF"""
+        self._blocks_to_pdf(self._parse_markdown_blocks(markdown_content), output_path)
+    
+    def _blocks_to_pdf(self, blocks: List[Tuple[str, str]], output_path: Path):
+        """Render parsed markdown blocks to PDF"""
         
         try:
             # Create PDF document
@@ -36,8 +60,8 @@ class ExportTools:
                 bottomMargin=18
             )
             
-            # Parse markdown and create story
-            story = self._markdown_to_reportlab_story(markdown_content)
+            # Create story from the parsed markdown
+            story = self._blocks_to_story(blocks)
             
             # Build PDF
             doc.build(story)
@@ -47,39 +71,30 @@ class ExportTools:
     
     def markdown_to_docx(self, markdown_content: str, output_path: Path):
         """Convert markdown content to Word document"""
+        self._blocks_to_docx(self._parse_markdown_blocks(markdown_content), output_path)
+    
+    def _blocks_to_docx(self, blocks: List[Tuple[str, str]], output_path: Path):
+        """Render parsed markdown blocks to a Word document"""
         
         try:
             doc = Document()
             
-            # Parse markdown content
-            lines = markdown_content.split('\n')
-            
-            for line in lines:
-                line = line.strip()
-                
-                if not line:
+            for kind, text in blocks:
+                if kind == 'blank':
                     # Add space for empty lines
                     doc.add_paragraph()
-                    continue
-                
                 # Handle headers
-                if line.startswith('# '):
-                    doc.add_heading(line[2:], level=1)
-                elif line.startswith('## '):
-                    doc.add_heading(line[3:], level=2)
-                elif line.startswith('### '):
-                    doc.add_heading(line[4:], level=3)
-                elif line.startswith('#### '):
-                    doc.add_heading(line[5:], level=4)
+                elif kind in ('h1', 'h2', 'h3', 'h4'):
+                    doc.add_heading(text, level=int(kind[1]))
                 # Handle bullet points
-                elif line.startswith('- ') or line.startswith('* '):
-                    doc.add_paragraph(line[2:], style='List Bullet')
+                elif kind == 'bullet':
+                    doc.add_paragraph(text, style='List Bullet')
                 # Handle numbered lists
-                elif re.match(r'^\d+\. ', line):
-                    doc.add_paragraph(re.sub(r'^\d+\. ', '', line), style='List Number')
+                elif kind == 'number':
+                    doc.add_paragraph(NUMBERED_ITEM.sub('', text), style='List Number')
                 # Regular paragraphs
                 else:
-                    doc.add_paragraph(line)
+                    doc.add_paragraph(text)
             
             doc.save(str(output_path))
             
@@ -131,38 +146,63 @@ class ExportTools:
         except Exception as e:
             raise Exception(f"Error creating PowerPoint: {str(e)}")
     
-    def _markdown_to_reportlab_story(self, markdown_content: str):
-        """Convert markdown to ReportLab story elements"""
+    def _parse_markdown_blocks(self, markdown_content: str) -> List[Tuple[str, str]]:
+        """Parse markdown into (kind, text) blocks shared by the document renderers"""
         
-        story = []
-        lines = markdown_content.split('\n')
+        blocks = []
         
-        for line in lines:
+        for line in markdown_content.split('\n'):
             line = line.strip()
             
             if not line:
-                story.append(Spacer(1, 12))
+                blocks.append(('blank', ''))
                 continue
             
             # Handle headers
-            if line.startswith('# '):
-                story.append(Paragraph(line[2:], self.styles['Heading1']))
+            for prefix, kind in HEADING_PREFIXES:
+                if line.startswith(prefix):
+                    blocks.append((kind, line[len(prefix):]))
+                    break
+            else:
+                # Handle bullet points
+                if line.startswith('- ') or line.startswith('* '):
+                    blocks.append(('bullet', line[2:]))
+                # Numbered items keep their number; only Word renders them as a list
+                elif NUMBERED_ITEM.match(line):
+                    blocks.append(('number', line))
+                # Regular paragraphs
+                else:
+                    blocks.append(('text', line))
+        
+        return blocks
+    
+    def _blocks_to_story(self, blocks: List[Tuple[str, str]]):
+        """Convert parsed markdown blocks to ReportLab story elements"""
+        
+        story = []
+        
+        for kind, text in blocks:
+            if kind == 'blank':
+                story.append(Spacer(1, 12))
+            # Handle headers
+            elif kind == 'h1':
+                story.append(Paragraph(text, self.styles['Heading1']))
                 story.append(Spacer(1, 12))
-            elif line.startswith('## '):
-                story.append(Paragraph(line[3:], self.styles['Heading2']))
+            elif kind == 'h2':
+                story.append(Paragraph(text, self.styles['Heading2']))
                 story.append(Spacer(1, 12))
-            elif line.startswith('### '):
-                story.append(Paragraph(line[4:], self.styles['Heading3']))
+            elif kind == 'h3':
+                story.append(Paragraph(text, self.styles['Heading3']))
                 story.append(Spacer(1, 6))
-            elif line.startswith('#### '):
-                story.append(Paragraph(line[5:], self.styles['Heading4']))
+            elif kind == 'h4':
+                story.append(Paragraph(text, self.styles['Heading4']))
                 story.append(Spacer(1, 6))
             # Handle bullet points
-            elif line.startswith('- ') or line.startswith('* '):
-                story.append(Paragraph(line[2:], self.styles['Bullet']))
+            elif kind == 'bullet':
+                story.append(Paragraph(text, self.styles['Bullet']))
             # Regular paragraphs
             else:
-                story.append(Paragraph(line, self.styles['Normal']))
+                story.append(Paragraph(text, self.styles['Normal']))
                 story.append(Spacer(1, 6))
         
         return story
@@ -177,3 +217,13 @@ class ExportTools:
                 if file_path.is_file():
                     arcname = file_path.relative_to(source_dir.parent)
                     zipf.write(file_path, arcname)
+
+
+# Document export is CPU-bound and holds the GIL, so it runs in worker processes shared by
+# the app and the packaging agent rather than on the event loop
+EXPORT_POOL = ProcessPoolExecutor(max_workers=os.cpu_count())
+
+
+def export_markdown(markdown_content: str, outputs: Dict[Path, str]):
+    """Export markdown content to several formats; a module-level entry point for EXPORT_POOL workers"""
+    ExportTools().markdown_to_multi(markdown_content, outputs)
@@ -0,0 +1,29 @@
+"""
+Persistent cache for LLM task outputs
+"""
+
+import hashlib
+import os
+from functools import cache
+from typing import Any, Optional
+from diskcache import Cache
+from config.settings import settings
+
+CACHE_DIR = os.path.expanduser(os.getenv("LLM_CACHE_DIR", "~/.course_dev/llm_cache"))
+
+@cache
+def _open() -> Cache:
+    """Open the cache directory on first use rather than when this module is imported"""
+    return Cache(CACHE_DIR)
+
+def make_key(*parts: str) -> str:
+    """Build a cache key from the prompt, agent role and model id"""
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+def get(key: str) -> Optional[Any]:
+    """Return the cached output for a key, or None on a miss"""
+    return _open().get(key)
+
+def put(key: str, value: Any) -> None:
+    """Store an LLM output under a key for settings.CACHE_TTL seconds"""
+    _open().set(key, value, expire=settings.CACHE_TTL)
@@ -3,17 +3,28 @@ LLM Configuration Management
 """
 
 import os
-from langchain_openai import ChatOpenAI
+from functools import lru_cache
+import httpx
 from dotenv import load_dotenv
+from config.settings import settings
 
 load_dotenv()
 
+# Pooled HTTP clients shared by every LLM so requests reuse keep-alive connections
+# instead of paying a TCP + TLS handshake each time
+HTTP_LIMITS = httpx.Limits(max_connections=64, max_keepalive_connections=32)
+HTTP_TIMEOUT = httpx.Timeout(180.0)
+
+http_client = httpx.Client(limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT)
+http_async_client = httpx.AsyncClient(limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT)
+
 class LLMConfig:
     """Centralized LLM configuration management"""
     
     @staticmethod
     def get_default_llm(temperature=0.3, max_tokens=3000):
         """Get default LLM configuration"""
+        from langchain_openai import ChatOpenAI
         
         # Check if API key is available
         api_key = os.getenv("OPENAI_API_KEY")
@@ -30,7 +41,9 @@ class LLMConfig:
                 max_tokens=max_tokens,
                 request_timeout=180,
                 api_key=api_key,
-                max_retries=3
+                max_retries=3,
+                http_client=http_client,
+                http_async_client=http_async_client
             )
         except Exception as e:
             # Fallback to gpt-3.5-turbo if gpt-4o-mini is not available
@@ -41,9 +54,38 @@ class LLMConfig:
                 max_tokens=max_tokens,
                 request_timeout=180,
                 api_key=api_key,
-                max_retries=3
+                max_retries=3,
+                http_client=http_client,
+                http_async_client=http_async_client
             )
     
+    @staticmethod
+    @lru_cache(maxsize=8)
+    def get_llm(model: str, temperature: float, max_tokens: int = 4000):
+        """Get a shared LLM client for a model and temperature"""
+        from langchain_openai import ChatOpenAI
+        
+        api_key = os.getenv("OPENAI_API_KEY")
+        if not api_key:
+            raise ValueError("OPENAI_API_KEY not found in environment variables")
+        
+        return ChatOpenAI(
+            model=model,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            request_timeout=180,
+            api_key=api_key,
+            max_retries=3,
+            http_client=http_client,
+            http_async_client=http_async_client
+        )
+    
+    @staticmethod
+    def get_agent_llm(agent_name: str):
+        """Get the shared LLM configured for an agent in settings.AGENT_CONFIGS"""
+        config = settings.AGENT_CONFIGS[agent_name]
+        return LLMConfig.get_llm(config["model"], config["temperature"])
+    
     @staticmethod
     def get_content_generation_llm():
         """Get LLM optimized for content generation"""
@@ -54,6 +96,12 @@ class LLMConfig:
         """Get LLM optimized for analysis tasks"""
         return LLMConfig.get_default_llm(temperature=0.1, max_tokens=3000)
     
+    @staticmethod
+    async def aclose():
+        """Close the shared HTTP connection pools"""
+        http_client.close()
+        await http_async_client.aclose()
+    
     @staticmethod
     def test_llm_connection():
         """Test LLM connection"""
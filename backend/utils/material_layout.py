@@ -0,0 +1,22 @@
+"""
+Folder and file formats of each weekly material type
+"""
+
+from collections import namedtuple
+
+MaterialLayout = namedtuple('MaterialLayout', ['folder', 'label', 'formats'])
+
+# Where each weekly material type is written and in which formats, the first being the one
+# reported as the material's file. The generation endpoints, the packaging agent and the
+# instructor guide all read this table, so the guide describes the files actually written.
+MATERIAL_LAYOUT = {
+    'lecture_notes': MaterialLayout('01_Lecture_Notes', 'lecture notes', ('pdf', 'docx')),
+    'lecture_slides': MaterialLayout('02_Lecture_Slides', 'lecture slides', ('pptx', 'pdf')),
+    'lab_materials': MaterialLayout('03_Lab_Materials', 'lab sheets', ('pdf', 'docx')),
+    'assessments': MaterialLayout('04_Assessments', 'weekly quizzes', ('pdf',)),
+    'seminar_materials': MaterialLayout('05_Seminar_Materials', 'seminar discussion prompts', ('pdf',)),
+    'transcripts': MaterialLayout('06_Transcripts', 'lecture transcripts', ('txt',))
+}
+
+# How each format is named for instructors
+FORMAT_NAMES = {'pdf': 'PDF', 'docx': 'Word', 'pptx': 'PowerPoint', 'txt': 'plain text'}
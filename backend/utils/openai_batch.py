@@ -0,0 +1,86 @@
+"""
+OpenAI Batch API runner for offline content generation
+"""
+
+import asyncio
+import json
+import logging
+import os
+from typing import Dict, List
+from openai import AsyncOpenAI
+
+POLL_INTERVAL_SECONDS = int(os.getenv("OPENAI_BATCH_POLL_SECONDS", "30"))
+TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+logger = logging.getLogger(__name__)
+
+async def run_chat_batch(
+    requests: Dict[str, List[dict]],
+    model: str,
+    temperature: float,
+    max_tokens: int
+) -> Dict[str, str]:
+    """Submit chat completion requests as one batch job and wait for the results
+
+    requests maps a custom_id to the chat messages for that request. The result maps
+    each custom_id to its generated text. Requests that failed are logged with their
+    error and left out, so the caller can retry them another way.
+    """
+
+    client = AsyncOpenAI()
+
+    lines = [
+        json.dumps({
+            "custom_id": custom_id,
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": {
+                "model": model,
+                "messages": messages,
+                "temperature": temperature,
+                "max_tokens": max_tokens
+            }
+        })
+        for custom_id, messages in requests.items()
+    ]
+
+    input_file = await client.files.create(
+        file=("course_content_batch.jsonl", "\n".join(lines).encode("utf-8")),
+        purpose="batch"
+    )
+    batch = await client.batches.create(
+        input_file_id=input_file.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h"
+    )
+
+    # Batch jobs can take hours; poll without holding up the event loop
+    while batch.status not in TERMINAL_STATUSES:
+        await asyncio.sleep(POLL_INTERVAL_SECONDS)
+        batch = await client.batches.retrieve(batch.id)
+
+    if batch.status != "completed":
+        raise RuntimeError(f"OpenAI batch {batch.id} finished with status '{batch.status}'")
+
+    # Successful requests land in the output file and failed ones in the error file;
+    # either file is missing when it would be empty
+    records = []
+    for file_id in (batch.output_file_id, batch.error_file_id):
+        if file_id:
+            content = await client.files.content(file_id)
+            records.extend(json.loads(line) for line in content.text.splitlines() if line.strip())
+
+    results = {}
+    errors = {}
+    for record in records:
+        response = record.get("response") or {}
+        choices = (response.get("body") or {}).get("choices") or []
+        if choices and choices[0]["message"].get("content"):
+            results[record["custom_id"]] = choices[0]["message"]["content"]
+        else:
+            errors[record["custom_id"]] = record.get("error") or response.get("body") or f"status {response.get('status_code')}"
+
+    for custom_id in requests.keys() - results.keys():
+        logger.warning("OpenAI batch %s request %s failed: %s", batch.id, custom_id, errors.get(custom_id, "no result returned"))
+
+    return results
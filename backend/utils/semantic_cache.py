@@ -0,0 +1,47 @@
+"""
+Response cache for extraction and planning LLM calls
+"""
+
+import asyncio
+import hashlib
+import math
+import os
+from typing import List, Optional
+from diskcache import Cache
+from config.settings import settings
+
+CACHE_DIR = os.path.expanduser(os.getenv("SEMANTIC_CACHE_DIR", "~/.course_dev/semantic_cache"))
+EMBEDDING_MODEL = os.getenv("SEMANTIC_CACHE_EMBEDDING_MODEL", "text-embedding-3-small")
+
+def cosine_similarity(a: List[float], b: List[float]) -> float:
+    """Cosine similarity of two vectors"""
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+class SemanticCache:
+    """LLM response cache keyed on the exact variable input of a prompt
+
+    Entries are keyed by the variable input (the module text, the module data), never by
+    the fixed template around it; the template is passed once and hashed into every key,
+    so editing it starts a fresh set of entries. Only exact repeats hit: specs and modules
+    that differ in a code, a weight or one learning outcome embed almost identically, so
+    a similarity match would hand back another module's title, assessments or plan.
+    """
+
+    def __init__(self, partition: str, template: str = ""):
+        # One partition per agent role so extraction and planning results never mix
+        self.cache = Cache(os.path.join(CACHE_DIR, partition))
+        self.version = hashlib.sha256(template.encode("utf-8")).hexdigest()[:16]
+
+    def _key(self, key_text: str) -> tuple:
+        return ("exact", self.version, hashlib.sha256(key_text.encode("utf-8")).hexdigest())
+
+    async def get(self, key_text: str) -> Optional[str]:
+        """Return the cached response for exactly this input, or None"""
+        # diskcache is SQLite on disk, so lookups stay off the event loop
+        return await asyncio.to_thread(self.cache.get, self._key(key_text))
+
+    async def put(self, key_text: str, response: str):
+        """Store a response under this input"""
+        await asyncio.to_thread(self.cache.set, self._key(key_text), response, expire=settings.CACHE_TTL)
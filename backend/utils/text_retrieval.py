@@ -0,0 +1,74 @@
+"""
+Embedding-based selection of the relevant parts of long documents
+"""
+
+import hashlib
+import os
+from typing import List
+from diskcache import Cache
+from utils.semantic_cache import EMBEDDING_MODEL, cosine_similarity
+
+CHUNK_CHARS = 2000  # roughly 500 tokens
+TOP_K = 3
+
+_embedding_cache = Cache(os.path.expanduser(os.getenv("EMBEDDING_CACHE_DIR", "~/.course_dev/embeddings")))
+
+def chunk_text(text: str, size: int = CHUNK_CHARS) -> List[str]:
+    """Split text into chunks of about `size` characters, breaking on paragraph boundaries"""
+
+    chunks, current = [], ""
+    for paragraph in text.split("\n\n"):
+        if current and len(current) + len(paragraph) > size:
+            chunks.append(current)
+            current = ""
+        current = f"{current}\n\n{paragraph}" if current else paragraph
+
+        # A single oversized paragraph is cut into fixed windows
+        while len(current) > size:
+            chunks.append(current[:size])
+            current = current[size:]
+
+    if current.strip():
+        chunks.append(current)
+    return chunks
+
+async def select_relevant_chunks(
+    text: str,
+    queries: List[str],
+    max_chars: int,
+    top_k: int = TOP_K
+) -> str:
+    """Return the chunks of `text` most relevant to `queries`, within a character budget"""
+
+    chunks = chunk_text(text)
+    chunk_key = ("chunks", EMBEDDING_MODEL, hashlib.blake2b(text.encode("utf-8")).hexdigest())
+    query_key = ("queries", EMBEDDING_MODEL, hashlib.blake2b("\x1f".join(queries).encode("utf-8")).hexdigest())
+
+    chunk_vectors = _embedding_cache.get(chunk_key)
+    query_vectors = _embedding_cache.get(query_key)
+
+    if chunk_vectors is None or query_vectors is None:
+        from langchain_openai import OpenAIEmbeddings
+        
+        # Embed the document and the queries in a single batched request
+        vectors = await OpenAIEmbeddings(model=EMBEDDING_MODEL).aembed_documents(chunks + queries)
+        chunk_vectors, query_vectors = vectors[:len(chunks)], vectors[len(chunks):]
+        _embedding_cache.set(chunk_key, chunk_vectors)
+        _embedding_cache.set(query_key, query_vectors)
+
+    rankings = [
+        sorted(range(len(chunks)), key=lambda i: cosine_similarity(query, chunk_vectors[i]), reverse=True)
+        for query in query_vectors
+    ]
+
+    # Take each query's best chunk, then each one's second best, and so on until the budget is spent
+    selected, used = set(), 0
+    for rank in range(min(top_k, len(chunks))):
+        for ranking in rankings:
+            idx = ranking[rank]
+            if idx in selected or used + len(chunks[idx]) > max_chars:
+                continue
+            selected.add(idx)
+            used += len(chunks[idx])
+
+    return "\n...\n".join(chunks[i] for i in sorted(selected))